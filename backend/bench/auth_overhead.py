@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+# Run from backend/: python -m bench.auth_overhead --requests 20000
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+import jwt
+
+from services import principal
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(timings):
+    return {
+        "p50_us": round(statistics.median(timings), 2),
+        "p95_us": round(percentile(timings, 95), 2),
+        "p99_us": round(percentile(timings, 99), 2),
+        "mean_us": round(statistics.fmean(timings), 2),
+    }
+
+
+def timed(fn, count):
+    timings = []
+    for i in range(count):
+        started = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def make_tokens(count, users):
+    expire = datetime.utcnow() + timedelta(minutes=15)
+    return [
+        jwt.encode({"sub": str(i % users + 1), "exp": expire, "jti": i}, principal.SECRET_KEY,
+                   algorithm=principal.ALGORITHM)
+        for i in range(count)
+    ]
+
+
+def run(args):
+    if args.db:
+        from dotenv import load_dotenv
+        load_dotenv()
+        loader = principal.load_principal
+    else:
+        # Stand-in for the users/user_roles reads so only decode and cache cost is measured
+        def loader(user_id, expires_at, token_key=None):
+            return principal.Principal(user_id, f"user{user_id}", 1, 1, ["doctor"], expires_at)
+
+    tokens = make_tokens(args.sessions, args.users)
+
+    def before(i):
+        # What verify_token did per request, plus the role lookup a role check would add
+        claims = jwt.decode(tokens[i % len(tokens)], principal.SECRET_KEY, algorithms=[principal.ALGORITHM])
+        loader(int(claims["sub"]), claims["exp"])
+
+    def after(i):
+        principal.resolve(tokens[i % len(tokens)], loader=loader)
+
+    results = {"mode": "db" if args.db else "memory", "requests": args.requests, "sessions": args.sessions}
+    results["before"] = summarize(timed(before, args.requests))
+    # The first pass over the sessions misses; the rest are cache hits
+    miss_timings = timed(after, len(tokens))
+    results["after_miss"] = summarize(miss_timings)
+    results["after_hit"] = summarize(timed(after, args.requests))
+    results["speedup_p50"] = round(results["before"]["p50_us"] / max(results["after_hit"]["p50_us"], 0.01), 1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-request token verification overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=500, help="Distinct tokens in circulation")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--db", action="store_true",
+                        help="Load users and roles from the configured database instead of a stub")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import json
+import statistics
+import time
+from collections import defaultdict
+
+# Run from backend/: python -m bench.fuzzy_search --patients 1000000
+from bench.kenyan_names import generate_patients, generate_queries
+from services import name_matching
+from services.patient_search import name_tokens
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_dictionary(patients):
+    """In-memory equivalent of name_token_variants for the generated dataset."""
+    variants = defaultdict(set)
+    tokens = set()
+    for patient in patients:
+        tokens.update(name_tokens(patient["first_name"], patient["last_name"]))
+    for token in tokens:
+        for kind, variant in name_matching.token_variants(token):
+            variants[(kind, variant)].add(token)
+    return variants, len(tokens)
+
+
+def candidates(variants, term):
+    limit = name_matching.max_distance(term)
+    if limit == 0:
+        return {term: 100}
+    term_key = name_matching.phonetic_key(term)
+    found = set(variants.get(("phonetic", term_key), ()))
+    for key in name_matching.deletes(term):
+        found |= variants.get(("delete", key), set())
+    result = {}
+    for token in found:
+        slack = limit + 1 if name_matching.phonetic_key(token) == term_key else limit
+        distance = name_matching.edit_distance(term, token, slack)
+        if distance <= slack:
+            result[token] = name_matching.score(term, token, distance)
+    return result
+
+
+def run_memory(args):
+    started = time.perf_counter()
+    variants, distinct = build_dictionary(generate_patients(args.patients, typo_rate=args.typo_rate))
+    build_seconds = time.perf_counter() - started
+    timings, hits = [], 0
+    for query, intended in generate_queries(args.queries):
+        started = time.perf_counter()
+        found = candidates(variants, query)
+        timings.append((time.perf_counter() - started) * 1000)
+        hits += intended in found
+    return {
+        "mode": "memory",
+        "patients": args.patients,
+        "distinct_tokens": distinct,
+        "variant_keys": len(variants),
+        "build_seconds": round(build_seconds, 2),
+        "queries": args.queries,
+        "recall": round(hits / args.queries, 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def run_db(args):
+    from dotenv import load_dotenv
+    load_dotenv()
+    from database.connection import get_db_connection
+    from services.patient_search import search
+
+    timings, hits = [], 0
+    for db in get_db_connection():
+        for query, intended in generate_queries(args.queries):
+            started = time.perf_counter()
+            rows, _ = search(db, query, "fuzzy", 20)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += any(intended in name_tokens(row["first_name"], row["last_name"]) for row in rows)
+    return {
+        "mode": "db",
+        "queries": args.queries,
+        "recall": round(hits / args.queries, 3),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy name candidate generation")
+    parser.add_argument("--patients", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--typo-rate", type=float, default=0.05)
+    parser.add_argument("--db", action="store_true",
+                        help="Time full fuzzy searches against the configured database instead")
+    args = parser.parse_args(argv)
+    print(json.dumps(run_db(args) if args.db else run_memory(args)))
+
+
+if __name__ == "__main__":
+    main()
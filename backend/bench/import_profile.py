@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Run from backend/: python -m bench.import_profile --runs 5 --serve
+# Imports the app in fresh interpreters under `python -X importtime` and
+# reports the import time, the packages it is spent in and which of our
+# modules pulls each third-party package in. --serve also starts uvicorn
+# and times how long /api/health (bound) and /api/ready (warm) take.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_PARTY = {"main", "routes", "services", "database", "models", "bench", "manage", "serve"}
+
+
+def parse_importtime(stderr: str):
+    """{module: (self_us, cumulative_us, importer)} from -X importtime output.
+
+    Lines come out children first, indented one level deeper than the
+    module that imported them, so a module's importer is the next line
+    printed at a shallower depth.
+    """
+    modules, pending = {}, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        while pending and pending[-1][0] > depth:
+            child = pending.pop()[1]
+            modules[child] = modules[child][:2] + (name,)
+        modules[name] = (int(own), int(cumulative), None)
+        pending.append((depth, name))
+    return modules
+
+
+def first_party_importer(name, modules):
+    while name is not None and name.split(".")[0] not in FIRST_PARTY:
+        name = modules[name][2]
+    return name
+
+
+def profile_once(module: str):
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=BACKEND_DIR,
+                          capture_output=True, text=True, check=True)
+    return float(done.stdout.strip().splitlines()[-1]), parse_importtime(done.stderr)
+
+
+def profile(module: str, runs: int, top: int) -> dict:
+    seconds, packages, pulled_in = [], {}, {}
+    for _ in range(runs):
+        elapsed, modules = profile_once(module)
+        seconds.append(elapsed)
+        totals = {}
+        for name, (own, _, _) in modules.items():
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0) + own
+            if package not in FIRST_PARTY and package not in pulled_in:
+                pulled_in[package] = first_party_importer(name, modules)
+        for package, total in totals.items():
+            packages.setdefault(package, []).append(total)
+    ranked = sorted(((statistics.median(v) / 1000, k) for k, v in packages.items()), reverse=True)
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": round(statistics.median(seconds) * 1000, 1),
+        "modules_imported": len(modules),
+        "packages": [{"package": package, "self_ms": round(ms, 1), "imported_by": pulled_in.get(package)}
+                     for ms, package in ranked[:top]],
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float, status: int = 200):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return time.monotonic()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def serve_once(module: str, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "bench-secret")
+    started = time.monotonic()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        healthy = wait_for(base + "/api/health", started + timeout)
+        ready = wait_for(base + "/api/ready", started + timeout) if healthy else None
+    finally:
+        server.terminate()
+        server.wait(10)
+    return {
+        "health_ms": round((healthy - started) * 1000, 1) if healthy else None,
+        "ready_ms": round((ready - started) * 1000, 1) if ready else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile app import and start-up time")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement; medians are reported")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by import time")
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn until /api/health and /api/ready answer")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for each endpoint with --serve")
+    parser.add_argument("--budget-ms", type=float, help="Exit non-zero when the median import takes longer")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    results = profile(args.module, args.runs, args.top)
+    if args.serve:
+        runs = [serve_once(args.module, args.timeout) for _ in range(args.runs)]
+        results["serve"] = {}
+        for key in ("health_ms", "ready_ms"):
+            values = [run[key] for run in runs if run[key] is not None]
+            results["serve"][key] = statistics.median(values) if values else None
+    status = 0
+    if args.budget_ms is not None:
+        results["budget_ms"] = args.budget_ms
+        status = 1 if results["import_ms"] > args.budget_ms else 0
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(report + "\n")
+    print(report)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
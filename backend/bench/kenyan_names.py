@@ -0,0 +1,114 @@
+import argparse
+import csv
+import random
+import sys
+from datetime import date, timedelta
+
+# Common given names and surnames across Kikuyu, Luo, Kalenjin, Luhya,
+# Kamba and coastal communities, plus the English given names often paired
+# with them on ID cards.
+FIRST_NAMES = [
+    "James", "Grace", "David", "Faith", "Samuel", "Mary", "John", "Esther", "Peter", "Mercy",
+    "Joseph", "Ruth", "Daniel", "Lucy", "Brian", "Caroline", "Kevin", "Purity", "Dennis", "Naomi",
+    "Wanjiku", "Wanjiru", "Njeri", "Wambui", "Nyambura", "Wairimu", "Kamau", "Njoroge", "Mwangi", "Kariuki",
+    "Achieng", "Akinyi", "Atieno", "Adhiambo", "Awino", "Otieno", "Odhiambo", "Ochieng", "Omondi", "Onyango",
+    "Chebet", "Jepkosgei", "Jeptoo", "Cherono", "Kiprono", "Kipchoge", "Kiplagat", "Kibet", "Kiptoo", "Cheruiyot",
+    "Nafula", "Nekesa", "Wafula", "Wanyama", "Barasa", "Mutua", "Mwende", "Mueni", "Ndunge", "Musyoka",
+    "Zawadi", "Amina", "Halima", "Baraka", "Juma", "Rehema", "Bakari", "Mwanaisha", "Salim", "Imani",
+]
+LAST_NAMES = [
+    "Mwangi", "Kamau", "Njoroge", "Kariuki", "Wanjiku", "Ndirangu", "Mbugua", "Gitau", "Macharia", "Waweru",
+    "Otieno", "Odhiambo", "Ochieng", "Omondi", "Onyango", "Owino", "Okoth", "Ouma", "Oduor", "Achieng",
+    "Kipchoge", "Kiprono", "Cheruiyot", "Kiptoo", "Rotich", "Koech", "Langat", "Kirui", "Ruto", "Too",
+    "Wafula", "Wanyama", "Barasa", "Simiyu", "Wekesa", "Nabwire", "Makokha", "Masinde", "Wamalwa", "Khaemba",
+    "Mutua", "Musyoka", "Kilonzo", "Mwendwa", "Muthoka", "Nzioka", "Kyalo", "Mulwa", "Muema", "Ndambuki",
+    "Hassan", "Mohamed", "Omar", "Abdalla", "Said", "Mwinyi", "Bakari", "Ali", "Juma", "Kombo",
+]
+CITIES = ["Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", "Thika", "Machakos", "Nyeri", "Kakamega", "Kericho"]
+PREFIXES = ["700", "701", "702", "710", "711", "712", "720", "721", "722", "733", "740", "757", "768", "790"]
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """Apply one registration-desk style error: swap, drop, double or substitute a letter."""
+    word = name.lower()
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    choice = rng.random()
+    if choice < 0.25:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if choice < 0.5:
+        return word[:i] + word[i + 1:]
+    if choice < 0.65:
+        return word[:i] + word[i] + word[i:]
+    substitutions = {"r": "l", "l": "r", "k": "g", "g": "k", "e": "i", "i": "e", "o": "u", "u": "o", "j": "y"}
+    return word[:i] + substitutions.get(word[i], "a") + word[i + 1:]
+
+
+def generate_patients(count: int, seed: int = 42, start_id: int = 100000, hospitals=(1, 2),
+                      typo_rate: float = 0.05):
+    """Yield synthetic patient dicts shaped like the patients table.
+
+    A typo_rate share of names is stored misspelt, as happens at real
+    registration desks, which keeps the distinct-token dictionary realistic.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    for offset in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        if rng.random() < typo_rate:
+            last = misspell(last, rng).capitalize()
+        if rng.random() < 0.3:
+            # Middle names are common and end up in first_name
+            first = f"{first} {rng.choice(FIRST_NAMES)}"
+        phone = rng.choice(PREFIXES) + f"{rng.randrange(1000000):06d}"
+        yield {
+            "patient_id": start_id + offset,
+            "hospital_id": rng.choice(hospitals),
+            "first_name": first,
+            "last_name": last,
+            "date_of_birth": (today - timedelta(days=rng.randrange(365, 365 * 90))).isoformat(),
+            "gender_id": rng.choice((1, 2)),
+            "address": f"{rng.randrange(1, 999)} {rng.choice(LAST_NAMES)} Rd",
+            "city": rng.choice(CITIES),
+            "phone_number": f"+254-{phone[:3]}-{phone[3:]}",
+            "email": None,
+            "national_id_number": str(20000000 + start_id + offset),
+            "emergency_contact_name": f"{rng.choice(FIRST_NAMES)} {last}",
+            "emergency_contact_phone": f"+254-{rng.choice(PREFIXES)}-{rng.randrange(1000000):06d}",
+        }
+
+
+def generate_queries(count: int, seed: int = 7):
+    """Yield (misspelt query, intended surname) pairs for fuzzy search runs."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        name = rng.choice(LAST_NAMES + FIRST_NAMES)
+        yield misspell(name, rng), name.lower()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Kenyan patient dataset as CSV")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-id", type=int, default=100000)
+    parser.add_argument("--typo-rate", type=float, default=0.05)
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args(argv)
+
+    handle = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = None
+        for patient in generate_patients(args.count, args.seed, args.start_id, typo_rate=args.typo_rate):
+            if writer is None:
+                writer = csv.DictWriter(handle, fieldnames=list(patient))
+                writer.writeheader()
+            writer.writerow(patient)
+    finally:
+        if handle is not sys.stdout:
+            handle.close()
+
+
+if __name__ == "__main__":
+    main()
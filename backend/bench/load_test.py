@@ -0,0 +1,340 @@
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+
+# Drives a running API with a clinic-like request mix and reports
+# per-endpoint throughput and latency percentiles as JSON. Seed first with
+# bench.seed, then from backend/:
+#   python -m bench.load_test --url http://127.0.0.1:8000 --scale 1m --duration 60 --output run.json
+#   python -m bench.load_test ... --baseline run.json   # exit 1 on regressions
+from bench.kenyan_names import LAST_NAMES, PREFIXES, generate_queries
+
+# Kept free of database imports so the driver runs from any machine;
+# these mirror bench.seed and the doctors in database/sample_data.sql
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+DOCTOR_IDS = (1, 2, 3)
+
+# (scenario, weight): a chart view or audit browse is several requests, as in the UI
+MIX = {
+    "search_name": 25,
+    "search_phone": 5,
+    "search_fuzzy": 5,
+    "chart_view": 30,
+    "encounter_create": 10,
+    "audit_browse": 15,
+    "audit_summary": 5,
+    "batch_fetch": 5,
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Session:
+    """One login shared by all workers; logins are throttled per username."""
+
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.token = None
+        self._lock = threading.Lock()
+
+    def login(self, stale_token=None):
+        with self._lock:
+            if self.token is not None and self.token != stale_token:
+                return self.token  # another worker already refreshed it
+            client = Client(self.base_url, None)
+            status, body, _ = client.request("POST", "/api/auth/login",
+                                             {"username": self.username, "password": self.password})
+            client.close()
+            if status != 200:
+                raise SystemExit(f"Login failed ({status}): {body[:200]!r}")
+            self.token = json.loads(body)["access_token"]
+            return self.token
+
+
+class Client:
+    """A keep-alive connection recording each call under its route template."""
+
+    def __init__(self, base_url: str, session, recorder=None, accept_encoding: str = ""):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.hostname, parts.port, timeout=30)
+        self.connection = self._connect()
+        self.session = session
+        self.recorder = recorder
+        self.accept_encoding = accept_encoding
+
+    def close(self):
+        self.connection.close()
+
+    def request(self, method, path, body=None, route=None, params=None):
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {"Accept": "application/json"}
+        if self.accept_encoding:
+            headers["Accept-Encoding"] = self.accept_encoding  # bodies are counted as sent, not decoded
+        if body is not None:
+            body = json.dumps(body, default=str)
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            token = self.session.token if self.session else None
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+            started = time.perf_counter()
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                self.connection = self._connect()
+                status, data, response = 0, b"", None
+            elapsed = time.perf_counter() - started
+            if status == 401 and self.session and attempt == 0:
+                self.session.login(token)
+                continue
+            break
+        if self.recorder is not None:
+            self.recorder.record(f"{method} {route or path}", status, elapsed, len(data))
+        return status, data, response
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.bytes = defaultdict(int)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.active = False
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, status, seconds, size=0):
+        if not self.active:
+            return  # warm-up
+        with self._lock:
+            if 200 <= status < 400:
+                self.latencies[endpoint].append(seconds * 1000)
+                self.bytes[endpoint] += size
+            else:
+                self.errors[endpoint][str(status)] += 1
+
+    def summary(self, seconds):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            timings = self.latencies.get(endpoint, [])
+            errors = dict(self.errors.get(endpoint, {}))
+            endpoints[endpoint] = {
+                "requests": len(timings) + sum(errors.values()),
+                "errors": errors,
+                "throughput_rps": round(len(timings) / seconds, 2),
+                "p50_ms": round(percentile(timings, 50), 2) if timings else None,
+                "p95_ms": round(percentile(timings, 95), 2) if timings else None,
+                "p99_ms": round(percentile(timings, 99), 2) if timings else None,
+                "max_ms": round(max(timings), 2) if timings else None,
+                "bytes_mean": round(self.bytes[endpoint] / len(timings)) if timings else None,
+            }
+        everything = [value for timings in self.latencies.values() for value in timings]
+        total = {
+            "requests": sum(e["requests"] for e in endpoints.values()),
+            "errors": sum(sum(e["errors"].values()) for e in endpoints.values()),
+            "throughput_rps": round(len(everything) / seconds, 2),
+            "p50_ms": round(percentile(everything, 50), 2) if everything else None,
+            "p95_ms": round(percentile(everything, 95), 2) if everything else None,
+            "p99_ms": round(percentile(everything, 99), 2) if everything else None,
+        }
+        return endpoints, total
+
+
+class Workload:
+    def __init__(self, start_id: int, patients: int, seed: int):
+        self.start_id = start_id
+        self.patients = patients
+        self.fuzzy = [query for query, _ in generate_queries(500, seed)]
+
+    def patient_id(self, rng):
+        return rng.randrange(self.start_id, self.start_id + self.patients)
+
+    def search_name(self, client, rng):
+        client.request("POST", "/api/patients/search",
+                       {"query": rng.choice(LAST_NAMES), "search_type": "name", "limit": 50},
+                       route="/api/patients/search [name]")
+
+    def search_phone(self, client, rng):
+        client.request("POST", "/api/patients/search",
+                       {"query": rng.choice(PREFIXES) + f"{rng.randrange(1000):03d}", "search_type": "phone"},
+                       route="/api/patients/search [phone]")
+
+    def search_fuzzy(self, client, rng):
+        client.request("POST", "/api/patients/search",
+                       {"query": rng.choice(self.fuzzy), "search_type": "fuzzy", "limit": 20},
+                       route="/api/patients/search [fuzzy]")
+
+    def chart_view(self, client, rng):
+        patient_id = self.patient_id(rng)
+        client.request("GET", f"/api/patients/{patient_id}", route="/api/patients/{patient_id}")
+        client.request("GET", f"/api/patients/{patient_id}/encounters",
+                       route="/api/patients/{patient_id}/encounters")
+
+    def encounter_create(self, client, rng):
+        patient_id = self.patient_id(rng)
+        client.request("POST", f"/api/patients/{patient_id}/encounters", {
+            "patient_id": patient_id,
+            "doctor_id": rng.choice(DOCTOR_IDS),
+            "chief_complaint": "Load test follow-up",
+            "diagnosis_description": "Review",
+            "encounter_date_time": datetime.now().replace(microsecond=0).isoformat(),
+        }, route="/api/patients/{patient_id}/encounters")
+
+    def audit_browse(self, client, rng):
+        status, _, response = client.request("GET", "/api/audit/logs", params={"limit": 50},
+                                             route="/api/audit/logs")
+        next_cursor = response.getheader("X-Next-Cursor") if response is not None and status == 200 else None
+        if next_cursor:
+            client.request("GET", "/api/audit/logs", params={"limit": 50, "cursor": next_cursor},
+                           route="/api/audit/logs [next page]")
+        patient_id = self.patient_id(rng)
+        client.request("GET", f"/api/audit/patient/{patient_id}/history",
+                       route="/api/audit/patient/{patient_id}/history")
+
+    def audit_summary(self, client, rng):
+        client.request("GET", "/api/audit/summary", params={"days": 7}, route="/api/audit/summary")
+
+    def batch_fetch(self, client, rng):
+        client.request("POST", "/api/patients/batch",
+                       {"patient_ids": [self.patient_id(rng) for _ in range(20)], "include_encounters": True},
+                       route="/api/patients/batch")
+
+
+def worker(index, args, session, recorder, workload, deadline, mix):
+    rng = random.Random(args.seed * 1000 + index)
+    client = Client(args.url, session, recorder, args.accept_encoding)
+    names, weights = zip(*mix.items())
+    try:
+        while time.monotonic() < deadline:
+            getattr(workload, rng.choices(names, weights)[0])(client, rng)
+            if args.think_ms:
+                time.sleep(rng.expovariate(1000 / args.think_ms))
+    finally:
+        client.close()
+
+
+def compare(results, baseline, tolerance):
+    """Endpoints whose p95 grew or throughput fell by more than `tolerance` against the baseline."""
+    regressions = []
+    for endpoint, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before or not before.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append({"endpoint": endpoint, "metric": "p95_ms",
+                                "baseline": before["p95_ms"], "current": current["p95_ms"]})
+        if before["throughput_rps"] and current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append({"endpoint": endpoint, "metric": "throughput_rps",
+                                "baseline": before["throughput_rps"], "current": current["throughput_rps"]})
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_mix(value):
+    mix = dict(MIX)
+    for item in filter(None, (value or "").split(",")):
+        name, _, weight = item.partition("=")
+        if name not in MIX:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}; choose from {', '.join(MIX)}")
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    session = Session(args.url, args.username, args.password)
+    session.login()
+    recorder = Recorder()
+    workload = Workload(args.start_id, args.patients, args.seed)
+
+    started = time.monotonic()
+    deadline = started + args.warmup + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(i, args, session, recorder, workload, deadline, mix), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.active = True
+    measured_from = time.monotonic()
+    for thread in threads:
+        thread.join()
+    recorder.active = False
+    seconds = time.monotonic() - measured_from
+
+    endpoints, total = recorder.summary(seconds)
+    return {
+        "config": {
+            "url": args.url, "scale": args.scale, "patients": args.patients, "concurrency": args.concurrency,
+            "duration_s": args.duration, "warmup_s": args.warmup, "think_ms": args.think_ms, "seed": args.seed,
+            "accept_encoding": args.accept_encoding,
+            "mix": mix, "revision": git_revision(), "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "measured_seconds": round(seconds, 2),
+        "endpoints": endpoints,
+        "total": total,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the API with a realistic request mix")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", default="dr.smith")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k", help="Which bench.seed dataset is loaded")
+    parser.add_argument("--patients", type=int, help="Seeded patient count (defaults to the scale)")
+    parser.add_argument("--start-id", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="Unmeasured seconds before the run")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between scenarios per worker")
+    parser.add_argument("--mix", help="Override weights, e.g. chart_view=50,encounter_create=0")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--accept-encoding", default="gzip, br", help="Sent with every request; '' for identity")
+    parser.add_argument("--output", help="Also write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95/throughput drift vs baseline")
+    args = parser.parse_args(argv)
+    args.patients = SCALES[args.scale] if args.patients is None else args.patients
+
+    results = run(args)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            results["regressions"] = compare(results, json.load(handle), args.tolerance)
+        status = 1 if results["regressions"] else 0
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(report + "\n")
+    print(report)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Run from backend/ against a database loaded with database/sample_data.sql:
+#   python -m bench.seed --scale 1m
+# Seeded patients start at --start-id and seeded audit rows carry BENCH_IP,
+# so --reset removes exactly what an earlier run added.
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bench.kenyan_names import generate_patients, FIRST_NAMES, LAST_NAMES
+from database.audit_writer import AUDIT_COLUMNS, build_insert
+from database.connection import DatabaseConnection
+from services import patient_search
+from services.patient_import import IMPORT_COLUMNS, INSERT_COLUMNS
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+BENCH_IP = "198.18.0.1"  # RFC 2544 benchmarking range
+DOCTOR_IDS = (1, 2, 3)
+STAFF_IDS = (1, 2, 3, 4, 5)
+DELETE_CHUNK = 50000
+
+ENCOUNTERS = [
+    ("Fever and cough for 3 days", "Upper respiratory tract infection", "Antibiotics, rest, fluids"),
+    ("Headache and joint pains", "Malaria, uncomplicated", "Artemether-lumefantrine, review in 3 days"),
+    ("Diabetes follow-up", "Type 2 diabetes mellitus, well controlled", "Continue metformin, dietary counseling"),
+    ("Routine prenatal checkup", "Normal pregnancy progression", "Continue prenatal vitamins"),
+    ("Blood pressure review", "Essential hypertension", "Continue amlodipine, reduce salt intake"),
+    ("Diarrhoea and vomiting", "Acute gastroenteritis", "Oral rehydration salts, zinc"),
+    ("Knee pain after fall", "Knee contusion", "Rest, ice, compression, elevation"),
+    ("Chest pain and shortness of breath", "Acute myocardial infarction", "Refer to cardiology"),
+]
+# Weights roughly follow production: reads dominate, logins bracket sessions
+AUDIT_ACTIONS = [("VIEW", 50), ("SEARCH", 20), ("UPDATE", 10), ("CREATE", 10), ("LOGIN", 5), ("LOGOUT", 5)]
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def random_time(rng, now, days):
+    return (now - timedelta(seconds=rng.randrange(days * 86400))).replace(microsecond=0)
+
+
+def audit_row(rng, now, days, patient_ids):
+    action = rng.choices([a for a, _ in AUDIT_ACTIONS], [w for _, w in AUDIT_ACTIONS])[0]
+    user_id = rng.choice(STAFF_IDS)
+    patient_id = rng.randrange(*patient_ids)
+    table, record_id, old_value, new_value, module = "patients", patient_id, None, None, "PATIENTS"
+    if action in ("LOGIN", "LOGOUT"):
+        module, table, record_id = "AUTH", None, None
+    elif action == "SEARCH":
+        record_id = None
+        old_value = json.dumps({"search_query": rng.choice(LAST_NAMES), "search_type": "name"})
+    elif action == "UPDATE":
+        old_value = json.dumps({"city": "Nairobi"})
+        new_value = json.dumps({"city": "Mombasa"})
+    elif action == "CREATE":
+        table = "patient_encounters"
+        new_value = json.dumps({"patient_id": patient_id, "chief_complaint": rng.choice(ENCOUNTERS)[0]})
+    return (user_id, action, module, table, record_id, old_value, new_value, BENCH_IP,
+            random_time(rng, now, days), 1)
+
+
+def insert_rows(cursor, table, columns, rows):
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    cursor.execute(
+        "INSERT INTO {} ({}) VALUES {}".format(table, ", ".join(columns), ", ".join([row_sql] * len(rows))),
+        tuple(value for row in rows for value in row)
+    )
+
+
+def seed_patients(db, args, rng, now):
+    """Patients, one medical record each and ~encounters-per-patient encounters, one transaction per chunk."""
+    connection = db.connection
+    cursor = connection.cursor()
+    created_at = now.replace(microsecond=0)
+    totals = {"patients": 0, "encounters": 0}
+    chunk = []
+    try:
+        for patient in generate_patients(args.patients, args.seed, args.start_id):
+            chunk.append(patient)
+            if len(chunk) < args.chunk_size and patient["patient_id"] < args.start_id + args.patients - 1:
+                continue
+            connection.start_transaction()
+            insert_rows(cursor, "patients", INSERT_COLUMNS,
+                        [tuple(p[c] for c in IMPORT_COLUMNS) + (1, 1, created_at, created_at) for p in chunk])
+            insert_rows(cursor, "medical_records", ("patient_id", "created_by", "created_at", "updated_at"),
+                        [(p["patient_id"], 1, created_at, created_at) for p in chunk])
+            cursor.execute(
+                "SELECT patient_id, record_id FROM medical_records WHERE patient_id BETWEEN %s AND %s",
+                (chunk[0]["patient_id"], chunk[-1]["patient_id"])
+            )
+            records = dict(cursor.fetchall())
+            encounters = []
+            for p in chunk:
+                count = int(args.encounters_per_patient) + (rng.random() < args.encounters_per_patient % 1)
+                for _ in range(count):
+                    complaint, diagnosis, plan = rng.choice(ENCOUNTERS)
+                    encounters.append((records[p["patient_id"]], p["patient_id"], rng.choice(DOCTOR_IDS),
+                                       random_time(rng, now, args.days), complaint, diagnosis, plan,
+                                       1, created_at, created_at))
+            if encounters:
+                insert_rows(cursor, "patient_encounters",
+                            ("record_id", "patient_id", "doctor_id", "encounter_date_time", "chief_complaint",
+                             "diagnosis_description", "treatment_plan", "created_by", "created_at", "updated_at"),
+                            encounters)
+            if not args.skip_index:
+                patient_search.index_patients(db, chunk)
+            connection.commit()
+            totals["patients"] += len(chunk)
+            totals["encounters"] += len(encounters)
+            log(f"Seeded {totals['patients']} patients, {totals['encounters']} encounters")
+            chunk = []
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return totals
+
+
+def seed_audit(db, args, rng, now):
+    connection = db.connection
+    cursor = connection.cursor()
+    patient_ids = (args.start_id, args.start_id + max(args.patients, 1))
+    total = 0
+    try:
+        while total < args.audit_rows:
+            rows = [audit_row(rng, now, args.days, patient_ids)
+                    for _ in range(min(args.chunk_size, args.audit_rows - total))]
+            cursor.execute(build_insert(len(rows)), tuple(value for row in rows for value in row))
+            total += len(rows)
+            if total % (args.chunk_size * 20) < args.chunk_size or total == args.audit_rows:
+                log(f"Seeded {total} audit rows")
+    finally:
+        cursor.close()
+    return total
+
+
+def reset(db, start_id):
+    """Delete rows added by earlier runs, in chunks so undo logs stay small."""
+    cursor = db.connection.cursor()
+    try:
+        for table, condition, params in (
+            ("patient_search_tokens", "patient_id >= %s", (start_id,)),
+            ("patient_encounters", "patient_id >= %s", (start_id,)),
+            ("medical_records", "patient_id >= %s", (start_id,)),
+            ("patients", "patient_id >= %s", (start_id,)),
+            ("audit_logs", "ip_address = %s", (BENCH_IP,)),
+        ):
+            deleted = 0
+            while True:
+                cursor.execute(f"DELETE FROM {table} WHERE {condition} LIMIT {DELETE_CHUNK}", params)
+                deleted += cursor.rowcount
+                if cursor.rowcount < DELETE_CHUNK:
+                    break
+            log(f"Removed {deleted} rows from {table}")
+    finally:
+        cursor.close()
+
+
+def run(args):
+    db = DatabaseConnection()
+    if not db.connect():
+        raise SystemExit("Database connection failed")
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    try:
+        existing = db.execute_query("SELECT COUNT(*) AS n FROM patients WHERE patient_id >= %s", (args.start_id,))
+        if existing is None:
+            raise SystemExit("Could not read patients; is the schema migrated?")
+        if existing[0]["n"]:
+            if not args.reset:
+                raise SystemExit(f"{existing[0]['n']} seeded patients already exist; pass --reset to replace them")
+        if args.reset:
+            reset(db, args.start_id)
+
+        started = time.perf_counter()
+        totals = seed_patients(db, args, rng, now)
+        totals["audit_rows"] = seed_audit(db, args, rng, now)
+        if not args.skip_rollups:
+            from database.audit_rollups import rebuild
+            totals["rollup_buckets"] = rebuild(db, now - timedelta(days=args.days), now + timedelta(hours=1), log=log)
+        totals["seconds"] = round(time.perf_counter() - started, 1)
+    finally:
+        db.disconnect()
+    return {"scale": args.scale, "seed": args.seed, "start_id": args.start_id, **totals}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed synthetic patients, encounters and audit rows for load tests")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="10k",
+                        help="Patients and audit rows to add (overridable below)")
+    parser.add_argument("--patients", type=int)
+    parser.add_argument("--audit-rows", type=int)
+    parser.add_argument("--encounters-per-patient", type=float, default=2.0)
+    parser.add_argument("--days", type=int, default=365, help="Spread encounters and audit rows over this many days")
+    parser.add_argument("--start-id", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Remove rows from an earlier seed first")
+    parser.add_argument("--skip-index", action="store_true", help="Leave search tokens to rebuild-search-index")
+    parser.add_argument("--skip-rollups", action="store_true", help="Leave rollups to rebuild-audit-rollups")
+    args = parser.parse_args(argv)
+    args.patients = SCALES[args.scale] if args.patients is None else args.patients
+    args.audit_rows = SCALES[args.scale] if args.audit_rows is None else args.audit_rows
+    print(json.dumps(run(args)))
+
+
+if __name__ == "__main__":
+    main()
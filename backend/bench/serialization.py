@@ -0,0 +1,143 @@
+import argparse
+import json
+import random
+import statistics
+import time
+import zlib
+from datetime import datetime, timedelta
+
+# Run from backend/: python -m bench.serialization --iterations 200
+# Serializes representative result pages the old way (SELECT * rows through
+# jsonable_encoder) and the new way (projected rows through FastJSONResponse)
+# and reports payload bytes, raw and compressed, per endpoint.
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from bench.kenyan_names import generate_patients
+from models.schemas import PATIENT_COLUMNS, ENCOUNTER_COLUMNS, AUDIT_LOG_COLUMNS
+from services import compression
+from services.json_response import FastJSONResponse, orjson
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def patient_row(patient, rng, now):
+    # Everything SELECT p.* returned, including the columns projection drops
+    row = dict(patient)
+    row.update({
+        "date_of_birth": datetime.fromisoformat(patient["date_of_birth"]).date(),
+        "is_active": 1, "created_by": 1, "updated_by": 2,
+        "created_at": now - timedelta(days=rng.randrange(1000)), "updated_at": now,
+        "row_version": rng.randrange(1, 10 ** 7), "blockchain_hash": "%064x" % rng.getrandbits(256),
+        "gender": rng.choice(("Male", "Female")), "hospital_name": "Central Medical Hospital",
+    })
+    return row
+
+
+def encounter_row(patient_id, rng, now):
+    return {
+        "encounter_id": rng.randrange(10 ** 7), "record_id": patient_id, "patient_id": patient_id,
+        "doctor_id": rng.choice((1, 2, 3)), "encounter_date_time": now - timedelta(minutes=rng.randrange(10 ** 6)),
+        "chief_complaint": "Fever and cough for 3 days", "diagnosis_description": "Upper respiratory tract infection",
+        "treatment_plan": "Antibiotics, rest, fluids", "notes": "Follow up in 1 week", "client_ref": None,
+        "created_by": 1, "updated_by": None, "created_at": now, "updated_at": now, "row_version": rng.randrange(10 ** 7),
+        "blockchain_hash": "%064x" % rng.getrandbits(256),
+        "doctor_first_name": "John", "doctor_last_name": "Smith",
+    }
+
+
+def audit_row(rng, now):
+    return {
+        "log_id": rng.randrange(10 ** 8), "user_id": rng.randrange(1, 6), "action_type": "UPDATE",
+        "module": "PATIENTS", "table_name": "patients", "record_id_affected": rng.randrange(100000, 200000),
+        "old_value": json.dumps({"phone_number": "+254-733-789012", "city": "Nairobi"}),
+        "new_value": json.dumps({"phone_number": "+254-733-789013", "city": "Nakuru"}),
+        "ip_address": "192.168.1.100", "action_timestamp": now - timedelta(seconds=rng.randrange(10 ** 7)),
+        "is_success": 1, "blockchain_hash": "%064x" % rng.getrandbits(256),
+        "first_name": "Sarah", "last_name": "Johnson", "username": "dr.johnson",
+    }
+
+
+def project(row, columns, extra=()):
+    return {key: row[key] for key in tuple(columns) + tuple(extra) if key in row}
+
+
+def payloads(seed: int):
+    """(endpoint, SELECT * content, projected content) for typical page sizes."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    patients = [patient_row(p, rng, now) for p in generate_patients(1000, seed)]
+    patient_extra = ("gender", "hospital_name")
+    encounter_extra = ("doctor_first_name", "doctor_last_name")
+    audit_extra = ("first_name", "last_name", "username")
+
+    def patients_page(rows):
+        return rows, [project(row, PATIENT_COLUMNS, patient_extra) for row in rows]
+
+    encounters = [encounter_row(100000, rng, now) for _ in range(30)]
+    audit = [audit_row(rng, now) for _ in range(100)]
+    batch_star, batch_projected = [], []
+    for patient in patients[:200]:
+        items = [encounter_row(patient["patient_id"], rng, now) for _ in range(5)]
+        batch_star.append({"patient_id": patient["patient_id"], "found": True, "patient": patient, "encounters": items})
+        batch_projected.append({
+            "patient_id": patient["patient_id"], "found": True,
+            "patient": project(patient, PATIENT_COLUMNS, patient_extra),
+            "encounters": [project(item, ENCOUNTER_COLUMNS, encounter_extra) for item in items],
+        })
+    return [
+        ("POST /api/patients/search", *patients_page(patients[:50])),
+        ("GET /api/patients/{patient_id}/encounters", encounters,
+         [project(row, ENCOUNTER_COLUMNS, encounter_extra) for row in encounters]),
+        ("GET /api/audit/logs", audit, [project(row, AUDIT_LOG_COLUMNS, audit_extra) for row in audit]),
+        ("POST /api/patients/batch", batch_star, batch_projected),
+        ("GET /api/sync/changes", *(
+            {"changes": {"patients": rows, "patient_encounters": []}, "next_token": "x", "has_more": True}
+            for rows in patients_page(patients)
+        )),
+    ]
+
+
+def timed(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return result, {"p50_us": round(statistics.median(timings), 1), "p95_us": round(percentile(timings, 95), 1)}
+
+
+def compressed_sizes(body: bytes) -> dict:
+    sizes = {"raw": len(body), "gzip": len(zlib.compress(body, compression.COMPRESSION_GZIP_LEVEL, wbits=31))}
+    if compression.brotli is not None:
+        sizes["br"] = len(compression.brotli.compress(body, quality=compression.COMPRESSION_BROTLI_QUALITY))
+    return sizes
+
+
+def run(args):
+    results = {"iterations": args.iterations, "orjson": orjson is not None,
+               "brotli": compression.brotli is not None, "endpoints": {}}
+    for endpoint, star, projected in payloads(args.seed):
+        before_body, before = timed(lambda: JSONResponse(jsonable_encoder(star)).body, args.iterations)
+        after_body, after = timed(lambda: FastJSONResponse(projected).body, args.iterations)
+        results["endpoints"][endpoint] = {
+            "before": {"serialize": before, "bytes": compressed_sizes(before_body)},
+            "after": {"serialize": after, "bytes": compressed_sizes(after_body)},
+            "serialize_speedup_p50": round(before["p50_us"] / max(after["p50_us"], 0.1), 1),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and payload size per endpoint")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from services.json_response import dumps
+
+# Monthly audit_logs partitions that aged out of the hot window, one gzip
+# NDJSON file per month plus a small JSON manifest describing it
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'var', 'audit-archive'))
+AUDIT_ARCHIVE_GZIP_LEVEL = int(os.getenv('AUDIT_ARCHIVE_GZIP_LEVEL', '6'))
+
+
+def _paths(month: str, directory: str):
+    base = os.path.join(directory, f"audit_logs-{month}")
+    return base + ".ndjson.gz", base + ".json"
+
+
+def _replace(tmp_path: str, path: str):
+    with open(tmp_path, 'rb') as written:
+        os.fsync(written.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_month(month: str, start: datetime, end: datetime, chunks, directory: str = None) -> dict:
+    """Write (columns, rows) chunks for one month and return its manifest.
+
+    Rows must arrive newest first (action_timestamp DESC, log_id DESC), which
+    is what lets search() stop reading a file early. Both files are written
+    under temporary names and renamed, so a crash never leaves a partial
+    archive that looks complete.
+    """
+    directory = directory or AUDIT_ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    data_path, manifest_path = _paths(month, directory)
+    digest = hashlib.sha256()
+    rows, newest, oldest, min_log_id, max_log_id = 0, None, None, None, None
+    chain_tails = {}
+    with open(data_path + ".tmp", 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=AUDIT_ARCHIVE_GZIP_LEVEL, mtime=0) as out:
+            for columns, chunk in chunks:
+                for values in chunk:
+                    row = dict(zip(columns, values))
+                    line = dumps(row) + b"\n"
+                    out.write(line)
+                    digest.update(line)
+                    rows += 1
+                    timestamp, log_id = row['action_timestamp'], row['log_id']
+                    newest = newest or timestamp
+                    oldest = timestamp
+                    min_log_id = log_id if min_log_id is None else min(min_log_id, log_id)
+                    max_log_id = log_id if max_log_id is None else max(max_log_id, log_id)
+                    shard = row.get('chain_shard')
+                    if shard is not None and row['chain_seq'] > chain_tails.get(str(shard), (0,))[0]:
+                        chain_tails[str(shard)] = (row['chain_seq'], row['blockchain_hash'])
+    _replace(data_path + ".tmp", data_path)
+
+    manifest = {
+        "month": month,
+        "file": os.path.basename(data_path),
+        # The oldest partition also holds anything written before its month
+        "start": min(start, oldest).isoformat() if oldest else start.isoformat(),
+        "end": end.isoformat(),
+        "rows": rows,
+        "newest": newest.isoformat() if newest else None,
+        "min_log_id": min_log_id,
+        "max_log_id": max_log_id,
+        "sha256": digest.hexdigest(),
+        # Last hash-chain position per shard, where verification of the
+        # rows left in MySQL picks up
+        "chain_tails": chain_tails,
+        "bytes": os.path.getsize(data_path),
+        "archived_at": datetime.now().replace(microsecond=0).isoformat(),
+    }
+    with open(manifest_path + ".tmp", 'w') as out:
+        json.dump(manifest, out, indent=2)
+    _replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def manifests(directory: str = None) -> list:
+    """Manifests of every archived month, newest month first."""
+    found = []
+    for path in glob.glob(os.path.join(directory or AUDIT_ARCHIVE_DIR, "audit_logs-*.json")):
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest["start"] = datetime.fromisoformat(manifest["start"])
+        manifest["end"] = datetime.fromisoformat(manifest["end"])
+        found.append(manifest)
+    return sorted(found, key=lambda m: m["end"], reverse=True)
+
+
+def archived_before(directory: str = None) -> datetime:
+    """Everything older than this lives in the archive; None when nothing is archived."""
+    found = manifests(directory)
+    return found[0]["end"] if found else None
+
+
+def read_month(manifest: dict, directory: str = None):
+    """Yield the archived rows of one month, newest first."""
+    with gzip.open(os.path.join(directory or AUDIT_ARCHIVE_DIR, manifest["file"]), 'rb') as f:
+        for line in f:
+            row = json.loads(line)
+            row['action_timestamp'] = datetime.fromisoformat(row['action_timestamp'])
+            yield row
+
+
+def verify_month(manifest: dict, directory: str = None) -> bool:
+    """True when the month's file still matches the checksum in its manifest."""
+    digest = hashlib.sha256()
+    with gzip.open(os.path.join(directory or AUDIT_ARCHIVE_DIR, manifest["file"]), 'rb') as f:
+        for line in f:
+            digest.update(line)
+    return digest.hexdigest() == manifest["sha256"]
+
+
+def search(match, limit: int, after=None, start: datetime = None, end: datetime = None,
+           columns=None, directory: str = None) -> list:
+    """Up to `limit` archived rows, newest first, for which match(row) is true.
+
+    `after` is an (action_timestamp, log_id) keyset bound as used by the
+    audit endpoints, and [start, end) restricts the time window. Months
+    outside the window are skipped by their manifest and a month is read
+    only as far as the window reaches, so the cost is proportional to the
+    months actually touched.
+    """
+    results = []
+    for manifest in manifests(directory):
+        if start and manifest["end"] <= start:
+            break
+        if (end and manifest["start"] >= end) or (after and manifest["start"] > after[0]):
+            continue
+        for row in read_month(manifest, directory):
+            timestamp = row['action_timestamp']
+            if start and timestamp < start:
+                break
+            if (end and timestamp >= end) or (after and (timestamp, row['log_id']) >= tuple(after)):
+                continue
+            if match(row):
+                results.append({key: row.get(key) for key in columns} if columns else row)
+                if len(results) >= limit:
+                    return results
+    return results
@@ -0,0 +1,299 @@
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import mysql.connector
+
+from database import audit_archive
+from database.connection import connect_kwargs
+
+# Independent chains audit rows are spread over. Each append locks one
+# shard's head row until its transaction commits, so this bounds how many
+# writers can append at once without waiting on each other.
+AUDIT_CHAIN_SHARDS = int(os.getenv('AUDIT_CHAIN_SHARDS', '16'))
+# Optional secret: with it the chain is an HMAC, which someone holding only
+# database access cannot recompute after editing rows. Changing it makes
+# every existing row fail verification.
+AUDIT_CHAIN_KEY = os.getenv('AUDIT_CHAIN_KEY', '').encode('utf-8')
+
+GENESIS_HASH = '0' * 64
+CHAIN_COLUMNS = ("chain_shard", "chain_seq", "blockchain_hash")
+VERIFY_COLUMNS = (
+    "chain_seq", "blockchain_hash", "user_id", "action_type", "module", "table_name",
+    "record_id_affected", "old_value", "new_value", "ip_address", "action_timestamp", "is_success",
+)
+MAX_REPORTED_ERRORS = 20
+
+
+def shard_for_thread() -> int:
+    # Stable per writer thread, so one process's flusher keeps to one chain
+    return zlib.crc32(f"{os.getpid()}:{threading.get_ident()}".encode()) % AUDIT_CHAIN_SHARDS
+
+
+def _int(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _json(value):
+    # Hashed parsed, so a JSON column handing back normalised text still verifies
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _timestamp(value) -> str:
+    # Whole seconds: a DATETIME without fractional precision rounds the rest away
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)[:19]
+
+
+def entry_hash(prev_hash: str, shard: int, seq: int, row) -> str:
+    """Hash of one audit row (AUDIT_COLUMNS order) chained to its predecessor's hash."""
+    user_id, action_type, module, table_name, record_id, old_value, new_value, ip_address, timestamp, ok = row
+    message = prev_hash.encode('ascii') + b"\n" + json.dumps(
+        [shard, seq, _int(user_id), action_type, module, table_name, _int(record_id),
+         _json(old_value), _json(new_value), ip_address, _timestamp(timestamp), 1 if ok else 0],
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    ).encode('utf-8')
+    if AUDIT_CHAIN_KEY:
+        return hmac.new(AUDIT_CHAIN_KEY, message, hashlib.sha256).hexdigest()
+    return hashlib.sha256(message).hexdigest()
+
+
+def _lock_head(cursor, shard: int):
+    cursor.execute("SELECT seq, entry_hash FROM audit_chain_heads WHERE shard = %s FOR UPDATE", (shard,))
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.execute(
+            "INSERT IGNORE INTO audit_chain_heads (shard, seq, entry_hash, updated_at) VALUES (%s, 0, %s, NOW())",
+            (shard, GENESIS_HASH)
+        )
+        cursor.execute("SELECT seq, entry_hash FROM audit_chain_heads WHERE shard = %s FOR UPDATE", (shard,))
+        rows = cursor.fetchall()
+    return int(rows[0][0]), rows[0][1]
+
+
+def append(cursor, rows, shard: int = None) -> list:
+    """Chain rows onto a shard and return them with CHAIN_COLUMNS appended.
+
+    Runs on the caller's transaction: the shard's head stays locked until it
+    commits, and a rollback takes the head back with the rows.
+    """
+    shard = shard_for_thread() if shard is None else shard
+    seq, prev_hash = _lock_head(cursor, shard)
+    chained = []
+    for row in rows:
+        row = list(row)
+        row[8] = _timestamp(row[8])
+        seq += 1
+        prev_hash = entry_hash(prev_hash, shard, seq, row)
+        chained.append(row + [shard, seq, prev_hash])
+    cursor.execute(
+        "UPDATE audit_chain_heads SET seq = %s, entry_hash = %s, updated_at = NOW() WHERE shard = %s",
+        (seq, prev_hash, shard)
+    )
+    return chained
+
+
+# -- verification ----------------------------------------------------------
+
+_worker_connection = None
+
+
+def _init_worker():
+    global _worker_connection
+    _worker_connection = mysql.connector.connect(autocommit=True, **connect_kwargs())
+
+
+def verify_range(unit) -> dict:
+    """Check one (shard, lo, hi, anchor) slice of a chain.
+
+    Every link only needs the row itself and its predecessor's stored hash,
+    so slices verify independently: the query reads from seq lo - 1 to pick
+    that predecessor up. `anchor` is the (seq, hash) known for lo - 1 from a
+    checkpoint or an archive, used when that row is no longer in the table
+    and compared against it when it is.
+    """
+    shard, lo, hi, anchor = unit
+    cursor = _worker_connection.cursor(buffered=False)
+    expected, prev_hash = lo - 1, anchor[1] if anchor else None
+    checked, errors, error_count = 0, [], 0
+
+    def fail(seq, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"shard": shard, "seq": seq, "error": message})
+
+    try:
+        cursor.execute(
+            "SELECT {} FROM audit_logs WHERE chain_shard = %s AND chain_seq BETWEEN %s AND %s "
+            "ORDER BY chain_seq".format(", ".join(VERIFY_COLUMNS)),
+            (shard, lo - 1, hi)
+        )
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            for row in rows:
+                seq, stored = row[0], row[1]
+                if seq == lo - 1:
+                    if anchor and anchor[1] is not None and anchor[1] != stored:
+                        fail(seq, "hash differs from the checkpoint")
+                    prev_hash = stored
+                    continue
+                if seq <= expected:
+                    fail(seq, "sequence number used twice")
+                    continue
+                if seq > expected + 1:
+                    fail(expected + 1, f"rows {expected + 1}..{seq - 1} are missing")
+                elif prev_hash is None:
+                    fail(seq, "predecessor hash unknown (archived without a chain tail)")
+                elif entry_hash(prev_hash, shard, seq, row[2:]) != stored:
+                    fail(seq, "row contents do not match its hash")
+                prev_hash, expected = stored, seq
+                checked += 1
+    finally:
+        cursor.close()
+    if expected < hi:
+        fail(expected + 1, f"rows {expected + 1}..{hi} are missing")
+    return {"shard": shard, "lo": lo, "hi": hi, "rows": checked, "last_hash": prev_hash,
+            "error_count": error_count, "errors": errors}
+
+
+def _archived_tail(shard: int, seq: int, directory: str = None):
+    for manifest in audit_archive.manifests(directory):
+        tail = manifest.get("chain_tails", {}).get(str(shard))
+        if tail and tail[0] == seq:
+            return tail[1]
+    return None
+
+
+def plan(cursor, incremental: bool, unit_size: int, directory: str = None):
+    """Work units per shard plus the head snapshot they are checked against."""
+    cursor.execute("SELECT shard, seq, entry_hash FROM audit_chain_heads WHERE seq > 0 ORDER BY shard")
+    heads = {shard: (int(seq), entry) for shard, seq, entry in cursor.fetchall()}
+    checkpoints = {}
+    if incremental:
+        cursor.execute("""
+            SELECT c.shard, c.seq, c.entry_hash FROM audit_chain_checkpoints c
+            JOIN (SELECT shard, MAX(seq) AS seq FROM audit_chain_checkpoints GROUP BY shard) latest
+              ON latest.shard = c.shard AND latest.seq = c.seq
+            """)
+        checkpoints = {shard: (int(seq), entry) for shard, seq, entry in cursor.fetchall()}
+
+    units = []
+    for shard, (head_seq, _) in heads.items():
+        if shard in checkpoints:
+            start = checkpoints[shard]
+        else:
+            cursor.execute("SELECT MIN(chain_seq) FROM audit_logs WHERE chain_shard = %s", (shard,))
+            first = cursor.fetchall()[0][0]
+            first = int(first) if first is not None else head_seq + 1
+            # Rows before the first one still in MySQL were archived
+            start = (0, GENESIS_HASH) if first <= 1 else (first - 1, _archived_tail(shard, first - 1, directory))
+        lo = start[0] + 1
+        while lo <= head_seq:
+            hi = min(lo + unit_size - 1, head_seq)
+            units.append((shard, lo, hi, start if lo == start[0] + 1 else None))
+            lo = hi + 1
+    return units, heads
+
+
+def verify(db, incremental: bool = False, workers: int = None, unit_size: int = 250000,
+           directory: str = None, checkpoint: bool = True, log=print) -> dict:
+    """Verify every shard chain up to its current head with a pool of worker processes.
+
+    Shards that verify cleanly get a checkpoint at their head, which is
+    where --incremental starts next time. A full run also re-checks the
+    checksums of archived months.
+    """
+    started = time.perf_counter()
+    cursor = db.connection.cursor()
+    try:
+        units, heads = plan(cursor, incremental, unit_size, directory)
+        legacy = 0
+        if not incremental:
+            cursor.execute("SELECT COUNT(*) FROM audit_logs WHERE chain_shard IS NULL")
+            legacy = cursor.fetchall()[0][0]
+    finally:
+        cursor.close()
+
+    results = []
+    if units:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(units)))
+        log(f"Verifying {sum(hi - lo + 1 for _, lo, hi, _ in units)} entries in {len(units)} slices "
+            f"across {len(heads)} shards with {workers} workers")
+        # spawn, not fork: children must not inherit the parent's pooled sockets
+        with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker) as pool:
+            for result in pool.imap_unordered(verify_range, units):
+                results.append(result)
+                if result["error_count"]:
+                    log(f"Shard {result['shard']} {result['lo']}..{result['hi']}: {result['error_count']} errors")
+
+    by_shard = {}
+    for result in sorted(results, key=lambda r: (r["shard"], r["lo"])):
+        by_shard.setdefault(result["shard"], []).append(result)
+    errors, error_count, failed = [], 0, set()
+    for shard, shard_results in by_shard.items():
+        for result in shard_results:
+            error_count += result["error_count"]
+            errors.extend(result["errors"])
+            if result["error_count"]:
+                failed.add(shard)
+        if shard_results[-1]["last_hash"] != heads[shard][1]:
+            failed.add(shard)
+            error_count += 1
+            errors.append({"shard": shard, "seq": heads[shard][0], "error": "last row does not match the chain head"})
+
+    archives_failed = []
+    if not incremental:
+        archives_failed = [m["month"] for m in audit_archive.manifests(directory)
+                           if not audit_archive.verify_month(m, directory)]
+        error_count += len(archives_failed)
+
+    if checkpoint:
+        verified = [(shard, *heads[shard], sum(r["rows"] for r in shard_results))
+                    for shard, shard_results in by_shard.items() if shard not in failed]
+        if verified:
+            cursor = db.connection.cursor()
+            try:
+                cursor.execute(
+                    "INSERT INTO audit_chain_checkpoints (shard, seq, entry_hash, rows_verified, verified_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, NOW())"] * len(verified)),
+                    tuple(value for row in verified for value in row)
+                )
+            finally:
+                cursor.close()
+
+    elapsed = time.perf_counter() - started
+    rows = sum(r["rows"] for r in results)
+    return {
+        "mode": "incremental" if incremental else "full",
+        "rows_verified": rows,
+        "shards": len(heads),
+        "shards_failed": sorted(failed),
+        "unchained_rows": legacy,
+        "archives_failed": archives_failed,
+        "error_count": error_count,
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "seconds": round(elapsed, 2),
+        "rows_per_minute": int(rows / elapsed * 60) if elapsed else rows,
+    }
@@ -0,0 +1,200 @@
+import os
+from datetime import datetime
+
+from database import audit_archive
+from services import export
+
+# Months of audit_logs kept in MySQL, the current month included; older
+# monthly partitions are archived to AUDIT_ARCHIVE_DIR and dropped
+AUDIT_RETENTION_MONTHS = int(os.getenv('AUDIT_RETENTION_MONTHS', '13'))
+# Empty partitions created in advance so inserts never land in p_future
+AUDIT_PARTITIONS_AHEAD = int(os.getenv('AUDIT_PARTITIONS_AHEAD', '3'))
+
+FUTURE_PARTITION = 'p_future'
+
+
+class PartitioningError(Exception):
+    """audit_logs cannot be partitioned as it stands."""
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    year, month = divmod(moment.month - 1 + months, 12)
+    return month_start(moment).replace(year=moment.year + year, month=month + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name: str):
+    """The month a pYYYYMM partition holds, None for p_future."""
+    try:
+        return datetime.strptime(name[1:], "%Y%m")
+    except ValueError:
+        return None
+
+
+def _scalar(cursor, query: str, params: tuple = ()):
+    cursor.execute(query, params)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def timestamp_type(cursor) -> str:
+    return _scalar(cursor, """
+        SELECT DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_logs' AND COLUMN_NAME = 'action_timestamp'
+        """).lower()
+
+
+def _bound(month: datetime, column_type: str) -> str:
+    # RANGE COLUMNS takes DATETIME directly; a TIMESTAMP column has to be
+    # partitioned on UNIX_TIMESTAMP(), the only function MySQL allows for it
+    literal = f"'{month:%Y-%m-%d %H:%M:%S}'"
+    return f"UNIX_TIMESTAMP({literal})" if column_type == 'timestamp' else literal
+
+
+def _partition_sql(months, column_type: str) -> str:
+    parts = [f"PARTITION {partition_name(month)} VALUES LESS THAN ({_bound(add_months(month, 1), column_type)})"
+             for month in months]
+    parts.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return "(" + ", ".join(parts) + ")"
+
+
+def partitions(cursor) -> list:
+    """audit_logs partition names in range order; empty while the table is unpartitioned."""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_logs' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert(db, now: datetime, ahead: int = AUDIT_PARTITIONS_AHEAD, dry_run: bool = False, log=print) -> bool:
+    """Rebuild audit_logs as monthly RANGE partitions on action_timestamp.
+
+    MySQL requires the partitioning column in every unique key and does not
+    allow foreign keys on partitioned InnoDB tables, so the primary key
+    becomes (log_id, action_timestamp) and audit_logs' own foreign keys are
+    dropped; the audit writer never relied on them. This copies the whole
+    table once, so run it in a maintenance window. Returns False when the
+    table is already partitioned.
+    """
+    cursor = db.connection.cursor()
+    try:
+        if partitions(cursor):
+            return False
+        referencing = _scalar(cursor, """
+            SELECT GROUP_CONCAT(TABLE_NAME) FROM information_schema.REFERENTIAL_CONSTRAINTS
+            WHERE CONSTRAINT_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME = 'audit_logs'
+            """)
+        if referencing:
+            raise PartitioningError(f"Foreign keys from {referencing} reference audit_logs")
+        cursor.execute("""
+            SELECT INDEX_NAME, SUM(COLUMN_NAME = 'action_timestamp') FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_logs' AND NON_UNIQUE = 0
+            AND INDEX_NAME <> 'PRIMARY'
+            GROUP BY INDEX_NAME
+            """)
+        unique = [name for name, has_timestamp in cursor.fetchall() if not has_timestamp]
+        if unique:
+            raise PartitioningError(f"Unique keys {', '.join(unique)} do not include action_timestamp")
+
+        cursor.execute("""
+            SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+            WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_logs'
+            """)
+        foreign_keys = [row[0] for row in cursor.fetchall()]
+        oldest = _scalar(cursor, "SELECT MIN(action_timestamp) FROM audit_logs")
+        first, last = month_start(oldest or now), add_months(now, ahead)
+        months = []
+        while first <= last:
+            months.append(first)
+            first = add_months(first, 1)
+
+        column_type = timestamp_type(cursor)
+        statements = [f"ALTER TABLE audit_logs DROP FOREIGN KEY {name}" for name in foreign_keys]
+        statements.append(
+            "ALTER TABLE audit_logs DROP PRIMARY KEY, ADD PRIMARY KEY (log_id, action_timestamp) "
+            + ("PARTITION BY RANGE (UNIX_TIMESTAMP(action_timestamp)) " if column_type == 'timestamp'
+               else "PARTITION BY RANGE COLUMNS (action_timestamp) ")
+            + _partition_sql(months, column_type)
+        )
+        for statement in statements:
+            log(statement if dry_run else f"Running: {statement[:120]}")
+            if not dry_run:
+                cursor.execute(statement)
+        return True
+    finally:
+        cursor.close()
+
+
+def add_future(db, now: datetime, ahead: int = AUDIT_PARTITIONS_AHEAD, dry_run: bool = False, log=print) -> list:
+    """Split empty monthly partitions off p_future up to `ahead` months past now."""
+    cursor = db.connection.cursor()
+    try:
+        names = partitions(cursor)
+        if FUTURE_PARTITION not in names:
+            raise PartitioningError("audit_logs is not partitioned; run with --convert first")
+        newest = max((partition_month(name) for name in names if name != FUTURE_PARTITION),
+                     default=add_months(now, -1))
+        months = []
+        month = add_months(newest, 1)
+        while month <= add_months(now, ahead):
+            months.append(month)
+            month = add_months(month, 1)
+        if months:
+            # Reorganizing p_future only touches the rows in it, normally none
+            statement = (f"ALTER TABLE audit_logs REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+                         + _partition_sql(months, timestamp_type(cursor)))
+            log(statement if dry_run else f"Adding partitions {', '.join(map(partition_name, months))}")
+            if not dry_run:
+                cursor.execute(statement)
+        return [partition_name(month) for month in months]
+    finally:
+        cursor.close()
+
+
+def archive_expired(db, now: datetime, retention_months: int = AUDIT_RETENTION_MONTHS,
+                    directory: str = None, dry_run: bool = False, log=print) -> list:
+    """Archive partitions older than the retention window, then drop them.
+
+    Each month is exported oldest first through a streaming cursor, and the
+    partition is dropped only once the archive's row count matches the
+    partition's. DROP PARTITION is a metadata change, so expiring a month
+    costs no more than reading it once. Hourly rollups are left in place,
+    so /api/audit/summary keeps covering archived months.
+    """
+    if retention_months < 1:
+        raise PartitioningError("Retention must keep at least the current month")
+    cutoff = add_months(now, -(retention_months - 1))
+    cursor = db.connection.cursor()
+    archived = []
+    try:
+        for name in partitions(cursor):
+            month = partition_month(name)
+            if month is None or month >= cutoff:
+                continue
+            expected = _scalar(cursor, f"SELECT COUNT(*) FROM audit_logs PARTITION ({name})")
+            if dry_run:
+                log(f"Would archive {name} ({expected} rows) and drop it")
+                archived.append(name)
+                continue
+            query = (f"SELECT * FROM audit_logs PARTITION ({name}) "
+                     "ORDER BY action_timestamp DESC, log_id DESC")
+            manifest = audit_archive.write_month(f"{month:%Y-%m}", month, add_months(month, 1),
+                                                 export.iter_chunks(query, ()), directory)
+            if manifest["rows"] != expected:
+                raise PartitioningError(f"{name}: archived {manifest['rows']} rows but the partition "
+                                        f"holds {expected}; leaving it in place")
+            cursor.execute(f"ALTER TABLE audit_logs DROP PARTITION {name}")
+            log(f"Archived {name}: {manifest['rows']} rows, {manifest['bytes']} bytes -> {manifest['file']}")
+            archived.append(name)
+        return archived
+    finally:
+        cursor.close()
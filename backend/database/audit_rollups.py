@@ -0,0 +1,117 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Column positions in an audit writer row (see audit_writer.AUDIT_COLUMNS)
+USER_ID, ACTION_TYPE, ACTION_TIMESTAMP = 0, 1, 8
+
+ACTION_COUNTS_QUERY = """
+        SELECT r.action_type, SUM(r.count) as count
+        FROM audit_rollups_hourly r
+        {hospital_join}
+        WHERE r.bucket >= %s AND r.bucket < %s {hospital_filter}
+        GROUP BY r.action_type
+        """
+
+ACTIVE_USERS_QUERY = """
+        SELECT u.first_name, u.last_name, u.username, SUM(r.count) as activity_count
+        FROM audit_rollups_hourly r
+        JOIN users u ON r.user_id = u.user_id
+        WHERE r.bucket >= %s AND r.bucket < %s {hospital_filter}
+        GROUP BY u.user_id
+        ORDER BY activity_count DESC
+        LIMIT 10
+        """
+
+HOSPITAL_COUNTS_QUERY = """
+        SELECT u.hospital_id, h.name as hospital_name, r.action_type, SUM(r.count) as count
+        FROM audit_rollups_hourly r
+        LEFT JOIN users u ON r.user_id = u.user_id
+        LEFT JOIN hospitals h ON u.hospital_id = h.hospital_id
+        WHERE r.bucket >= %s AND r.bucket < %s {hospital_filter}
+        GROUP BY u.hospital_id, h.name, r.action_type
+        ORDER BY u.hospital_id, r.action_type
+        """
+
+
+def hour_bucket(timestamp) -> str:
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%Y-%m-%d %H:00:00')
+    return str(timestamp)[:13] + ':00:00'
+
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_counts(rows) -> Counter:
+    """Count audit writer rows per (hour bucket, action_type, user_id)."""
+    counts = Counter()
+    for row in rows:
+        counts[(hour_bucket(row[ACTION_TIMESTAMP]), row[ACTION_TYPE], row[USER_ID] or 0)] += 1
+    return counts
+
+
+def apply_counts(cursor, counts: Counter):
+    if not counts:
+        return
+    params = []
+    for (bucket, action_type, user_id), count in counts.items():
+        params.extend([bucket, action_type, user_id, count])
+    cursor.execute(
+        "INSERT INTO audit_rollups_hourly (bucket, action_type, user_id, count) VALUES "
+        + ", ".join(["(%s, %s, %s, %s)"] * len(counts))
+        + " ON DUPLICATE KEY UPDATE count = count + VALUES(count)",
+        tuple(params)
+    )
+
+
+def rebuild(db, start: datetime, end: datetime, log=print) -> int:
+    """Recompute the rollups for [start, end) from audit_logs, one day at a time.
+
+    Used to backfill history written before the rollups existed and to
+    repair buckets after rows were loaded outside the audit writer.
+    """
+    start, end = floor_hour(start), floor_hour(end)
+    buckets = 0
+    cursor = db.connection.cursor()
+    try:
+        day = start
+        while day < end:
+            next_day = min(day + timedelta(days=1), end)
+            db.connection.start_transaction()
+            cursor.execute(
+                "DELETE FROM audit_rollups_hourly WHERE bucket >= %s AND bucket < %s",
+                (day, next_day)
+            )
+            cursor.execute("""
+                INSERT INTO audit_rollups_hourly (bucket, action_type, user_id, count)
+                SELECT DATE_FORMAT(action_timestamp, '%Y-%m-%d %H:00:00'), action_type,
+                       COALESCE(user_id, 0), COUNT(*)
+                FROM audit_logs
+                WHERE action_timestamp >= %s AND action_timestamp < %s
+                GROUP BY 1, 2, 3
+                """, (day, next_day))
+            buckets += cursor.rowcount
+            db.connection.commit()
+            log(f"Rolled up {day:%Y-%m-%d %H:%M} to {next_day:%Y-%m-%d %H:%M}")
+            day = next_day
+    finally:
+        cursor.close()
+    return buckets
+
+
+def summary_queries(start: datetime, end: datetime, hospital_id=None):
+    """(key, sql, params) for the summary sections over the [start, end) window."""
+    hospital_filter = ""
+    hospital_params = []
+    if hospital_id is not None:
+        hospital_filter = "AND u.hospital_id = %s"
+        hospital_params = [hospital_id]
+    hospital_join = "JOIN users u ON r.user_id = u.user_id" if hospital_id is not None else ""
+    window = [floor_hour(start), end]
+    return [
+        ("action_counts", ACTION_COUNTS_QUERY.format(hospital_join=hospital_join, hospital_filter=hospital_filter),
+         window + hospital_params),
+        ("active_users", ACTIVE_USERS_QUERY.format(hospital_filter=hospital_filter), window + hospital_params),
+        ("hospital_counts", HOSPITAL_COUNTS_QUERY.format(hospital_filter=hospital_filter), window + hospital_params),
+    ]
@@ -0,0 +1,437 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from database.connection import get_pool
+from database import audit_rollups, audit_chain
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: journals are not shared between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0'))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv('AUDIT_ENQUEUE_TIMEOUT', '0.5'))
+AUDIT_SPILL_DIR = os.getenv('AUDIT_SPILL_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'var', 'audit'))
+AUDIT_SPILL_FSYNC = os.getenv('AUDIT_SPILL_FSYNC', 'false').lower() == 'true'
+# How long shutdown waits for queued rows to reach the database; the rest
+# stay in the journal and are replayed by the next worker to start
+AUDIT_DRAIN_TIMEOUT = float(os.getenv('AUDIT_DRAIN_TIMEOUT', '10'))
+# Under steady load the journal is never empty enough to truncate; past this
+# size it is rewritten with only the rows still outstanding
+AUDIT_JOURNAL_COMPACT_BYTES = int(os.getenv('AUDIT_JOURNAL_COMPACT_BYTES', str(16 * 1024 * 1024)))
+
+AUDIT_COLUMNS = (
+    "user_id", "action_type", "module", "table_name", "record_id_affected",
+    "old_value", "new_value", "ip_address", "action_timestamp", "is_success",
+)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def build_insert(row_count: int, columns=AUDIT_COLUMNS) -> str:
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return "INSERT INTO audit_logs ({}) VALUES {}".format(
+        ", ".join(columns), ", ".join([placeholders] * row_count)
+    )
+
+
+def audit_row(user_id, action_type: str, module: str, table_name: str = None, record_id=None,
+              old_value=None, new_value=None, ip_address: str = None, is_success: bool = True,
+              timestamp: Optional[datetime] = None) -> list:
+    """An audit_logs row in AUDIT_COLUMNS order, JSON-encoded and journal-safe."""
+    return [
+        user_id, action_type, module, table_name, record_id,
+        json.dumps(old_value, default=str) if old_value else None,
+        json.dumps(new_value, default=str) if new_value else None,
+        ip_address, (timestamp or datetime.now()).strftime(TIMESTAMP_FORMAT), is_success,
+    ]
+
+
+def insert_rows(cursor, rows) -> int:
+    """Write audit rows and their hourly rollup counts on the caller's transaction.
+
+    For changes whose audit entry must commit or roll back with the change
+    itself; everything else goes through record_audit(). Rows are appended
+    to one of the hash chains on the way in. Returns the first row's log_id.
+    """
+    rows = audit_chain.append(cursor, rows)
+    cursor.execute(build_insert(len(rows), AUDIT_COLUMNS + audit_chain.CHAIN_COLUMNS),
+                   tuple(value for row in rows for value in row))
+    first_id = cursor.lastrowid
+    audit_rollups.apply_counts(cursor, audit_rollups.rollup_counts(rows))
+    return first_id
+
+
+class AuditWriter:
+    """Buffers audit rows in memory and writes them as multi-row INSERTs.
+
+    Every row is appended to a local journal before it is queued, and a
+    commit marker is appended once its batch is in the database, so rows
+    that were accepted but never written are replayed on the next start.
+    The journal is truncated whenever nothing is outstanding.
+    """
+
+    def __init__(self, pool_factory=get_pool, queue_size: int = AUDIT_QUEUE_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 enqueue_timeout: float = AUDIT_ENQUEUE_TIMEOUT, spill_dir: str = AUDIT_SPILL_DIR):
+        self.pool_factory = pool_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spill_dir = spill_dir
+        self.spill_path = os.path.join(spill_dir, f"audit-spill-{os.getpid()}.ndjson")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._idle = threading.Condition(self._journal_lock)
+        self._flush_now = threading.Event()
+        self._seq = 0
+        self._outstanding = 0
+        self._pending = {}  # seq -> row not yet in the database, for compaction
+        self._thread = None
+        self._running = False
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "backpressure_waits": 0,
+            "sync_writes": 0,
+            "replayed": 0,
+            "last_batch_seconds": 0.0,
+        }
+
+    # -- journal -----------------------------------------------------------
+
+    def _open_journal(self):
+        """Open this process's journal; returns rows carried over from a dead
+        writer that left a journal under the same name (PIDs repeat across
+        container restarts)."""
+        # Lock under a name the recovery glob ignores, then publish it, so a
+        # sibling worker never mistakes a fresh journal for an orphaned one
+        os.makedirs(self.spill_dir, exist_ok=True)
+        staging = os.path.join(self.spill_dir, f".audit-spill-{os.getpid()}.tmp")
+        self._journal = open(staging, 'w+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        carried = []
+        if os.path.exists(self.spill_path):
+            with open(self.spill_path, 'r', encoding='utf-8') as handle:
+                carried = self._journal_rows(_outstanding_rows(handle))
+            os.fsync(self._journal.fileno())
+        # Atomically swaps out the old journal, whose rows are now in this one
+        os.replace(staging, self.spill_path)
+        return carried
+
+    def _append(self, entry: dict):
+        self._journal.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        self._journal.flush()
+        if AUDIT_SPILL_FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def _mark_written(self, seqs):
+        with self._journal_lock:
+            self._outstanding -= len(seqs)
+            for seq in seqs:
+                self._pending.pop(seq, None)
+            if self._journal is None:
+                return
+            if self._outstanding == 0:
+                # truncate() leaves the position alone; without the seek the
+                # next row lands past a run of NULs and is unreadable
+                self._journal.seek(0)
+                self._journal.truncate(0)
+                self._journal.flush()
+                self._idle.notify_all()
+            else:
+                self._append({"done": seqs})
+                if self._journal.tell() > AUDIT_JOURNAL_COMPACT_BYTES:
+                    self._compact()
+
+    def _compact(self):
+        """Swap the journal for one holding only outstanding rows; called
+        with the journal lock held."""
+        staging = os.path.join(self.spill_dir, f".audit-spill-{os.getpid()}.tmp")
+        handle = open(staging, 'w+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        for seq, row in sorted(self._pending.items()):
+            handle.write(json.dumps({"seq": seq, "row": row}, separators=(',', ':')) + "\n")
+        handle.flush()
+        os.fsync(handle.fileno())
+        os.replace(staging, self.spill_path)
+        self._journal.close()
+        self._journal = handle
+
+    def _collect_orphans(self):
+        """Move rows left behind by crashed or killed writer processes into
+        this journal. Each orphan is deleted only once its rows are fsynced
+        here, so a crash part-way through replays them rather than losing them."""
+        entries = []
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "audit-spill-*.ndjson"))):
+            if path == self.spill_path:
+                continue
+            pid = _journal_pid(path)
+            if fcntl is None and pid is not None and _pid_alive(pid):
+                continue  # still owned by a live worker
+            try:
+                handle = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # recovered by a sibling since the glob
+            with handle:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # still owned by a live worker
+                    if os.fstat(handle.fileno()).st_nlink == 0:
+                        continue  # a sibling recovered it while we waited for the lock
+                rows = _outstanding_rows(handle)
+                if rows:
+                    entries.extend(self._journal_rows(rows))
+                    os.fsync(self._journal.fileno())
+                os.remove(path)
+        return entries
+
+    def _journal_rows(self, rows):
+        with self._journal_lock:
+            entries = []
+            for row in rows:
+                self._seq += 1
+                self._outstanding += 1
+                self._metrics["enqueued"] += 1
+                self._pending[self._seq] = row
+                if self._journal is not None:
+                    self._append({"seq": self._seq, "row": row})
+                entries.append((self._seq, row))
+            return entries
+
+    # -- producer side -----------------------------------------------------
+
+    def submit(self, user_id, action_type: str, module: str, table_name: str = None,
+               record_id=None, old_value=None, new_value=None, ip_address: str = None,
+               is_success: bool = True, timestamp: Optional[datetime] = None):
+        self._submit_row(audit_row(user_id, action_type, module, table_name, record_id,
+                                   old_value, new_value, ip_address, is_success, timestamp))
+
+    def _submit_row(self, row):
+        if self._journal is None:
+            self._ensure_journal()
+        self._enqueue(*self._journal_rows([row])[0])
+
+    def _ensure_journal(self):
+        # Synchronous writes (before start(), after stop(), the import CLI)
+        # are journaled too, so a failed one is replayed by the next start
+        with self._open_lock:
+            if self._journal is None:
+                self._open_journal()
+
+    def _enqueue(self, seq, row):
+        if not self._running:
+            self._write_now([(seq, row)])
+            return
+        try:
+            self._queue.put_nowait((seq, row))
+            return
+        except queue.Full:
+            self._metrics["backpressure_waits"] += 1
+        try:
+            self._queue.put((seq, row), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # The flusher is not keeping up: pay for the write on this request
+            self._write_now([(seq, row)])
+
+    def _write_now(self, entries):
+        self._metrics["sync_writes"] += 1
+        try:
+            self._write_batch(entries)
+        except Exception as e:
+            # Rows stay in the journal and are replayed on the next start
+            logger.exception('Audit write failed: %s', e)
+
+    # -- consumer side -----------------------------------------------------
+
+    def _write_batch(self, entries):
+        started = time.perf_counter()
+        pool = self.pool_factory()
+        connection = pool.acquire()
+        try:
+            cursor = connection.cursor()
+            try:
+                # Rows and their hourly rollup counts land together or not at all
+                connection.start_transaction()
+                insert_rows(cursor, [row for _, row in entries])
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            pool.release(connection)
+        self._metrics["written"] += len(entries)
+        self._metrics["batches"] += 1
+        self._metrics["last_batch_seconds"] = time.perf_counter() - started
+        self._mark_written([seq for seq, _ in entries])
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        backoff = 0.5
+        while self._running or batch or not self._queue.empty():
+            remaining = deadline - time.monotonic()
+            if len(batch) < self.batch_size and remaining > 0 and not self._flush_now.is_set():
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+                    continue
+                except queue.Empty:
+                    if self._running or not self._queue.empty():
+                        continue
+            self._flush_now.clear()
+            if batch:
+                try:
+                    self._write_batch(batch)
+                    batch = []
+                    backoff = 0.5
+                except Exception as e:
+                    self._metrics["failed_batches"] += 1
+                    logger.exception('Audit batch write failed, retrying: %s', e)
+                    if not self._running:
+                        break  # left in the journal for the next start
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+            deadline = time.monotonic() + self.flush_interval
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        if self._running:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with self._open_lock:
+            if self._journal is None:
+                orphans = self._open_journal()
+            else:
+                # Opened by an earlier synchronous write; retry what failed
+                with self._journal_lock:
+                    orphans = sorted(self._pending.items())
+        orphans += self._collect_orphans()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        for seq, row in orphans:
+            self._metrics["replayed"] += 1
+            self._enqueue(seq, row)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every accepted row is in the database."""
+        self._flush_now.set()
+        end = time.monotonic() + timeout
+        with self._journal_lock:
+            while self._outstanding > 0:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.1))
+                self._flush_now.set()
+        return True
+
+    def stop(self, timeout: float = AUDIT_DRAIN_TIMEOUT):
+        if not self._running:
+            return
+        self.flush(timeout)
+        self._running = False
+        self._thread.join(timeout)
+        with self._journal_lock:
+            self._journal.close()
+            self._journal = None
+            if self._outstanding == 0:
+                os.remove(self.spill_path)
+
+    def stats(self) -> dict:
+        stats = dict(self._metrics)
+        stats.update({
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "outstanding": self._outstanding,
+        })
+        return stats
+
+
+def _outstanding_rows(handle) -> list:
+    """Rows in a journal that never got a commit marker, in submission order."""
+    rows, done = {}, set()
+    for line in handle:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue  # torn final line from a crash
+        if "done" in entry:
+            done.update(entry["done"])
+        else:
+            rows[entry["seq"]] = entry["row"]
+    return [row for seq, row in sorted(rows.items()) if seq not in done]
+
+
+def _journal_pid(path: str) -> Optional[int]:
+    try:
+        return int(os.path.basename(path)[len("audit-spill-"):-len(".ndjson")])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether the process that owns a journal is still running, for
+    platforms without flock() to tell us."""
+    if os.name != 'nt':
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    process = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not process:
+        return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: exists, owned by someone else
+    try:
+        code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(process, ctypes.byref(code))
+        return code.value == 259  # STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(process)
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter()
+    return _writer
+
+
+def record_audit(user_id, action_type: str, module: str, table_name: str = None, record_id=None,
+                 old_value=None, new_value=None, ip_address: str = None, is_success: bool = True):
+    try:
+        get_audit_writer().submit(user_id, action_type, module, table_name, record_id,
+                                  old_value, new_value, ip_address, is_success)
+    except Exception as e:
+        logging.exception('Audit logging failed: %s', e)
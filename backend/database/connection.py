@@ -1,55 +1,451 @@
 import mysql.connector
 from mysql.connector import Error
+import logging
 import os
+import threading
+import time
+from collections import deque
 from typing import Optional
 
+from fastapi import Request
+
+from services.cache import get_cache
+from services.metrics import observe_query, DB_POOL_ACQUIRE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Pool settings, all overridable from the environment
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+# Size of the worker thread pool that runs blocking route handlers. Defaults
+# to the pool size so threads never queue on the pool instead of the limiter.
+DB_THREADPOOL_SIZE = int(os.getenv('DB_THREADPOOL_SIZE', str(DB_POOL_MAX_SIZE)))
+
+# Read replicas as host[:port] entries, comma separated; they share the
+# primary's database name and credentials. Read-only routes use them, and
+# a replica further behind than DB_REPLICA_MAX_LAG_SECONDS is skipped
+# until it catches up. A server that is not replicating at all counts as
+# current, so a plain second MySQL instance can stand in for a replica.
+DB_REPLICA_HOSTS = [host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '2'))
+# After a user's own write their reads stay on the primary this long, so
+# they never read a replica that has not caught up with it yet
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '10'))
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PoolTimeout(Error):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections with min/max sizing.
+
+    Idle connections are pinged before reuse once they have been idle longer
+    than the health check interval, and connections idle past the idle
+    timeout are closed as long as the pool stays at or above its minimum.
+    """
+
+    def __init__(self, min_size: int, max_size: int, acquire_timeout: float,
+                 idle_timeout: float, healthcheck_interval: float, **connect_kwargs):
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.connect_kwargs = connect_kwargs
+        self._idle = deque()  # (connection, released_at)
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _open(self):
+        connection = mysql.connector.connect(autocommit=True, **self.connect_kwargs)
+        self._created += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, connection) -> bool:
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        """Open connections until the pool holds at least min_size."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((connection, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise Error("Connection pool is closed")
+                candidate = None
+                while self._idle:
+                    connection, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                    if idle_for > self.idle_timeout and self._size > self.min_size:
+                        self._size -= 1
+                        self._recycled += 1
+                        self._discard(connection)
+                        continue
+                    candidate = (connection, idle_for)
+                    break
+                if candidate is None:
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._in_use += 1
+                        create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PoolTimeout("Timed out waiting for a database connection")
+                        self._waiting += 1
+                        try:
+                            self._cond.wait(remaining)
+                        finally:
+                            self._waiting -= 1
+                        continue
+                else:
+                    self._in_use += 1
+                    create = False
+
+            if create:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+
+            connection, idle_for = candidate
+            if idle_for < self.healthcheck_interval or self._is_healthy(connection):
+                return connection
+            # Stale connection: drop it and try again
+            self._discard(connection)
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._recycled += 1
+                self._cond.notify()
+
+    def release(self, connection, discard: bool = False):
+        """Return a connection; discard=True closes it instead (e.g. unread results)."""
+        healthy = not discard
+        try:
+            if healthy and connection.in_transaction:
+                connection.rollback()
+            healthy = healthy and connection.is_connected()
+        except Exception:
+            healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._size -= 1
+                self._discard(connection)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(connection)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created": self._created,
+                "recycled": self._recycled,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def connect_kwargs(host: str = None) -> dict:
+    """mysql.connector.connect() arguments from the DB_* environment variables.
+
+    `host` ("name" or "name:port") points them at a replica instead.
+    """
+    kwargs = dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'hospital'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        port=int(os.getenv('DB_PORT', '3306')),
+    )
+    if host:
+        name, _, port = host.partition(':')
+        kwargs.update(host=name, port=int(port) if port else kwargs['port'])
+    return kwargs
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+                    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                    healthcheck_interval=DB_POOL_HEALTHCHECK_INTERVAL,
+                    **connect_kwargs()
+                )
+    return _pool
+
+
+def close_pool():
+    global _pool, _replicas
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _replicas is not None:
+            _replicas.close()
+            _replicas = None
+
+
+def replica_lag(connection) -> Optional[float]:
+    """Seconds the server is behind its source: 0 when it is not a replica, None when replication is stopped."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")  # before MySQL 8.0.22
+        status = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not status:
+        return 0.0
+    lag = status[0].get('Seconds_Behind_Source', status[0].get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    """Read replicas picked round-robin among those within the lag limit.
+
+    Lag is sampled at most once per check interval, by whichever request
+    thread finds it stale; a replica that cannot be reached counts as
+    unavailable until the next sample. pick() returns None when no replica
+    qualifies, and the caller reads from the primary instead.
+    """
+
+    def __init__(self, pools: dict, max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+                 check_interval: float = DB_REPLICA_LAG_CHECK_INTERVAL, lag_probe=replica_lag):
+        self.pools = pools
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe
+        self._lags = {host: None for host in pools}
+        self._checked_at = float('-inf')
+        self._next = 0
+        self._lock = threading.Lock()
+        self._metrics = {"replica_reads": 0, "primary_fallbacks": 0, "lag_checks": 0}
+
+    def _measure(self, host) -> Optional[float]:
+        pool = self.pools[host]
+        try:
+            connection = pool.acquire()
+        except Exception as e:
+            logger.debug('Replica %s unreachable: %s', host, e)
+            return None
+        discard = False
+        try:
+            return self.lag_probe(connection)
+        except Exception as e:
+            logger.debug('Replica %s lag check failed: %s', host, e)
+            discard = True
+            return None
+        finally:
+            pool.release(connection, discard=discard)
+
+    def refresh(self):
+        lags = {host: self._measure(host) for host in self.pools}
+        with self._lock:
+            for host, lag in lags.items():
+                # Once per change rather than on every sample
+                if (lag is None) != (self._lags.get(host) is None) and self._metrics["lag_checks"]:
+                    if lag is None:
+                        logger.warning('Replica %s unavailable; its reads go elsewhere', host)
+                    else:
+                        logger.info('Replica %s available again (lag %.1fs)', host, lag)
+            self._lags = lags
+            self._metrics["lag_checks"] += 1
+
+    def pick(self) -> Optional[ConnectionPool]:
+        with self._lock:
+            stale = time.monotonic() - self._checked_at >= self.check_interval
+            if stale:
+                # Claimed under the lock so only one thread samples
+                self._checked_at = time.monotonic()
+        if stale:
+            self.refresh()
+        with self._lock:
+            current = [host for host, lag in self._lags.items() if lag is not None and lag <= self.max_lag]
+            if not current:
+                self._metrics["primary_fallbacks"] += 1
+                return None
+            self._next = (self._next + 1) % len(current)
+            self._metrics["replica_reads"] += 1
+            return self.pools[current[self._next]]
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["replicas"] = len(self.pools)
+            stats["replicas_current"] = sum(lag is not None and lag <= self.max_lag for lag in self._lags.values())
+        return stats
+
+
+_replicas: Optional[ReplicaSet] = None
+
+
+def get_replicas() -> Optional[ReplicaSet]:
+    """The configured replica set, or None when DB_REPLICA_HOSTS is empty."""
+    global _replicas
+    if _replicas is None and DB_REPLICA_HOSTS:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = ReplicaSet({
+                    host: ConnectionPool(
+                        min_size=0,
+                        max_size=DB_POOL_MAX_SIZE,
+                        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+                        idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                        healthcheck_interval=DB_POOL_HEALTHCHECK_INTERVAL,
+                        **connect_kwargs(host)
+                    )
+                    for host in DB_REPLICA_HOSTS
+                })
+    return _replicas
+
+
+def _recent_writes():
+    return get_cache('recent_write', ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+
+def note_write(user_id: int):
+    """Keep this user's reads on the primary for the read-your-writes window."""
+    _recent_writes().set(f"recent_write:{user_id}", "1", ttl=DB_READ_YOUR_WRITES_SECONDS)
+
+
+def wrote_recently(user_id: int) -> bool:
+    return _recent_writes().get(f"recent_write:{user_id}") is not None
+
+
+def _request_user_id(request: Optional[Request]):
+    principal = getattr(request.state, 'principal', None) if request is not None else None
+    return principal.user_id if principal is not None else None
+
+
 class DatabaseConnection:
-    def __init__(self):
-        self.host = os.getenv('DB_HOST', 'localhost')
-        self.database = os.getenv('DB_NAME', 'hospital')
-        self.user = os.getenv('DB_USER', 'root')
-        self.password = os.getenv('DB_PASSWORD', '')
-        self.port = int(os.getenv('DB_PORT', '3306'))
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or get_pool()
         self.connection = None
 
     def connect(self):
+        started = time.perf_counter()
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port,
-                autocommit=True
-            )
+            self.connection = self.pool.acquire()
+            DB_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started)
             return self.connection
         except Error as e:
-            print(f"Error connecting to MySQL: {e}")
+            logger.error('Error connecting to MySQL: %s', e)
             return None
 
     def disconnect(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        if self.connection is not None:
+            self.pool.release(self.connection)
+            self.connection = None
 
     def execute_query(self, query: str, params: tuple = None):
+        cursor = None
+        started = time.perf_counter()
+        failed = False
         try:
             cursor = self.connection.cursor(dictionary=True)
             cursor.execute(query, params)
             return cursor.fetchall()
         except Error as e:
-            print(f"Error executing query: {e}")
+            failed = True
+            logger.error('Error executing query: %s', e)
             return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+            observe_query(query, time.perf_counter() - started, failed)
 
     def execute_insert(self, query: str, params: tuple = None):
+        cursor = None
+        started = time.perf_counter()
+        failed = False
         try:
             cursor = self.connection.cursor()
             cursor.execute(query, params)
             return cursor.lastrowid
         except Error as e:
-            print(f"Error executing insert: {e}")
+            failed = True
+            logger.error('Error executing insert: %s', e)
             return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+            observe_query(query, time.perf_counter() - started, failed)
 
-def get_db_connection():
+def get_db_connection(request: Request = None):
+    """The primary. A request that is not a plain read counts as a write by its
+    user, whose reads then skip replicas for a while."""
     db = DatabaseConnection()
     connection = db.connect()
     if not connection:
@@ -57,4 +453,32 @@ def get_db_connection():
     try:
         yield db
     finally:
-        db.disconnect()
\ No newline at end of file
+        db.disconnect()
+        user_id = _request_user_id(request)
+        if user_id is not None and request.method not in SAFE_METHODS and DB_REPLICA_HOSTS:
+            note_write(user_id)
+
+
+def read_pool(user_id: Optional[int] = None) -> Optional[ConnectionPool]:
+    """A current replica's pool for a read, or None to read from the primary."""
+    replicas = get_replicas()
+    if replicas is None or (user_id is not None and wrote_recently(user_id)):
+        return None
+    return replicas.pick()
+
+
+def get_read_db_connection(request: Request = None):
+    """A replica for read-only routes, falling back to the primary when none is
+    current, none is reachable or the user wrote within the last few seconds."""
+    pool = read_pool(_request_user_id(request))
+    db = DatabaseConnection(pool)
+    connection = db.connect()
+    if not connection and pool is not None:
+        db = DatabaseConnection()
+        connection = db.connect()
+    if not connection:
+        raise Exception("Database connection failed")
+    try:
+        yield db
+    finally:
+        db.disconnect()
@@ -0,0 +1,57 @@
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+
+def split_statements(sql: str):
+    # Split on statement-ending semicolons. As in the mysql client, a
+    # `DELIMITER //` line switches the delimiter so trigger bodies can
+    # contain semicolons.
+    sql = re.sub(r'^\s*--.*$', '', sql, flags=re.MULTILINE)
+    statements = []
+    delimiter = ';'
+    parts = re.split(r'^\s*DELIMITER\s+(\S+)\s*$', sql, flags=re.MULTILINE | re.IGNORECASE)
+    for index, part in enumerate(parts):
+        if index % 2:  # re.split puts the captured delimiter between the chunks
+            delimiter = part
+            continue
+        pattern = re.escape(delimiter) + r'\s*(?:\n|$)'
+        statements.extend(statement.strip() for statement in re.split(pattern, part) if statement.strip())
+    return statements
+
+
+def pending_migrations(applied):
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            version = filename[:-4]
+            if version not in applied:
+                yield version, os.path.join(MIGRATIONS_DIR, filename)
+
+
+def run_migrations(db, dry_run: bool = False):
+    """Apply every migration in migrations/ that is not yet recorded."""
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(128) PRIMARY KEY,
+            applied_at DATETIME NOT NULL
+        )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        done = []
+        for version, path in pending_migrations(applied):
+            if not dry_run:
+                with open(path, encoding='utf-8') as handle:
+                    for statement in split_statements(handle.read()):
+                        cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, applied_at) VALUES (%s, NOW())",
+                    (version,)
+                )
+            done.append(version)
+        return done
+    finally:
+        cursor.close()
@@ -0,0 +1,11 @@
+-- Token index behind /api/patients/search.
+-- kind 'name' holds normalized name words, 'phone' the national phone
+-- digits and 'phone_rev' the same digits reversed so that both leading and
+-- trailing digit searches are prefix range scans on the primary key.
+CREATE TABLE patient_search_tokens (
+    kind VARCHAR(16) NOT NULL,
+    token VARCHAR(64) NOT NULL,
+    patient_id INT NOT NULL,
+    PRIMARY KEY (kind, token, patient_id),
+    KEY idx_patient_search_tokens_patient (patient_id)
+) ENGINE=InnoDB;
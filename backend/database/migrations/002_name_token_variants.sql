@@ -0,0 +1,10 @@
+-- Dictionary of distinct name tokens for fuzzy search. Each token is stored
+-- under its phonetic key and under every single-character deletion of
+-- itself, so misspelt queries find candidate tokens with a few point
+-- lookups instead of comparing against every patient name.
+CREATE TABLE name_token_variants (
+    kind VARCHAR(16) NOT NULL,
+    variant VARCHAR(64) NOT NULL,
+    token VARCHAR(64) NOT NULL,
+    PRIMARY KEY (kind, variant, token)
+) ENGINE=InnoDB;
@@ -0,0 +1,5 @@
+-- Composite indexes matching the (action_timestamp, log_id) keyset order
+-- used by every /api/audit listing, so each page is a bounded range scan.
+CREATE INDEX idx_audit_logs_time ON audit_logs (action_timestamp, log_id);
+CREATE INDEX idx_audit_logs_user_time ON audit_logs (user_id, action_timestamp, log_id);
+CREATE INDEX idx_audit_logs_record_time ON audit_logs (record_id_affected, action_timestamp, log_id);
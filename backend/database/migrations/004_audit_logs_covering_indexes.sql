@@ -0,0 +1,10 @@
+-- Indexes for every filter combination the audit endpoints issue. Each
+-- leads with the equality columns and ends with action_timestamp so both
+-- the half-open time range and the newest-first ordering come from the
+-- index. The summary index carries action_type and user_id so the GROUP BY
+-- counts are answered from the index alone.
+DROP INDEX idx_audit_logs_record_time ON audit_logs;
+CREATE INDEX idx_audit_logs_record_time ON audit_logs (record_id_affected, action_timestamp, log_id, table_name);
+CREATE INDEX idx_audit_logs_action_time ON audit_logs (action_type, action_timestamp, log_id);
+CREATE INDEX idx_audit_logs_user_action_time ON audit_logs (user_id, action_type, action_timestamp, log_id);
+CREATE INDEX idx_audit_logs_time_summary ON audit_logs (action_timestamp, action_type, user_id);
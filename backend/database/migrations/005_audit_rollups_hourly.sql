@@ -0,0 +1,12 @@
+-- Hourly audit counts per action type and user, maintained by the audit
+-- writer as it flushes each batch, so /api/audit/summary reads a few
+-- hundred rows per day of window instead of scanning audit_logs.
+-- user_id 0 stands for rows written without a user.
+CREATE TABLE audit_rollups_hourly (
+    bucket DATETIME NOT NULL,
+    action_type VARCHAR(50) NOT NULL,
+    user_id INT NOT NULL,
+    count INT NOT NULL,
+    PRIMARY KEY (bucket, action_type, user_id),
+    KEY idx_audit_rollups_user (user_id, bucket)
+) ENGINE=InnoDB;
@@ -0,0 +1,57 @@
+-- Change feed for offline clients. Every insert or update of patients and
+-- patient_encounters takes the next value of a single clock row. The row
+-- stays locked until the writing transaction commits, so versions become
+-- visible in order and "everything after version N" cannot skip a row
+-- that committed late.
+CREATE TABLE sync_clock (
+    id TINYINT NOT NULL PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL
+) ENGINE=InnoDB;
+
+INSERT INTO sync_clock (id, version) VALUES (1, 0);
+
+ALTER TABLE patients
+    ADD COLUMN row_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    ADD KEY idx_patients_row_version (row_version);
+
+-- client_ref is the id the offline client gave a queued encounter, so a
+-- push that is retried after a dropped response does not insert it twice
+ALTER TABLE patient_encounters
+    ADD COLUMN row_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    ADD COLUMN client_ref VARCHAR(64) NULL,
+    ADD KEY idx_patient_encounters_row_version (row_version),
+    ADD UNIQUE KEY uq_patient_encounters_client_ref (client_ref);
+
+-- Existing rows get distinct versions so a first full pull can page through them
+SET @sync_version := 0;
+UPDATE patients SET row_version = (@sync_version := @sync_version + 1) ORDER BY patient_id;
+UPDATE patient_encounters SET row_version = (@sync_version := @sync_version + 1) ORDER BY encounter_id;
+UPDATE sync_clock SET version = @sync_version WHERE id = 1;
+
+DELIMITER //
+
+CREATE TRIGGER patients_sync_version_insert BEFORE INSERT ON patients FOR EACH ROW
+BEGIN
+    UPDATE sync_clock SET version = version + 1 WHERE id = 1;
+    SET NEW.row_version = (SELECT version FROM sync_clock WHERE id = 1);
+END//
+
+CREATE TRIGGER patients_sync_version_update BEFORE UPDATE ON patients FOR EACH ROW
+BEGIN
+    UPDATE sync_clock SET version = version + 1 WHERE id = 1;
+    SET NEW.row_version = (SELECT version FROM sync_clock WHERE id = 1);
+END//
+
+CREATE TRIGGER patient_encounters_sync_version_insert BEFORE INSERT ON patient_encounters FOR EACH ROW
+BEGIN
+    UPDATE sync_clock SET version = version + 1 WHERE id = 1;
+    SET NEW.row_version = (SELECT version FROM sync_clock WHERE id = 1);
+END//
+
+CREATE TRIGGER patient_encounters_sync_version_update BEFORE UPDATE ON patient_encounters FOR EACH ROW
+BEGIN
+    UPDATE sync_clock SET version = version + 1 WHERE id = 1;
+    SET NEW.row_version = (SELECT version FROM sync_clock WHERE id = 1);
+END//
+
+DELIMITER ;
@@ -0,0 +1,26 @@
+-- One medical record per patient, so concurrent first visits upsert the
+-- same row instead of each inserting their own. Duplicates left by the old
+-- check-then-insert path are merged into each patient's oldest record
+-- first; the GROUP BY keeps the derived tables materialized, which lets
+-- them read the table being changed.
+UPDATE patient_encounters pe
+JOIN medical_records mr ON mr.record_id = pe.record_id
+JOIN (
+    SELECT patient_id, MIN(record_id) AS keep_id
+    FROM medical_records
+    GROUP BY patient_id
+    HAVING COUNT(*) > 1
+) k ON k.patient_id = mr.patient_id
+SET pe.record_id = k.keep_id
+WHERE pe.record_id <> k.keep_id;
+
+DELETE mr FROM medical_records mr
+JOIN (
+    SELECT patient_id, MIN(record_id) AS keep_id
+    FROM medical_records
+    GROUP BY patient_id
+    HAVING COUNT(*) > 1
+) k ON k.patient_id = mr.patient_id
+WHERE mr.record_id <> k.keep_id;
+
+CREATE UNIQUE INDEX uq_medical_records_patient ON medical_records (patient_id);
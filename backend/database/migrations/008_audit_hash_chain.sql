@@ -0,0 +1,29 @@
+-- Hash chain over audit_logs. Rows are spread over a fixed set of shard
+-- chains so concurrent writers lock different head rows; within a shard
+-- each row's blockchain_hash covers its contents and the previous row's
+-- hash. Rows written before this migration have no chain_shard and are
+-- reported, not verified, by `manage.py verify-audit-chain`.
+ALTER TABLE audit_logs
+    ADD COLUMN chain_shard SMALLINT NULL,
+    ADD COLUMN chain_seq BIGINT UNSIGNED NULL;
+
+CREATE INDEX idx_audit_logs_chain ON audit_logs (chain_shard, chain_seq);
+
+-- Last (seq, hash) of every shard, locked by the writer appending to it
+CREATE TABLE audit_chain_heads (
+    shard SMALLINT NOT NULL PRIMARY KEY,
+    seq BIGINT UNSIGNED NOT NULL,
+    entry_hash CHAR(64) NOT NULL,
+    updated_at DATETIME NOT NULL
+) ENGINE=InnoDB;
+
+-- Positions the verifier has checked; --incremental resumes from the latest
+CREATE TABLE audit_chain_checkpoints (
+    checkpoint_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    shard SMALLINT NOT NULL,
+    seq BIGINT UNSIGNED NOT NULL,
+    entry_hash CHAR(64) NOT NULL,
+    rows_verified BIGINT UNSIGNED NOT NULL,
+    verified_at DATETIME NOT NULL,
+    KEY idx_audit_chain_checkpoints_shard (shard, seq)
+) ENGINE=InnoDB;
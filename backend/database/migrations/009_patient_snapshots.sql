@@ -0,0 +1,11 @@
+-- Full copies of a patient taken alongside diff-only UPDATE audit entries
+-- (after the first one, then every PATIENT_SNAPSHOT_INTERVAL edits). log_id
+-- is the audit entry the copy reflects; rebuilding a past version starts
+-- from the nearest one instead of replaying the whole history.
+CREATE TABLE patient_snapshots (
+    patient_id INT NOT NULL,
+    log_id BIGINT NOT NULL,
+    taken_at DATETIME NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (patient_id, log_id)
+) ENGINE=InnoDB;
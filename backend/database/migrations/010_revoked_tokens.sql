@@ -0,0 +1,10 @@
+-- Logged-out tokens, by SHA-256 digest, until they would have expired
+-- anyway. The cache holds a copy for fast checks; this table is what a
+-- worker consults before trusting a token it has not cached, and unlike a
+-- cache entry a row here is never evicted.
+CREATE TABLE revoked_tokens (
+    token_hash CHAR(64) NOT NULL PRIMARY KEY,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NOT NULL,
+    KEY idx_revoked_tokens_expires (expires_at)
+) ENGINE=InnoDB;
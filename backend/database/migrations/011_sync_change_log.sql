@@ -0,0 +1,50 @@
+-- Replaces the single sync_clock row from 006. Every write used to update
+-- that row and hold its lock until commit, which serialised all clinical
+-- writes. Versions now come from an AUTO_INCREMENT change log. Taking a
+-- value locks nothing past the insert, so transactions can commit out of
+-- order. The pull side reads this log to find the highest version below
+-- which no write can still commit (services/sync.py safe_version).
+CREATE TABLE sync_changes (
+    version BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    -- SYSDATE, not NOW: when the version was taken, not when the statement began
+    changed_at DATETIME(6) NOT NULL
+) ENGINE=InnoDB;
+
+-- Carry the clock over; an explicit value moves the AUTO_INCREMENT past it
+INSERT INTO sync_changes (version, changed_at)
+SELECT version, NOW(6) - INTERVAL 1 DAY FROM sync_clock WHERE id = 1 AND version > 0;
+
+DROP TRIGGER patients_sync_version_insert;
+DROP TRIGGER patients_sync_version_update;
+DROP TRIGGER patient_encounters_sync_version_insert;
+DROP TRIGGER patient_encounters_sync_version_update;
+
+DELIMITER //
+
+CREATE TRIGGER patients_sync_version_insert BEFORE INSERT ON patients FOR EACH ROW
+BEGIN
+    INSERT INTO sync_changes (changed_at) VALUES (SYSDATE(6));
+    SET NEW.row_version = LAST_INSERT_ID();
+END//
+
+CREATE TRIGGER patients_sync_version_update BEFORE UPDATE ON patients FOR EACH ROW
+BEGIN
+    INSERT INTO sync_changes (changed_at) VALUES (SYSDATE(6));
+    SET NEW.row_version = LAST_INSERT_ID();
+END//
+
+CREATE TRIGGER patient_encounters_sync_version_insert BEFORE INSERT ON patient_encounters FOR EACH ROW
+BEGIN
+    INSERT INTO sync_changes (changed_at) VALUES (SYSDATE(6));
+    SET NEW.row_version = LAST_INSERT_ID();
+END//
+
+CREATE TRIGGER patient_encounters_sync_version_update BEFORE UPDATE ON patient_encounters FOR EACH ROW
+BEGIN
+    INSERT INTO sync_changes (changed_at) VALUES (SYSDATE(6));
+    SET NEW.row_version = LAST_INSERT_ID();
+END//
+
+DELIMITER ;
+
+DROP TABLE sync_clock;
@@ -0,0 +1,47 @@
+import os
+
+FULL_SCAN = 'ALL'
+# Rows the optimizer may expect to read from one table for a query that
+# does use an index; past this the index is not narrowing enough
+AUDIT_PLAN_MAX_ROWS = int(os.getenv('AUDIT_PLAN_MAX_ROWS', '100000'))
+
+
+def explain(db, query: str, params=()):
+    cursor = db.connection.cursor(dictionary=True)
+    try:
+        cursor.execute("EXPLAIN " + query, tuple(params))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def plan_problems(plan, tables, max_rows: int = AUDIT_PLAN_MAX_ROWS, lenient: bool = False):
+    """(row, reason) for every plan row on `tables` that reads too much.
+
+    Any full scan fails, as does an indexed access expected to examine more
+    than max_rows. lenient only fails scans with no candidate index, which is
+    what a non-sargable predicate looks like; it is for tiny development
+    tables, where the optimizer may rightly prefer a scan over an index.
+    """
+    offending = []
+    for row in plan:
+        if row.get('table') not in tables:
+            continue
+        if row.get('type') == FULL_SCAN:
+            if not lenient or not row.get('possible_keys'):
+                offending.append((row, "full scan"))
+        elif not lenient and (row.get('rows') or 0) > max_rows:
+            offending.append((row, f"examines ~{row['rows']} rows via {row.get('key')}"))
+    return offending
+
+
+def check_plans(db, targets, tables, max_rows: int = AUDIT_PLAN_MAX_ROWS, lenient: bool = False, log=print):
+    failures = []
+    for name, query, params in targets:
+        plan = explain(db, query, params)
+        bad = plan_problems(plan, tables, max_rows, lenient)
+        for row in plan:
+            log(f"{name:32} {row.get('table') or '-':12} type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+        if bad:
+            failures.append((name, bad))
+    return failures
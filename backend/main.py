@@ -1,24 +1,102 @@
 from fastapi import FastAPI, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from jwt import decode, ExpiredSignatureError, PyJWTError
+from fastapi.responses import JSONResponse, PlainTextResponse
 from datetime import datetime, timedelta
 from typing import Optional
-import uvicorn
+from anyio import to_thread
+import importlib
 import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# python-dotenv is only needed for local runs from a .env file; deployed
+# instances get real environment variables and skip the import
+if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")):
+    from dotenv import load_dotenv
+    load_dotenv()
 
-from routes.auth import auth_router
-from routes.patients import patients_router
-from routes.audit import audit_router
-from database.connection import get_db_connection
+# Only what the app needs to bind is imported here. Routers (and with them
+# the schemas, mysql.connector and bcrypt) load after the server is
+# listening; `python -m bench.import_profile` shows what import still costs.
+from services.cache import cache_stats
+from services import cache, metrics
+from services.compression import CompressionMiddleware
+from services.startup import Warmup, WarmupMiddleware
+
+# (module, attribute, prefix, tag, requires a token)
+ROUTERS = (
+    ("routes.auth", "auth_router", "/api/auth", "Authentication", False),
+    ("routes.patients", "patients_router", "/api/patients", "Patients", True),
+    ("routes.audit", "audit_router", "/api/audit", "Audit", True),
+    ("routes.admin", "admin_router", "/api/admin", "Admin", True),
+    ("routes.sync", "sync_router", "/api/sync", "Sync", True),
+)
 
 app = FastAPI(title="MediLink Health API", version="1.0.0")
 
+async def get_cache_stats():
+    return cache_stats()
+
+def start_services():
+    """Import and include the routers, then start the background services."""
+    from database.connection import get_pool, get_replicas
+    from database.audit_writer import get_audit_writer
+    from services.reference_data import reference_data
+    from services.principal import verify_token
+    from services.password_hasher import get_password_hasher, login_throttle
+
+    # Everything is imported before anything is included, so a failed import
+    # leaves nothing half-registered for the retry
+    routers = [(getattr(importlib.import_module(module), attribute), prefix, tag, authenticated)
+               for module, attribute, prefix, tag, authenticated in ROUTERS]
+    for router, prefix, tag, authenticated in routers:
+        app.include_router(router, prefix=prefix, tags=[tag],
+                           dependencies=[Depends(verify_token)] if authenticated else [])
+    app.add_api_route("/api/cache/stats", get_cache_stats, methods=["GET"], dependencies=[Depends(verify_token)])
+    app.openapi_schema = None
+
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "db_pool", "Database connection pool state.", get_pool().stats(), counters=("created", "recycled")))
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "db_replicas", "Read replica routing.", get_replicas().stats(),
+        counters=("replica_reads", "primary_fallbacks", "lag_checks")) if get_replicas() else [])
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "audit_writer", "Background audit writer state.", get_audit_writer().stats(),
+        counters=("enqueued", "written", "batches", "failed_batches", "backpressure_waits", "sync_writes", "replayed")))
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "reference_data", "Reference data snapshot.", reference_data.stats()))
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "password_hasher", "Password hashing pool state.", get_password_hasher().stats(),
+        counters=("completed", "rejected", "failed")))
+    metrics.REGISTRY.add_collector(lambda: metrics.stats_samples(
+        "login", "Login throttling.", login_throttle.stats(), counters=("throttled",)))
+
+    reference_data.start()
+    get_audit_writer().start()
+    get_password_hasher().start()
+
+async def start():
+    await to_thread.run_sync(start_services)
+    from database.connection import DB_THREADPOOL_SIZE
+    # Route handlers are plain functions that FastAPI runs on this bounded
+    # thread pool, so blocking database calls never stall the event loop
+    to_thread.current_default_thread_limiter().total_tokens = DB_THREADPOOL_SIZE
+
+def warm_pool():
+    from database.connection import get_pool
+    get_pool().warm()
+
+def load_reference_data():
+    from services.reference_data import reference_data
+    reference_data.load()
+
+# Runs once uvicorn is listening; /api/ready reports when it is done
+warmup = Warmup(start, {
+    "db_pool": warm_pool,
+    "reference_data": load_reference_data,
+    "cache": cache.warm,
+}, prefixes=tuple(prefix for _, _, prefix, _, _ in ROUTERS) + ("/api/cache", app.openapi_url))
+# Innermost, so CORS preflights are answered without waiting on the warm-up
+app.add_middleware(WarmupMiddleware, warmup=warmup)
+
 # CORS middleware for frontend access
 # Get allowed origins from environment
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
@@ -29,33 +107,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["Authorization", "Content-Type"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so latency includes CORS handling and streamed bodies
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Gauges read from each component's stats() at scrape time
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "invalidations", "errors")
+
+def cache_samples():
+    samples = []
+    for name, stats in cache_stats().items():
+        samples.extend(metrics.stats_samples("cache", "Cache activity by cache name.", stats,
+                                             counters=CACHE_COUNTERS, labels={"cache": name}))
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        if lookups:
+            samples.append(("cache_hit_ratio", "gauge", "Hits over lookups since start.",
+                            {"cache": name}, stats["hits"] / lookups))
+    return samples
+
+def threadpool_samples():
+    limiter = to_thread.current_default_thread_limiter()
+    return [
+        ("threadpool_busy_threads", "gauge", "Worker threads running blocking handlers.", {}, limiter.borrowed_tokens),
+        ("threadpool_size", "gauge", "Worker thread limit.", {}, limiter.total_tokens),
+    ]
 
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "fallback-key-for-dev")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 15
-
-security = HTTPBearer()
-
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
-    except ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    except Exception:
-        raise HTTPException(status_code=401, detail="Token validation failed")
-
-# Include routers
-app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(patients_router, prefix="/api/patients", tags=["Patients"], dependencies=[Depends(verify_token)])
-app.include_router(audit_router, prefix="/api/audit", tags=["Audit"], dependencies=[Depends(verify_token)])
+metrics.REGISTRY.add_collector(cache_samples)
+metrics.REGISTRY.add_collector(threadpool_samples)
+
+@app.on_event("startup")
+async def startup():
+    # Checked here rather than at import, since routes.auth loads lazily
+    if not os.getenv("SECRET_KEY"):
+        raise ValueError("SECRET_KEY environment variable must be set")
+    warmup.begin()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await warmup.stop()
+    if not warmup.started:
+        return
+    from database.connection import close_pool
+    from database.audit_writer import get_audit_writer
+    from services.reference_data import reference_data
+    from services.password_hasher import get_password_hasher
+    # Drain queued audit rows before the pool goes away
+    reference_data.stop()
+    await to_thread.run_sync(get_password_hasher().stop)
+    await to_thread.run_sync(get_audit_writer().stop)
+    close_pool()
 
 @app.get("/")
 async def root():
@@ -65,5 +167,17 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
+@app.get("/api/ready")
+async def readiness_check():
+    # Unlike /api/health (the process is up), 200 here means the routers are
+    # loaded and the pools and caches are warm, so it can take traffic
+    body = warmup.status()
+    return JSONResponse(body, status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
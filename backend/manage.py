@@ -0,0 +1,158 @@
+import argparse
+import sys
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from database.connection import get_db_connection
+from database.query_plans import AUDIT_PLAN_MAX_ROWS
+
+
+def migrate(args):
+    from database.migrate import run_migrations
+    for db in get_db_connection():
+        applied = run_migrations(db, dry_run=args.dry_run)
+        for version in applied:
+            print(f"{'Pending' if args.dry_run else 'Applied'}: {version}")
+        if not applied:
+            print("Schema is up to date")
+
+
+def rebuild_search_index(args):
+    from services.patient_search import rebuild_index
+    for db in get_db_connection():
+        total = rebuild_index(db, chunk_size=args.chunk_size)
+        print(f"Search index rebuilt for {total} patients")
+
+
+def check_audit_plans(args):
+    from database.query_plans import check_plans
+    from routes.audit import explain_targets
+    for db in get_db_connection():
+        failures = check_plans(db, explain_targets(), tables=('al', 'audit_logs', 'r', 'audit_rollups_hourly'),
+                               max_rows=args.max_rows, lenient=args.lenient)
+    for name, problems in failures:
+        for row, reason in problems:
+            print(f"FAIL: {name} on {row.get('table')}: {reason}")
+    return 1 if failures else 0
+
+
+def rebuild_audit_rollups(args):
+    from datetime import datetime, timedelta
+    from database.audit_rollups import rebuild
+    from database.audit_archive import archived_before
+    end = datetime.now() + timedelta(hours=1)
+    start = end - timedelta(days=args.days)
+    # Archived months are gone from audit_logs; recomputing them would
+    # replace their rollups with nothing
+    boundary = archived_before()
+    if boundary and start < boundary:
+        start = boundary
+    for db in get_db_connection():
+        buckets = rebuild(db, start, end)
+        print(f"Rebuilt {buckets} rollup buckets")
+
+
+def audit_partitions(args):
+    from datetime import datetime
+    from database import audit_partitions as partitions
+    now = datetime.now()
+    ahead = partitions.AUDIT_PARTITIONS_AHEAD if args.ahead is None else args.ahead
+    retention = partitions.AUDIT_RETENTION_MONTHS if args.retention_months is None else args.retention_months
+    for db in get_db_connection():
+        try:
+            if args.convert and not partitions.convert(db, now, ahead, dry_run=args.dry_run):
+                print("audit_logs is already partitioned")
+            if args.convert and args.dry_run:
+                return 0
+            added = partitions.add_future(db, now, ahead, dry_run=args.dry_run)
+            archived = [] if args.no_archive else partitions.archive_expired(
+                db, now, retention, args.archive_dir, dry_run=args.dry_run)
+        except partitions.PartitioningError as e:
+            print(f"Error: {e}")
+            return 1
+    print(f"{len(added)} partitions added, {len(archived)} archived")
+    return 0
+
+
+def verify_audit_chain(args):
+    import json
+    from database.audit_chain import verify
+    for db in get_db_connection():
+        report = verify(db, incremental=args.incremental, workers=args.workers, unit_size=args.unit_size,
+                        checkpoint=not args.no_checkpoint)
+    print(json.dumps(report, indent=2))
+    return 1 if report["error_count"] else 0
+
+
+def import_patients(args):
+    from services.patient_import import import_file
+    fmt = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    reject_path = args.rejects or args.path + '.rejects.ndjson'
+    for db in get_db_connection():
+        stats = import_file(db, args.path, fmt, args.user_id, reject_path, args.batch_size)
+    from database.audit_writer import get_audit_writer
+    get_audit_writer().flush()
+    print(f"Imported {stats['imported']} of {stats['records']} records, "
+          f"{stats['rejected']} rejected (see {reject_path})")
+    return 1 if stats['rejected'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediLink Health maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Apply pending schema migrations")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="List pending migrations only")
+    migrate_parser.set_defaults(func=migrate)
+
+    rebuild_parser = commands.add_parser("rebuild-search-index", help="Rebuild the patient search token index")
+    rebuild_parser.add_argument("--chunk-size", type=int, default=5000)
+    rebuild_parser.set_defaults(func=rebuild_search_index)
+
+    plans_parser = commands.add_parser(
+        "check-audit-plans", help="EXPLAIN every audit query and fail on full scans or oversized index reads")
+    plans_parser.add_argument("--max-rows", type=int, default=AUDIT_PLAN_MAX_ROWS,
+                              help="Rows an indexed access may expect to examine per table")
+    plans_parser.add_argument("--lenient", action="store_true",
+                              help="Only fail scans with no usable index (tiny development tables)")
+    plans_parser.set_defaults(func=check_audit_plans)
+
+    rollups_parser = commands.add_parser("rebuild-audit-rollups", help="Recompute hourly audit rollups from audit_logs")
+    rollups_parser.add_argument("--days", type=int, default=30, help="How many days back to recompute")
+    rollups_parser.set_defaults(func=rebuild_audit_rollups)
+
+    partitions_parser = commands.add_parser(
+        "audit-partitions", help="Add upcoming monthly audit_logs partitions and archive expired ones")
+    partitions_parser.add_argument("--convert", action="store_true",
+                                   help="Partition audit_logs first (rebuilds the table once)")
+    partitions_parser.add_argument("--retention-months", type=int, help="Months kept in MySQL, current month included")
+    partitions_parser.add_argument("--ahead", type=int, help="Months of empty partitions to keep ready")
+    partitions_parser.add_argument("--archive-dir", help="Where archived months are written")
+    partitions_parser.add_argument("--no-archive", action="store_true", help="Only add partitions")
+    partitions_parser.add_argument("--dry-run", action="store_true", help="Print the DDL without running it")
+    partitions_parser.set_defaults(func=audit_partitions)
+
+    chain_parser = commands.add_parser("verify-audit-chain", help="Check the audit log hash chains")
+    chain_parser.add_argument("--incremental", action="store_true",
+                              help="Only check entries after each shard's last checkpoint")
+    chain_parser.add_argument("--workers", type=int, help="Verifier processes (default: CPU count)")
+    chain_parser.add_argument("--unit-size", type=int, default=250000, help="Chain entries per work unit")
+    chain_parser.add_argument("--no-checkpoint", action="store_true", help="Do not record a checkpoint")
+    chain_parser.set_defaults(func=verify_audit_chain)
+
+    import_parser = commands.add_parser("import-patients", help="Bulk-load patients from a CSV or NDJSON file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    import_parser.add_argument("--user-id", type=int, required=True, help="User recorded as created_by and in the audit log")
+    import_parser.add_argument("--rejects", help="Where to write rejected rows (default: <path>.rejects.ndjson)")
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.set_defaults(func=import_patients)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,30 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, date
 from uuid import UUID
 
+# Columns clinicians may change through PUT /api/patients/{id} and sync pushes
+PATIENT_UPDATE_FIELDS = ('first_name', 'last_name', 'phone_number', 'email', 'address', 'city')
+
+# Columns sent to clients, selected explicitly instead of `*` so internal
+# ones (blockchain_hash, created_by/updated_by) stay out of every payload
+PATIENT_COLUMNS = (
+    'patient_id', 'hospital_id', 'first_name', 'last_name', 'date_of_birth', 'gender_id',
+    'address', 'city', 'phone_number', 'email', 'national_id_number',
+    'emergency_contact_name', 'emergency_contact_phone', 'is_active', 'created_at', 'updated_at', 'row_version',
+)
+ENCOUNTER_COLUMNS = (
+    'encounter_id', 'record_id', 'patient_id', 'doctor_id', 'encounter_date_time', 'chief_complaint',
+    'diagnosis_description', 'treatment_plan', 'notes', 'client_ref', 'created_at', 'updated_at', 'row_version',
+)
+AUDIT_LOG_COLUMNS = (
+    'log_id', 'user_id', 'action_type', 'module', 'table_name', 'record_id_affected',
+    'old_value', 'new_value', 'ip_address', 'action_timestamp', 'is_success',
+)
+
+def select_list(alias: str, columns) -> str:
+    return ", ".join(f"{alias}.{column}" for column in columns)
+
 class PatientBase(BaseModel):
     first_name: str
     last_name: str
@@ -75,4 +97,27 @@ class AuditLog(BaseModel):
 
 class PatientSearch(BaseModel):
     query: str
-    search_type: str  # 'id', 'name', 'phone', 'national_id'
\ No newline at end of file
+    search_type: str  # 'id', 'name', 'phone', 'national_id', 'fuzzy'
+    limit: int = Field(50, ge=1, le=200)
+    cursor: Optional[str] = None  # X-Next-Cursor from the previous page
+
+class PatientBatchRequest(BaseModel):
+    patient_ids: List[int] = Field(..., min_length=1, max_length=200)
+    include_encounters: bool = False
+    encounter_limit: int = Field(5, ge=1, le=50)  # latest encounters per patient
+
+class EncounterBatchItem(PatientEncounter):
+    client_ref: Optional[str] = Field(None, max_length=64)  # repeats of a ref already stored are skipped
+
+class EncounterBatch(BaseModel):
+    encounters: List[EncounterBatchItem] = Field(..., min_length=1, max_length=200)
+
+class SyncMutation(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=64)  # echoed in results; idempotency key for creates
+    table: str  # 'patients' or 'patient_encounters'
+    action: str  # 'update' for patients, 'create' for patient_encounters
+    data: dict
+    base_version: Optional[int] = None  # row_version the client last saw; None skips the conflict check
+
+class SyncPush(BaseModel):
+    mutations: List[SyncMutation] = Field(..., min_length=1, max_length=500)
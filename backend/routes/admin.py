@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+from database.connection import get_db_connection
+from services.reference_data import reference_data
+from services.principal import current_user_id
+
+admin_router = APIRouter()
+
+@admin_router.get("/reference-data")
+def get_reference_data_status(current_user_id: int = Depends(current_user_id)):
+    """Version and size of the in-memory lookup tables"""
+    return reference_data.stats()
+
+@admin_router.post("/reference-data/refresh")
+def refresh_reference_data(current_user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
+    """Reload enum_lookups, hospitals and roles now instead of waiting for the next refresh"""
+    try:
+        reference_data.load(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Reference data refresh failed")
+    return reference_data.stats()
@@ -1,31 +1,72 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from typing import List, Optional
-from datetime import datetime, date
-from database.connection import get_db_connection
+from datetime import datetime, date, timedelta
+from database.connection import get_read_db_connection, read_pool
+from services.pagination import encode_cursor, decode_cursor
+from database import audit_rollups, audit_archive
+from database.audit_writer import record_audit
+from services import export, patient_history
+from services.principal import current_user_id
+from services.json_response import FastJSONResponse
+from models.schemas import AUDIT_LOG_COLUMNS, select_list
 
 audit_router = APIRouter()
 
-@audit_router.get("/logs")
-async def get_audit_logs(
-    patient_id: Optional[str] = Query(None),
-    user_id: Optional[str] = Query(None),
-    action_type: Optional[str] = Query(None),
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    limit: int = Query(50, le=100),
-    offset: int = Query(0),
-    current_user_id: int = Depends(lambda: 1),
-    db=Depends(get_db_connection)
-):
-    """Get audit logs with filtering options"""
-    
-    base_query = """
-    SELECT al.*, u.first_name, u.last_name, u.username
+# Every route here only reads, so they all go to a read replica when one is
+# configured and current (see get_read_db_connection)
+
+# Filters compare the bare action_timestamp column against half-open
+# [start, end) ranges so the (.., action_timestamp) indexes stay usable.
+AUDIT_LOG_SELECT = select_list('al', AUDIT_LOG_COLUMNS)
+
+LOGS_QUERY = """
+    SELECT {}, u.first_name, u.last_name, u.username
     FROM audit_logs al
     LEFT JOIN users u ON al.user_id = u.user_id
     WHERE 1=1
-    """
-    
+    """.format(AUDIT_LOG_SELECT)
+
+HISTORY_TABLES = ('patients', 'patient_encounters', 'medical_records')
+
+HISTORY_QUERY = """
+        SELECT {}, u.first_name, u.last_name, u.username
+        FROM audit_logs al
+        LEFT JOIN users u ON al.user_id = u.user_id
+        WHERE al.record_id_affected = %s 
+        AND al.table_name IN ('patients', 'patient_encounters', 'medical_records')
+        """.format(AUDIT_LOG_SELECT)
+
+# Page size for /user/{id}/activity when paging by cursor or offset without a limit
+ACTIVITY_PAGE_SIZE = 500
+
+ACTIVITY_QUERY = """
+    SELECT {}, u.first_name, u.last_name
+    FROM audit_logs al
+    LEFT JOIN users u ON al.user_id = u.user_id
+    WHERE al.user_id = %s 
+    AND al.action_timestamp >= %s
+    """.format(AUDIT_LOG_SELECT)
+
+def parse_date(value: str, name: str) -> date:
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected YYYY-MM-DD")
+
+def log_window(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """The /logs date filters as a half-open [start, end) datetime range; either side may be None."""
+    start = end = None
+    if start_date and start_date.strip():
+        start = datetime.combine(parse_date(start_date, "start_date"), datetime.min.time())
+    if end_date and end_date.strip():
+        # end_date is inclusive for callers, so stop before the next midnight
+        end = datetime.combine(parse_date(end_date, "end_date") + timedelta(days=1), datetime.min.time())
+    return start, end
+
+def build_log_filters(patient_id: Optional[str] = None, user_id: Optional[str] = None,
+                      action_type: Optional[str] = None, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None):
+    """Translate the /logs query string into SQL conditions and parameters."""
     params = []
     conditions = []
     
@@ -41,114 +82,269 @@ async def get_audit_logs(
         conditions.append("al.action_type = %s")
         params.append(action_type)
     
-    if start_date and start_date.strip():
-        conditions.append("DATE(al.action_timestamp) >= %s")
-        params.append(start_date)
+    start, end = log_window(start_date, end_date)
+    if start:
+        conditions.append("al.action_timestamp >= %s")
+        params.append(start)
     
-    if end_date and end_date.strip():
-        conditions.append("DATE(al.action_timestamp) <= %s")
-        params.append(end_date)
+    if end:
+        conditions.append("al.action_timestamp < %s")
+        params.append(end)
     
-    if conditions:
-        base_query += " AND " + " AND ".join(conditions)
+    return conditions, params
+
+def keyset_query(query: str, params: list, limit: int, offset: int = 0, after=None):
+    """Append newest-first ordering plus either a keyset bound or an offset."""
+    params = list(params)
+    if after:
+        query += " AND (al.action_timestamp < %s OR (al.action_timestamp = %s AND al.log_id < %s))"
+        params.extend([after[0], after[0], after[1]])
+    
+    query += " ORDER BY al.action_timestamp DESC, al.log_id DESC LIMIT %s"
+    params.append(limit + 1)
+    if not after and offset:
+        query += " OFFSET %s"
+        params.append(offset)
+    return query, params
+
+def log_filter_match(patient_id: Optional[str] = None, user_id: Optional[str] = None,
+                     action_type: Optional[str] = None):
+    """build_log_filters' non-time conditions as a predicate over archived rows."""
+    patient_id = int(patient_id) if patient_id and patient_id.strip() else None
+    user_id = int(user_id) if user_id and user_id.strip() else None
+    action_type = action_type if action_type and action_type.strip() else None
+    
+    def match(row):
+        return ((patient_id is None or (row['record_id_affected'] == patient_id and row['table_name'] == 'patients'))
+                and (user_id is None or row['user_id'] == user_id)
+                and (action_type is None or row['action_type'] == action_type))
+    return match
+
+def archived_rows(db, archive, limit: int, after=None):
+    """Continue a page into the archived months, with the same columns as the SQL queries."""
+    match, start, end = archive
+    rows = audit_archive.search(match, limit, after, start, end, columns=AUDIT_LOG_COLUMNS)
+    user_ids = sorted({row['user_id'] for row in rows if row['user_id'] is not None})
+    users = {}
+    if user_ids:
+        found = db.execute_query(
+            "SELECT user_id, first_name, last_name, username FROM users WHERE user_id IN ({})".format(
+                ", ".join(["%s"] * len(user_ids))),
+            tuple(user_ids)
+        )
+        if found is None:
+            raise HTTPException(status_code=500, detail="Database error occurred")
+        users = {user['user_id']: user for user in found}
+    for row in rows:
+        user = users.get(row['user_id'], {})
+        row.update(first_name=user.get('first_name'), last_name=user.get('last_name'), username=user.get('username'))
+    return rows
+
+def paginate(db, query: str, params: list, limit: int, offset: int, cursor: Optional[str], archive=None):
+    """Run an audit query newest-first, by keyset when a cursor is given and by offset otherwise.
+
+    Callers that pass cursor (an empty value asks for the first page) get
+    {"items": [...], "next_cursor": ...}; offset callers keep getting a plain
+    list, with the next cursor in the X-Next-Cursor header. With `archive`,
+    a (match, start, end) filter, a page that runs out of rows in MySQL
+    carries on into the archived months; archived rows are all older than
+    the live ones, so the keyset order holds across the boundary.
+    """
+    if archive is not None and offset and cursor is None:
+        raise HTTPException(status_code=400, detail="include_archive pages by cursor, not offset")
+    after = decode_cursor(cursor, 2)
+    if after:
+        try:
+            after = (datetime.fromisoformat(after[0]), int(after[1]))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    query, params = keyset_query(query, params, limit, 0 if cursor is not None else offset, after)
+    results = db.execute_query(query, tuple(params))
+    if results is None:
+        raise HTTPException(status_code=500, detail="Database error occurred")
     
-    base_query += " ORDER BY al.action_timestamp DESC LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
+    if archive is not None and len(results) <= limit:
+        tail = results[-1] if results else None
+        results += archived_rows(db, archive, limit + 1 - len(results),
+                                 (tail['action_timestamp'], tail['log_id']) if tail else after)
+    
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_cursor(last['action_timestamp'].isoformat(), last['log_id'])
+    
+    if cursor is not None:
+        return FastJSONResponse({"items": results, "next_cursor": next_cursor})
+    return FastJSONResponse(results, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+def day_window(days: int, now: Optional[datetime] = None):
+    """[start, end) covering the last `days` calendar days, today included."""
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days - 1), today + timedelta(days=1)
+
+def explain_targets():
+    """Representative (name, sql, params) for every audit query shape, used by
+    `manage.py check-audit-plans` to catch queries that lose their index."""
+    now = datetime.now()
+    week_start, week_end = now - timedelta(days=7), day_window(1, now)[1]
+    after = (now, 1000)
+    targets = []
+    filter_cases = {
+        "logs": {},
+        "logs_by_patient": {"patient_id": "1001"},
+        "logs_by_user": {"user_id": "1"},
+        "logs_by_action": {"action_type": "VIEW"},
+        "logs_by_dates": {"start_date": week_start.date().isoformat(), "end_date": now.date().isoformat()},
+        "logs_by_user_action_dates": {"user_id": "1", "action_type": "VIEW",
+                                      "start_date": week_start.date().isoformat()},
+    }
+    for name, filters in filter_cases.items():
+        conditions, params = build_log_filters(**filters)
+        query = LOGS_QUERY + (" AND " + " AND ".join(conditions) if conditions else "")
+        targets.append((name, *keyset_query(query, params, 50)))
+        targets.append((name + "_next_page", *keyset_query(query, params, 50, after=after)))
+    targets.append(("patient_history", *keyset_query(HISTORY_QUERY, [1001], 50)))
+    targets.append(("user_activity", *keyset_query(ACTIVITY_QUERY, [1, now - timedelta(days=30)], 500)))
+    targets.append(("user_activity_export", ACTIVITY_QUERY + " ORDER BY al.action_timestamp DESC, al.log_id DESC",
+                    [1, now - timedelta(days=90)]))
+    for name, query, params in audit_rollups.summary_queries(week_start, week_end):
+        targets.append(("summary_" + name, query, params))
+    for name, query, params in audit_rollups.summary_queries(week_start, week_end, hospital_id=1):
+        targets.append(("summary_hospital_" + name, query, params))
+    return targets
+
+@audit_router.get("/logs")
+def get_audit_logs(
+    patient_id: Optional[str] = Query(None),
+    user_id: Optional[str] = Query(None),
+    action_type: Optional[str] = Query(None),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    include_archive: bool = Query(False),
+    current_user_id: int = Depends(current_user_id),
+    db=Depends(get_read_db_connection)
+):
+    """Get audit logs with filtering options"""
     
-    results = db.execute_query(base_query, tuple(params))
+    conditions, params = build_log_filters(patient_id, user_id, action_type, start_date, end_date)
+    base_query = LOGS_QUERY
+    if conditions:
+        base_query += " AND " + " AND ".join(conditions)
     
-    return results or []
+    archive = None
+    if include_archive:
+        archive = (log_filter_match(patient_id, user_id, action_type), *log_window(start_date, end_date))
+    return paginate(db, base_query, params, limit, offset, cursor, archive)
 
 @audit_router.get("/patient/{patient_id}/history")
-async def get_patient_edit_history(
+def get_patient_edit_history(
     patient_id: int,
-    limit: int = Query(50, le=100),
-    offset: int = Query(0),
-    current_user_id: int = Depends(lambda: 1),
-    db=Depends(get_db_connection)
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    include_archive: bool = Query(False),
+    as_of: Optional[int] = Query(None, description="log_id of a history entry: return the patient as it was right after it"),
+    current_user_id: int = Depends(current_user_id),
+    db=Depends(get_read_db_connection)
 ):
-    """Get edit history for a specific patient with pagination"""
+    """Get edit history for a specific patient with pagination, or one past version with as_of"""
+    if as_of is not None:
+        try:
+            version = patient_history.version_at(db, patient_id, as_of)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Database error occurred")
+        if version is None:
+            raise HTTPException(status_code=404, detail="History entry not found")
+        return {"patient_id": patient_id, "log_id": as_of, "patient": version}
+    
+    archive = None
+    if include_archive:
+        archive = (lambda row: row['record_id_affected'] == patient_id and row['table_name'] in HISTORY_TABLES,
+                   None, None)
     try:
-        query = """
-        SELECT al.*, u.first_name, u.last_name, u.username
-        FROM audit_logs al
-        LEFT JOIN users u ON al.user_id = u.user_id
-        WHERE al.record_id_affected = %s 
-        AND al.table_name IN ('patients', 'patient_encounters', 'medical_records')
-        ORDER BY al.action_timestamp DESC
-        LIMIT %s OFFSET %s
-        """
-        
-        results = db.execute_query(query, (patient_id, limit, offset))
-        
-        return results or []
+        return paginate(db, HISTORY_QUERY, [patient_id], limit, offset, cursor, archive)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error occurred")
 
 @audit_router.get("/user/{user_id}/activity")
-async def get_user_activity(
+def get_user_activity(
     user_id: int,
     days: int = Query(30, le=90),
-    current_user_id: int = Depends(lambda: 1),
-    db=Depends(get_db_connection)
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; without it (or a cursor) the whole period is returned"),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
+    current_user_id: int = Depends(current_user_id),
+    db=Depends(get_read_db_connection)
 ):
     """Get user activity for the specified number of days"""
     
-    query = """
-    SELECT al.*, u.first_name, u.last_name
-    FROM audit_logs al
-    LEFT JOIN users u ON al.user_id = u.user_id
-    WHERE al.user_id = %s 
-    AND al.action_timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
-    ORDER BY al.action_timestamp DESC
-    """
-    
-    results = db.execute_query(query, (user_id, days))
-    
-    return results or []
+    since = datetime.now() - timedelta(days=days)
+    if limit is None and cursor is None and not offset:
+        # Existing callers expect the complete period in one response;
+        # paging is opt-in through limit or cursor
+        results = db.execute_query(ACTIVITY_QUERY + " ORDER BY al.action_timestamp DESC, al.log_id DESC",
+                                   (user_id, since))
+        if results is None:
+            raise HTTPException(status_code=500, detail="Database error occurred")
+        return FastJSONResponse(results)
+    return paginate(db, ACTIVITY_QUERY, [user_id, since], limit or ACTIVITY_PAGE_SIZE, offset, cursor)
+
+@audit_router.get("/user/{user_id}/activity/export")
+def export_user_activity(
+    user_id: int,
+    request: Request,
+    days: int = Query(90, ge=1, le=366),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+    current_user_id: int = Depends(current_user_id)
+):
+    """Stream a user's full audit trail for the period as NDJSON or CSV"""
+    since = datetime.now() - timedelta(days=days)
+    record_audit(current_user_id, 'EXPORT', 'AUDIT', 'audit_logs', user_id,
+                 new_value={"days": days, "format": format, "gzip": gzip}, ip_address=request.client.host)
+    query = ACTIVITY_QUERY + " ORDER BY al.action_timestamp DESC, al.log_id DESC"
+    return export.export_response(query, (user_id, since), format, f"user-{user_id}-activity-{days}d", gzip,
+                                  pool=read_pool(current_user_id))
 
 @audit_router.get("/summary")
-async def get_audit_summary(
-    current_user_id: int = Depends(lambda: 1),
-    db=Depends(get_db_connection)
+def get_audit_summary(
+    days: int = Query(7, ge=1, le=366),
+    hospital_id: Optional[int] = Query(None),
+    current_user_id: int = Depends(current_user_id),
+    db=Depends(get_read_db_connection)
 ):
-    """Get audit summary statistics"""
+    """Get audit summary statistics from the hourly rollups"""
     try:
-        # Get today's activity
-        today_query = """
-        SELECT action_type, COUNT(*) as count
-        FROM audit_logs
-        WHERE DATE(action_timestamp) = CURDATE()
-        GROUP BY action_type
-        """
-        
-        # Get this week's activity
-        week_query = """
-        SELECT action_type, COUNT(*) as count
-        FROM audit_logs
-        WHERE action_timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-        GROUP BY action_type
-        """
+        now = datetime.now()
+        today_start, tomorrow = day_window(1, now)
         
-        # Get most active users
-        users_query = """
-        SELECT u.first_name, u.last_name, u.username, COUNT(*) as activity_count
-        FROM audit_logs al
-        JOIN users u ON al.user_id = u.user_id
-        WHERE al.action_timestamp >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-        GROUP BY al.user_id
-        ORDER BY activity_count DESC
-        LIMIT 10
-        """
+        def run(start, sections):
+            results = {}
+            for name, query, params in audit_rollups.summary_queries(start, tomorrow, hospital_id):
+                if name in sections:
+                    results[name] = db.execute_query(query, tuple(params)) or []
+            return results
         
-        today_stats = db.execute_query(today_query)
-        week_stats = db.execute_query(week_query)
-        active_users = db.execute_query(users_query)
+        # Windows are hour-aligned: "last 7 days" starts at the top of the hour 7 days ago
+        today = run(today_start, ["action_counts"])
+        week = run(now - timedelta(days=7), ["action_counts"])
+        period = run(now - timedelta(days=days), ["action_counts", "active_users", "hospital_counts"])
         
         return {
-            "today_activity": today_stats or [],
-            "week_activity": week_stats or [],
-            "most_active_users": active_users or []
+            "days": days,
+            "hospital_id": hospital_id,
+            "today_activity": today["action_counts"],
+            "week_activity": week["action_counts"],
+            "period_activity": period["action_counts"],
+            "most_active_users": period["active_users"],
+            "hospital_activity": period["hospital_counts"]
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail="Database error occurred")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Database error occurred")
@@ -1,18 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from fastapi.security import HTTPBearer
+from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials
 import bcrypt
 import jwt
+import logging
 import os
+import time
 from datetime import datetime, timedelta
 from models.schemas import UserLogin, TokenResponse, UserResponse
-from database.connection import get_db_connection
+from database.connection import get_db_connection, DatabaseConnection
+from database.audit_writer import record_audit
+from services.reference_data import reference_data
+from services import principal as principals
+from services.principal import Principal, verify_token, security
+from services.password_hasher import get_password_hasher, login_throttle, HasherBusy, LoginThrottled
 
 auth_router = APIRouter()
-security = HTTPBearer()
 
+# Required; main's startup refuses to start without it, so this module can
+# be imported lazily after the server is listening
 SECRET_KEY = os.getenv("SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("SECRET_KEY environment variable must be set")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 
@@ -24,51 +31,105 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Blocking; request handlers go through the password hasher pool instead
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+def find_user(db, username: str):
+    query = """
+    SELECT u.user_id, u.username, u.password_hash, u.email, u.first_name, 
+           u.last_name, u.hospital_id, u.department_id
+    FROM users u 
+    WHERE u.username = %s AND u.is_active = 1
+    """
+    return db.execute_query(query, (username,))
+
+def load_roles(db, user_id: int) -> list:
+    roles_query = """
+    SELECT ur.role_id 
+    FROM user_roles ur 
+    WHERE ur.user_id = %s
+    """
+    roles_result = db.execute_query(roles_query, (user_id,))
+    role_ids = [role['role_id'] for role in roles_result] if roles_result else []
+    return reference_data.get_covering(db, role_ids=role_ids).role_names(role_ids)
+
+async def upgrade_password_hash(user_id: int, password: str, old_hash: str):
+    """Re-hash at the configured cost after a successful login, off the response path."""
+    try:
+        new_hash = await get_password_hasher().hash(password, key="rehash")
+        
+        def store():
+            db = DatabaseConnection()
+            if not db.connect():
+                return
+            try:
+                # Only replace the hash we verified; a concurrent password change wins
+                db.execute_insert(
+                    "UPDATE users SET password_hash = %s WHERE user_id = %s AND password_hash = %s",
+                    (new_hash, user_id, old_hash)
+                )
+            finally:
+                db.disconnect()
+        
+        await run_in_threadpool(store)
+    except Exception as e:
+        logging.exception('Password hash upgrade failed for user %s: %s', user_id, e)
+
 @auth_router.post("/login", response_model=TokenResponse)
-async def login(user_credentials: UserLogin, request: Request, db=Depends(get_db_connection)):
+async def login(user_credentials: UserLogin, request: Request, background_tasks: BackgroundTasks,
+                db=Depends(get_db_connection)):
+    # bcrypt runs on the password hasher pool, and blocking database calls
+    # on the thread pool, so a login storm never stalls the event loop
+    try:
+        login_throttle.acquire(user_credentials.username)
+    except LoginThrottled as e:
+        raise HTTPException(status_code=429, detail="Too many login attempts",
+                            headers={"Retry-After": str(e.retry_after)})
+    
+    # Only a rejected username or password counts towards the lockout; a
+    # busy hasher or a database error must not lock out a retrying user
+    success = None
     try:
         # Get user from database
-        query = """
-        SELECT u.user_id, u.username, u.password_hash, u.email, u.first_name, 
-               u.last_name, u.hospital_id, u.department_id
-        FROM users u 
-        WHERE u.username = %s AND u.is_active = 1
-        """
-        user_result = db.execute_query(query, (user_credentials.username,))
+        user_result = await run_in_threadpool(find_user, db, user_credentials.username)
         
+        if user_result is None:
+            raise HTTPException(status_code=500, detail="Authentication service error")
         if not user_result:
+            success = False
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         user = user_result[0]
         
         # Verify password
-        if not verify_password(user_credentials.password, user['password_hash']):
+        hasher = get_password_hasher()
+        try:
+            verified = await hasher.verify(user_credentials.password, user['password_hash'], key=request.client.host)
+        except HasherBusy:
+            raise HTTPException(status_code=503, detail="Login service busy, please retry",
+                                headers={"Retry-After": "1"})
+        if not verified:
+            success = False
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        success = True
+        
+        if hasher.needs_rehash(user['password_hash']):
+            background_tasks.add_task(upgrade_password_hash, user['user_id'],
+                                      user_credentials.password, user['password_hash'])
         
         # Get user roles
-        roles_query = """
-        SELECT r.role_name 
-        FROM user_roles ur 
-        JOIN roles r ON ur.role_id = r.role_id 
-        WHERE ur.user_id = %s
-        """
-        roles_result = db.execute_query(roles_query, (user['user_id'],))
-        roles = [role['role_name'] for role in roles_result] if roles_result else []
+        roles = await run_in_threadpool(load_roles, db, user['user_id'])
         
         # Create access token
-        access_token = create_access_token(data={"sub": user['user_id']})
+        access_token = create_access_token(data={"sub": str(user['user_id'])})
+        # The login already read everything the first authenticated request needs
+        await run_in_threadpool(principals.remember, access_token, Principal(
+            user['user_id'], user['username'], user['hospital_id'], user['department_id'], roles,
+            time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        ))
         
         # Log successful login
-        log_query = """
-        INSERT INTO audit_logs (user_id, action_type, module, ip_address, action_timestamp, is_success)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        client_ip = request.client.host
-        db.execute_insert(log_query, (
-            user['user_id'], 'LOGIN', 'AUTH', client_ip, datetime.now(), True
-        ))
+        await run_in_threadpool(record_audit, user['user_id'], 'LOGIN', 'AUTH', ip_address=request.client.host)
         
         user_response = UserResponse(
             user_id=user['user_id'],
@@ -91,18 +152,19 @@ async def login(user_credentials: UserLogin, request: Request, db=Depends(get_db
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Authentication service error")
+    finally:
+        login_throttle.release(user_credentials.username, success)
 
 @auth_router.post("/logout")
-async def logout(request: Request, user_id: int = Depends(lambda: 1)):  # Will be replaced with actual token verification
+def logout(request: Request, principal: Principal = Depends(verify_token),
+           credentials: HTTPAuthorizationCredentials = Depends(security), db=Depends(get_db_connection)):
+    # The token stops working now rather than when it expires
+    try:
+        principals.revoke(credentials.credentials, principal.expires_at, db)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Database error occurred")
+    
     # Log logout
-    db = next(get_db_connection())
-    log_query = """
-    INSERT INTO audit_logs (user_id, action_type, module, ip_address, action_timestamp, is_success)
-    VALUES (%s, %s, %s, %s, %s, %s)
-    """
-    client_ip = request.client.host
-    db.execute_insert(log_query, (
-        user_id, 'LOGOUT', 'AUTH', client_ip, datetime.now(), True
-    ))
+    record_audit(principal.user_id, 'LOGOUT', 'AUTH', ip_address=request.client.host)
     
     return {"message": "Successfully logged out"}
\ No newline at end of file
@@ -1,76 +1,244 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from typing import List, Optional
-from models.schemas import Patient, PatientCreate, PatientSearch, PatientEncounter
-from database.connection import get_db_connection
-from datetime import datetime
-import json
+from models.schemas import (Patient, PatientCreate, PatientSearch, PatientEncounter, PatientBatchRequest,
+                            EncounterBatch, PATIENT_UPDATE_FIELDS, PATIENT_COLUMNS, ENCOUNTER_COLUMNS, select_list)
+from database.connection import get_db_connection, get_read_db_connection, get_pool, DatabaseConnection
+from database.audit_writer import record_audit
+from services import patient_search
+from services import patient_cache
+from services import patient_history
+from services.reference_data import enrich_patients
+from services import patient_import
+from services import export
+from services.encounters import create_encounters, UnknownPatient
+from services.principal import current_user_id
+from services.json_response import FastJSONResponse
+import time
+import logging
+import os
+import re
+import tempfile
+import uuid
 
 patients_router = APIRouter()
 
+IMPORT_DIR = os.getenv('IMPORT_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'var', 'imports'))
+# Reject files hold patient data, so they are deleted once this old
+IMPORT_REJECT_RETENTION_HOURS = float(os.getenv('IMPORT_REJECT_RETENTION_HOURS', '24'))
+
+PATIENT_SELECT = select_list('p', PATIENT_COLUMNS)
+ENCOUNTER_SELECT = select_list('pe', ENCOUNTER_COLUMNS) + ", u.first_name as doctor_first_name, u.last_name as doctor_last_name"
+
+ENCOUNTERS_QUERY = """
+        SELECT {}
+        FROM patient_encounters pe
+        LEFT JOIN users u ON pe.doctor_id = u.user_id
+        WHERE pe.patient_id = %s
+        ORDER BY pe.encounter_date_time DESC
+        """.format(ENCOUNTER_SELECT)
+
 def log_audit(db, user_id: int, action: str, table: str, record_id: int, old_value: dict = None, new_value: dict = None, ip_address: str = None):
-    try:
-        query = """
-        INSERT INTO audit_logs (user_id, action_type, module, table_name, record_id_affected, 
-                               old_value, new_value, ip_address, action_timestamp, is_success)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        db.execute_insert(query, (
-            user_id, action, 'PATIENTS', table, record_id,
-            json.dumps(old_value) if old_value else None,
-            json.dumps(new_value) if new_value else None,
-            ip_address, datetime.now(), True
-        ))
-    except Exception as e:
-        import logging
-        logging.exception('Audit logging failed: %s', e)
+    # Queued for the background writer; db is kept for call-site compatibility
+    record_audit(user_id, action, 'PATIENTS', table, record_id,
+                 old_value=old_value, new_value=new_value, ip_address=ip_address)
 
 @patients_router.post("/search")
-async def search_patients(search_data: PatientSearch, request: Request, user_id: int = Depends(lambda: 1), db=Depends(get_db_connection)):
+def search_patients(search_data: PatientSearch, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_read_db_connection)):
     try:
         base_query = """
-        SELECT p.*, gender_lookup.value as gender, h.name as hospital_name
+        SELECT {columns}
         FROM patients p
-        LEFT JOIN enum_lookups gender_lookup ON p.gender_id = gender_lookup.lookup_id
-        LEFT JOIN hospitals h ON p.hospital_id = h.hospital_id
         WHERE {condition} AND p.is_active = 1
         """
         
         search_conditions = {
             "id": ("p.patient_id = %s", (search_data.query,)),
             "national_id": ("p.national_id_number = %s", (search_data.query,)),
-            "phone": ("p.phone_number LIKE %s", (f"%{search_data.query}%",)),
-            "name": ("(p.first_name LIKE %s OR p.last_name LIKE %s)", (f"%{search_data.query}%", f"%{search_data.query}%"))
         }
         
-        condition, params = search_conditions.get(search_data.search_type, search_conditions["name"])
-        query = base_query.format(condition=condition)
-        
-        results = db.execute_query(query, params)
+        next_cursor = None
+        if search_data.search_type in search_conditions:
+            condition, params = search_conditions[search_data.search_type]
+            query = base_query.format(columns=PATIENT_SELECT, condition=condition)
+            results = enrich_patients(db, db.execute_query(query, params))
+        else:
+            # Name, phone and fuzzy lookups go through the token index
+            results, next_cursor = patient_search.search(
+                db, search_data.query, search_data.search_type, search_data.limit, search_data.cursor
+            )
         
         # Log search action
         log_audit(db, user_id, 'SEARCH', 'patients', 0, 
                   old_value={"search_query": search_data.query, "search_type": search_data.search_type},
                   ip_address=request.client.host)
         
-        return results or []
+        return FastJSONResponse(results or [], headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error occurred during patient search")
 
+def remove_if_exists(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def reject_path(user_id: int, import_id: str) -> str:
+    # Under the importing user's directory, so only they can fetch the file
+    return os.path.join(IMPORT_DIR, str(user_id), f"{import_id}.rejects.ndjson")
+
+@patients_router.post("/import")
+async def import_patients(request: Request, format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                          batch_size: int = Query(1000, ge=1, le=5000), user_id: int = Depends(current_user_id)):
+    """Bulk-load patients from a raw CSV or NDJSON request body"""
+    fmt = format or ('ndjson' if 'ndjson' in request.headers.get('content-type', '') else 'csv')
+    import_id = uuid.uuid4().hex
+    rejects = reject_path(user_id, import_id)
+    os.makedirs(os.path.dirname(rejects), exist_ok=True)
+    await run_in_threadpool(patient_import.purge_rejects, IMPORT_DIR, IMPORT_REJECT_RETENTION_HOURS * 3600)
+    # Spool the body to disk so memory stays flat whatever the upload size;
+    # the writes go to the thread pool so a slow disk never stalls the loop
+    stats = None
+    try:
+        with tempfile.TemporaryFile(dir=IMPORT_DIR) as upload:
+            async for chunk in request.stream():
+                await run_in_threadpool(upload.write, chunk)
+            upload.seek(0)
+            try:
+                stats = await run_in_threadpool(
+                    patient_import.import_upload, upload, fmt, user_id, rejects, batch_size,
+                    f"upload:{import_id}", request.client.host
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail="Database error occurred during import")
+            finally:
+                # Closing the spool deletes it; on the thread pool like the writes
+                await run_in_threadpool(upload.close)
+    finally:
+        # Rejects hold patient data: keep them only for a finished import that has some
+        if stats is None or not stats["rejected"]:
+            await run_in_threadpool(remove_if_exists, rejects)
+    return {"import_id": import_id, **stats}
+
+@patients_router.get("/import/{import_id}/rejects")
+def get_import_rejects(import_id: str, user_id: int = Depends(current_user_id)):
+    """Download the rejected rows of one of the caller's imports as NDJSON"""
+    if not re.fullmatch(r"[0-9a-f]{32}", import_id):
+        raise HTTPException(status_code=404, detail="Import not found")
+    path = reject_path(user_id, import_id)
+    # Another user's import looks the same as one with no rejects
+    if (not os.path.exists(path)
+            or os.path.getmtime(path) < time.time() - IMPORT_REJECT_RETENTION_HOURS * 3600):
+        raise HTTPException(status_code=404, detail="No rejected rows for this import")
+    return FileResponse(path, media_type="application/x-ndjson")
+
+def latest_encounters(db, patient_ids: List[int], limit: int) -> dict:
+    """Newest `limit` encounters per patient in one round trip (no window functions on 5.7)."""
+    if not patient_ids:
+        return {}
+    branch = """
+        (SELECT {}
+        FROM patient_encounters pe
+        LEFT JOIN users u ON pe.doctor_id = u.user_id
+        WHERE pe.patient_id = %s
+        ORDER BY pe.encounter_date_time DESC
+        LIMIT %s)""".format(ENCOUNTER_SELECT)
+    params = []
+    for patient_id in patient_ids:
+        params.extend([patient_id, limit])
+    rows = db.execute_query(" UNION ALL ".join([branch] * len(patient_ids)), tuple(params))
+    if rows is None:
+        raise HTTPException(status_code=500, detail="Database error occurred")
+    encounters = {patient_id: [] for patient_id in patient_ids}
+    for row in rows:
+        encounters[row['patient_id']].append(row)
+    return encounters
+
+@patients_router.post("/batch")
+def get_patients_batch(batch: PatientBatchRequest, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_read_db_connection)):
+    """Fetch several patients at once; results follow the request order"""
+    try:
+        patient_ids = list(dict.fromkeys(batch.patient_ids))
+        patients = {}
+        for patient_id in patient_ids:
+            cached = patient_cache.get_patient(patient_id)
+            if cached is not None:
+                patients[patient_id] = cached
+        
+        missing = [patient_id for patient_id in patient_ids if patient_id not in patients]
+        if missing:
+            # Rows bound for the shared cache come from the primary: a lagging
+            # replica can return a pre-update row that put_patient would keep
+            primary = db if db.pool is get_pool() else DatabaseConnection()
+            if primary is not db and not primary.connect():
+                raise HTTPException(status_code=500, detail="Database error occurred")
+            try:
+                read_started = time.time()
+                query = """
+                SELECT {}
+                FROM patients p
+                WHERE p.patient_id IN ({}) AND p.is_active = 1
+                """.format(PATIENT_SELECT, ", ".join(["%s"] * len(missing)))
+                rows = primary.execute_query(query, tuple(missing))
+                if rows is None:
+                    raise HTTPException(status_code=500, detail="Database error occurred")
+                for row in enrich_patients(primary, rows):
+                    patients[row['patient_id']] = row
+                    patient_cache.put_patient(row['patient_id'], row, read_started)
+            finally:
+                if primary is not db:
+                    primary.disconnect()
+        
+        found = [patient_id for patient_id in patient_ids if patient_id in patients]
+        encounters = latest_encounters(db, found, batch.encounter_limit) if batch.include_encounters else {}
+        
+        results = []
+        for patient_id in batch.patient_ids:
+            if patient_id not in patients:
+                results.append({"patient_id": patient_id, "found": False, "patient": None})
+                continue
+            entry = {"patient_id": patient_id, "found": True, "patient": patients[patient_id]}
+            if batch.include_encounters:
+                entry["encounters"] = encounters[patient_id]
+            results.append(entry)
+        
+        # One audit entry for the whole batch instead of one per patient
+        log_audit(db, user_id, 'VIEW', 'patients', None, new_value={
+            "patient_ids": found,
+            "not_found": [patient_id for patient_id in patient_ids if patient_id not in patients],
+            "include_encounters": batch.include_encounters,
+        }, ip_address=request.client.host)
+        
+        return FastJSONResponse(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Database error occurred")
+
 @patients_router.get("/{patient_id}")
-async def get_patient(patient_id: int, request: Request, user_id: int = Depends(lambda: 1), db=Depends(get_db_connection)):
+def get_patient(patient_id: int, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
     try:
+        cached = patient_cache.get_patient(patient_id)
+        if cached is not None:
+            log_audit(db, user_id, 'VIEW', 'patients', patient_id, ip_address=request.client.host)
+            return cached
+        
+        read_started = time.time()
         query = """
-        SELECT p.*, g.value as gender, h.name as hospital_name
+        SELECT {}
         FROM patients p
-        LEFT JOIN enum_lookups g ON p.gender_id = g.lookup_id
-        LEFT JOIN hospitals h ON p.hospital_id = h.hospital_id
         WHERE p.patient_id = %s AND p.is_active = 1
-        """
-        result = db.execute_query(query, (patient_id,))
+        """.format(PATIENT_SELECT)
+        result = enrich_patients(db, db.execute_query(query, (patient_id,)))
         
         if not result:
             raise HTTPException(status_code=404, detail="Patient not found")
         
+        patient_cache.put_patient(patient_id, result[0], read_started)
+        
         # Log patient access
         log_audit(db, user_id, 'VIEW', 'patients', patient_id, ip_address=request.client.host)
         
@@ -81,102 +249,95 @@ async def get_patient(patient_id: int, request: Request, user_id: int = Depends(
         raise HTTPException(status_code=500, detail="Database error occurred")
 
 @patients_router.get("/{patient_id}/encounters")
-async def get_patient_encounters(patient_id: int, request: Request, user_id: int = Depends(lambda: 1), db=Depends(get_db_connection)):
+def get_patient_encounters(patient_id: int, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
     try:
-        query = """
-        SELECT pe.*, u.first_name as doctor_first_name, u.last_name as doctor_last_name
-        FROM patient_encounters pe
-        LEFT JOIN users u ON pe.doctor_id = u.user_id
-        WHERE pe.patient_id = %s
-        ORDER BY pe.encounter_date_time DESC
-        """
-        results = db.execute_query(query, (patient_id,))
+        results = db.execute_query(ENCOUNTERS_QUERY, (patient_id,))
         
         # Log encounter access
         log_audit(db, user_id, 'VIEW_ENCOUNTERS', 'patient_encounters', patient_id, ip_address=request.client.host)
         
-        return results or []
+        return FastJSONResponse(results or [])
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error occurred")
 
+@patients_router.get("/{patient_id}/encounters/export")
+def export_patient_encounters(patient_id: int, request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+                              gzip: bool = Query(False), user_id: int = Depends(current_user_id)):
+    """Stream a patient's full encounter history as NDJSON or CSV"""
+    log_audit(None, user_id, 'EXPORT_ENCOUNTERS', 'patient_encounters', patient_id,
+              new_value={"format": format, "gzip": gzip}, ip_address=request.client.host)
+    return export.export_response(ENCOUNTERS_QUERY, (patient_id,), format,
+                                  f"patient-{patient_id}-encounters", gzip)
+
 @patients_router.put("/{patient_id}")
-async def update_patient(patient_id: int, patient_data: dict, request: Request, user_id: int = Depends(lambda: 1), db=Depends(get_db_connection)):
+def update_patient(patient_id: int, patient_data: dict, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
+    updates = {field: value for field, value in patient_data.items() if field in PATIENT_UPDATE_FIELDS}
+    if not updates:
+        raise HTTPException(status_code=400, detail="No valid fields to update")
+    
+    connection = db.connection
+    cursor = connection.cursor(dictionary=True)
     try:
-        # Get current patient data for audit
-        current_query = "SELECT * FROM patients WHERE patient_id = %s"
-        current_data = db.execute_query(current_query, (patient_id,))
-        
-        if not current_data:
+        # The row stays locked until the audit entry commits with the change,
+        # so the recorded old values are exactly what this update replaced
+        connection.start_transaction()
+        cursor.execute("SELECT {} FROM patients p WHERE p.patient_id = %s FOR UPDATE".format(PATIENT_SELECT),
+                       (patient_id,))
+        old_data = cursor.fetchone()
+        if not old_data:
+            connection.rollback()
             raise HTTPException(status_code=404, detail="Patient not found")
         
-        old_data = current_data[0]
-        
-        # Build update query dynamically
-        update_fields = []
-        params = []
+        # Only changed fields are written and audited, with dates as ISO strings
+        old_values, new_values = patient_history.diff(old_data, updates)
+        if not new_values:
+            connection.rollback()
+            return {"message": "Patient updated successfully"}
         
-        for field, value in patient_data.items():
-            if field in ['first_name', 'last_name', 'phone_number', 'email', 'address', 'city']:
-                update_fields.append(f"{field} = %s")
-                params.append(value)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No valid fields to update")
-        
-        params.extend([user_id, patient_id])
-        
-        update_query = f"""
-        UPDATE patients 
-        SET {', '.join(update_fields)}, updated_by = %s, updated_at = NOW()
-        WHERE patient_id = %s
-        """
-        
-        db.execute_insert(update_query, tuple(params))
-        
-        # Log the update
-        log_audit(db, user_id, 'UPDATE', 'patients', patient_id, 
-                  old_value=dict(old_data), new_value=patient_data, ip_address=request.client.host)
-        
-        return {"message": "Patient updated successfully"}
+        cursor.execute(
+            "UPDATE patients SET {}, updated_by = %s, updated_at = NOW() WHERE patient_id = %s".format(
+                ", ".join(f"{field} = %s" for field in new_values)),
+            tuple(updates[field] for field in new_values) + (user_id, patient_id)
+        )
+        patient_history.record_update(connection, patient_id, old_data, old_values, new_values, user_id,
+                                      ip_address=request.client.host)
+        connection.commit()
     except HTTPException:
         raise
+    except Exception as e:
+        connection.rollback()
+        raise HTTPException(status_code=500, detail="Database error occurred")
+    finally:
+        cursor.close()
+    patient_cache.invalidate_patients(patient_id)
+    
+    if any(field in new_values for field in ['first_name', 'last_name', 'phone_number']):
+        try:
+            patient_search.index_patient(db, {**old_data, **updates, 'patient_id': patient_id})
+        except Exception as e:
+            logging.exception('Search index update failed for patient %s: %s', patient_id, e)
+    
+    return {"message": "Patient updated successfully"}
+
+@patients_router.post("/encounters/batch")
+def create_encounters_batch(batch: EncounterBatch, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
+    """Record several encounters, e.g. a clinic uploading a day's visits, in one transaction"""
+    try:
+        results = create_encounters(db, batch.encounters, user_id, request.client.host)
+    except UnknownPatient:
+        raise HTTPException(status_code=400, detail="Batch references a patient that does not exist")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error occurred")
+    return {"results": results, "created": sum(result["status"] == "created" for result in results)}
 
 @patients_router.post("/{patient_id}/encounters")
-async def create_encounter(patient_id: int, encounter_data: PatientEncounter, request: Request, user_id: int = Depends(lambda: 1), db=Depends(get_db_connection)):
+def create_encounter(patient_id: int, encounter_data: PatientEncounter, request: Request, user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
     try:
-        # First create medical record if it doesn't exist
-        record_query = "SELECT record_id FROM medical_records WHERE patient_id = %s"
-        record_result = db.execute_query(record_query, (patient_id,))
-        
-        if not record_result:
-            record_insert = """
-            INSERT INTO medical_records (patient_id, created_by, created_at, updated_at)
-            VALUES (%s, %s, NOW(), NOW())
-            """
-            record_id = db.execute_insert(record_insert, (patient_id, user_id))
-        else:
-            record_id = record_result[0]['record_id']
-        
-        # Create encounter
-        encounter_query = """
-        INSERT INTO patient_encounters (record_id, patient_id, doctor_id, chief_complaint, 
-                                       diagnosis_description, treatment_plan, notes, 
-                                       encounter_date_time, created_by, created_at, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-        """
-        
-        encounter_id = db.execute_insert(encounter_query, (
-            record_id, patient_id, encounter_data.doctor_id, encounter_data.chief_complaint,
-            encounter_data.diagnosis_description, encounter_data.treatment_plan, 
-            encounter_data.notes, encounter_data.encounter_date_time, user_id
-        ))
-        
-        # Log encounter creation
-        log_audit(db, user_id, 'CREATE', 'patient_encounters', encounter_id, 
-                  new_value=encounter_data.dict(), ip_address=request.client.host)
-        
-        return {"encounter_id": encounter_id, "message": "Encounter created successfully"}
+        # Medical record upsert, encounter and audit entry commit together
+        encounter = encounter_data.model_copy(update={"patient_id": patient_id})
+        result = create_encounters(db, [encounter], user_id, request.client.host)[0]
+        return {"encounter_id": result["encounter_id"], "message": "Encounter created successfully"}
+    except UnknownPatient:
+        raise HTTPException(status_code=404, detail="Patient not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Database error occurred")
\ No newline at end of file
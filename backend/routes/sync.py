@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import Optional
+from models.schemas import SyncPush
+from database.connection import get_db_connection
+from services import sync
+from services import patient_cache
+from services.principal import current_user_id
+from services.json_response import FastJSONResponse
+
+sync_router = APIRouter()
+
+@sync_router.get("/changes")
+def get_changes(
+    since: Optional[str] = Query(None),
+    limit: int = Query(500, ge=1, le=sync.SYNC_PULL_MAX),
+    hospital_id: Optional[int] = Query(None),
+    current_user_id: int = Depends(current_user_id),
+    db=Depends(get_db_connection)
+):
+    """Patients and encounters changed since the `since` token (omit it for a full pull)"""
+    try:
+        return FastJSONResponse(sync.changes(db, since, limit, hospital_id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Database error occurred")
+
+@sync_router.post("/push")
+def push_changes(push: SyncPush, request: Request, current_user_id: int = Depends(current_user_id), db=Depends(get_db_connection)):
+    """Apply a batch of queued offline mutations in one transaction"""
+    try:
+        results = sync.push(db, push.mutations, current_user_id, request.client.host)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Database error occurred")
+    
+    patient_cache.invalidate_patients(*[result['patient_id'] for result in results
+                                        if result['status'] == 'applied' and 'patient_id' in result])
+    
+    return {"results": results}
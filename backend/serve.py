@@ -0,0 +1,95 @@
+import importlib.util
+import os
+
+from dotenv import load_dotenv
+
+# Production entry point: python serve.py
+# `python main.py` stays a single-process development server.
+load_dotenv()
+
+import uvicorn
+
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', '8000'))
+# Workers default to the CPUs this container may use; every worker has its
+# own DB pool, so the database sees up to WEB_CONCURRENCY * DB_POOL_MAX_SIZE
+# connections
+WEB_CONCURRENCY = os.getenv('WEB_CONCURRENCY')
+# Keep-alive longer than the load balancer's idle timeout avoids resets on reused connections
+KEEP_ALIVE_SECONDS = int(os.getenv('KEEP_ALIVE_SECONDS', '75'))
+# In-flight requests get this long to finish on SIGTERM before the lifespan
+# shutdown (which drains the audit queue) runs
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv('GRACEFUL_TIMEOUT_SECONDS', '30'))
+BACKLOG = int(os.getenv('BACKLOG', '2048'))
+# Per worker; above it new requests get 503 instead of queueing
+LIMIT_CONCURRENCY = int(os.getenv('LIMIT_CONCURRENCY', '0')) or None
+FORWARDED_ALLOW_IPS = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')
+# /metrics already records every request, so access lines are opt-in
+ACCESS_LOG = os.getenv('ACCESS_LOG', 'false').lower() == 'true'
+# Logouts, cache invalidations and read-your-writes windows live in the
+# cache; with 'local' each worker would only see its own
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+
+
+def _read(path: str) -> str:
+    with open(path) as handle:
+        return handle.read().strip()
+
+
+def available_cpus() -> int:
+    """CPUs usable by this process, honouring cgroup quotas that os.cpu_count() ignores."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        count = os.cpu_count() or 1
+    try:
+        quota, period = _read('/sys/fs/cgroup/cpu.max').split()  # cgroup v2
+    except (OSError, ValueError):
+        try:
+            quota, period = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        except OSError:
+            quota, period = 'max', '1'
+    if quota not in ('max', '-1'):
+        count = min(count, max(1, round(int(quota) / int(period))))
+    return max(1, count)
+
+
+def worker_count(cpus: int) -> int:
+    return max(1, int(WEB_CONCURRENCY)) if WEB_CONCURRENCY else cpus
+
+
+def main():
+    cpus = available_cpus()
+    workers = worker_count(cpus)
+    if workers > 1 and CACHE_BACKEND == 'local':
+        print(f"Warning: {workers} workers need a shared cache (CACHE_BACKEND=redis); "
+              "starting a single worker instead")
+        workers = 1
+    # Split bcrypt threads between workers rather than giving each worker
+    # its own full set; workers inherit this environment
+    os.environ.setdefault('PASSWORD_WORKERS', str(max(1, cpus // workers)))
+    loop = 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+    http = 'httptools' if importlib.util.find_spec('httptools') else 'h11'
+    print(f"Starting {workers} worker(s) on {HOST}:{PORT} ({cpus} CPUs, loop={loop}, http={http})")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        lifespan="on",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+        limit_concurrency=LIMIT_CONCURRENCY,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        log_level=LOG_LEVEL,
+        access_log=ACCESS_LOG,
+    )
+
+
+if __name__ == "__main__":
+    main()
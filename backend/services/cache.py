@@ -0,0 +1,336 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+# 'local' keeps entries in this worker only; 'redis' shares them between
+# uvicorn workers so an invalidation in one worker is seen by all of them.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+CACHE_URL = os.getenv('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '5000'))
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '300'))
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f"Cannot cache {type(value).__name__}")
+
+
+def dumps(value) -> str:
+    # Same JSON FastAPI would send, so a cache hit serializes identically
+    return json.dumps(value, default=_default, separators=(',', ':'))
+
+
+def loads(payload):
+    return json.loads(payload)
+
+
+class LocalCache:
+    """Bounded LRU with per-entry TTL, held in this process."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        # key -> time.time() of its last invalidation; kept apart from the
+        # LRU so a burst of entries can never evict one
+        self._invalidated = {}
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: str, track: bool = True) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._metrics["misses"] += track
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                self._metrics["expirations"] += 1
+                self._metrics["misses"] += track
+                return None
+            self._entries.move_to_end(key)
+            self._metrics["hits"] += track
+            return entry[1]
+
+    def set(self, key: str, payload: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, payload, ttl)
+
+    def _store(self, key: str, payload: str, ttl: Optional[float]):
+        self._entries[key] = (time.monotonic() + (ttl or self.ttl), payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._metrics["evictions"] += 1
+
+    def set_if_fresh(self, key: str, payload: str, read_started: float):
+        """Store a value read at read_started (a time.time()) unless the key
+        was invalidated since; the check and the store are one step."""
+        with self._lock:
+            invalidated = self._invalidated.get(key)
+            if invalidated is None or invalidated < read_started:
+                self._store(key, payload, None)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._metrics["invalidations"] += 1
+
+    def invalidate(self, *keys: str):
+        """Delete entries and refuse values for them read before now."""
+        with self._lock:
+            now = time.time()
+            if len(self._invalidated) >= self.max_entries:
+                # A read older than the entry TTL is not in flight any more
+                self._invalidated = {k: t for k, t in self._invalidated.items() if t >= now - self.ttl}
+            for key in keys:
+                self._invalidated[key] = now
+                if self._entries.pop(key, None) is not None:
+                    self._metrics["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+            stats.update({"backend": "local", "entries": len(self._entries), "max_entries": self.max_entries})
+            return stats
+
+
+# Stores a value unless the key was invalidated after the read began, and
+# forgets invalidations too old to matter to any read still in flight
+_SET_IF_FRESH = """
+local invalidated = tonumber(redis.call('HGET', KEYS[2], KEYS[1]))
+local read_started = tonumber(ARGV[2])
+if invalidated and invalidated >= read_started then
+    return 0
+end
+if invalidated and invalidated < read_started - tonumber(ARGV[3]) then
+    redis.call('HDEL', KEYS[2], KEYS[1])
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+class RedisCache:
+    """Shared cache on a Redis-compatible server. Eviction is left to the
+    server's maxmemory policy; hit and miss counts are tracked per worker.
+
+    Invalidation times live in one hash per cache that expires one TTL
+    after the latest invalidation, by when no read that predates it can
+    still be in flight. Run the server with maxmemory-policy noeviction so
+    the hash is never evicted early; every key has a TTL, so memory stays
+    bounded, and a full server only costs failed (counted) cache writes.
+    """
+
+    def __init__(self, name: str, url: str = CACHE_URL, ttl: float = CACHE_TTL_SECONDS, client=None):
+        self.client = client if client is not None else _redis_client(url)
+        self.ttl = ttl
+        self.invalidated_key = f"{name}:invalidated"
+        self._set_if_fresh = self.client.register_script(_SET_IF_FRESH)
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "errors": 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def get(self, key: str, track: bool = True) -> Optional[str]:
+        try:
+            payload = self.client.get(key)
+        except Exception:
+            # A cache outage degrades to database reads, never to errors
+            self._count("errors")
+            payload = None
+        if track:
+            self._count("hits" if payload is not None else "misses")
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        return payload
+
+    def set(self, key: str, payload: str, ttl: Optional[float] = None):
+        try:
+            self.client.set(key, payload, ex=max(1, int(ttl or self.ttl)))
+        except Exception:
+            self._count("errors")
+
+    def set_if_fresh(self, key: str, payload: str, read_started: float):
+        """Store a value read at read_started (a time.time()) unless the key
+        was invalidated since; checked and stored in one server-side script."""
+        try:
+            self._set_if_fresh(keys=[key, self.invalidated_key],
+                               args=[payload, repr(read_started), max(1, int(self.ttl))])
+        except Exception:
+            self._count("errors")
+
+    def delete(self, *keys: str):
+        try:
+            self.client.delete(*keys)
+            self._count("invalidations", len(keys))
+        except Exception:
+            self._count("errors")
+
+    def invalidate(self, *keys: str):
+        """Delete entries and refuse values for them read before now."""
+        now = repr(time.time())
+        try:
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.hset(self.invalidated_key, mapping={key: now for key in keys})
+            pipeline.expire(self.invalidated_key, max(1, int(self.ttl)))
+            pipeline.delete(*keys)
+            pipeline.execute()
+            self._count("invalidations", len(keys))
+        except Exception:
+            self._count("errors")
+
+    def clear(self):
+        pass  # shared entries expire on their own TTL
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._metrics)
+        stats["backend"] = "redis"
+        return stats
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of the redis client RedisCache
+    uses, for tests. Pass one instance to several RedisCache objects to
+    model workers sharing a server."""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at or None, value)
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            entry = None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1].encode('utf-8') if entry is not None else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, str(value))
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def hset(self, name, mapping):
+        with self._lock:
+            entry = self._live(name)
+            expires_at, fields = entry if entry is not None else (None, {})
+            fields.update({key: str(value) for key, value in mapping.items()})
+            self._data[name] = (expires_at, fields)
+
+    def expire(self, name, seconds):
+        with self._lock:
+            entry = self._live(name)
+            if entry is not None:
+                self._data[name] = (time.monotonic() + seconds, entry[1])
+
+    def ttl(self, name):
+        with self._lock:
+            entry = self._live(name)
+            if entry is None:
+                return -2
+            return -1 if entry[0] is None else int(entry[0] - time.monotonic())
+
+    def ping(self):
+        return True
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def register_script(self, script):
+        if script != _SET_IF_FRESH:
+            raise NotImplementedError("FakeRedis only runs RedisCache's own script")
+        return self._set_if_fresh
+
+    def _set_if_fresh(self, keys, args):
+        # Mirrors _SET_IF_FRESH
+        key, invalidated_key = keys
+        payload, read_started, ttl = args[0], float(args[1]), int(args[2])
+        with self._lock:
+            entry = self._live(invalidated_key)
+            fields = entry[1] if entry is not None else {}
+            invalidated = float(fields[key]) if key in fields else None
+            if invalidated is not None and invalidated >= read_started:
+                return 0
+            if invalidated is not None and invalidated < read_started - ttl:
+                del fields[key]
+            self.set(key, payload, ex=ttl)
+            return 1
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self._calls.append((name, args, kwargs))
+
+    def execute(self):
+        with self.client._lock:
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+
+
+def _redis_client(url: str):
+    # One client, and so one connection pool, per server for all named caches
+    if url not in _redis_clients:
+        with _caches_lock:
+            if url not in _redis_clients:
+                try:
+                    import redis
+                except ImportError:
+                    raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+                _redis_clients[url] = redis.Redis.from_url(url)
+    return _redis_clients[url]
+
+
+_caches = {}
+_redis_clients = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+    """Named cache on the configured backend; keys should be prefixed with the name."""
+    if name not in _caches:
+        with _caches_lock:
+            if name not in _caches:
+                if CACHE_BACKEND == 'redis':
+                    _caches[name] = RedisCache(name, ttl=ttl)
+                else:
+                    _caches[name] = LocalCache(max_entries=max_entries, ttl=ttl)
+    return _caches[name]
+
+
+def warm():
+    """Connect to the shared cache server ahead of the first request; raises if it is unreachable."""
+    if CACHE_BACKEND == 'redis':
+        _redis_client(CACHE_URL).ping()
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,145 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+# Bodies smaller than this go out as-is: below ~1 KB the framing overhead
+# and CPU outweigh the bytes saved
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+# Moderate levels: most of the size win at a fraction of the top levels' CPU
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def accepted_encodings(header: str) -> dict:
+    """Accept-Encoding as {coding: q}, e.g. 'br;q=1.0, gzip;q=0.8' -> {'br': 1.0, 'gzip': 0.8}."""
+    accepted = {}
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def choose_encoding(header: str):
+    """The best coding both sides support, preferring brotli on ties; None for identity."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in (("br", "gzip") if brotli is not None else ("gzip",)):
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # Sync flush so streamed exports reach the client as they are produced
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing JSON and text responses with brotli or gzip.
+
+    The coding is negotiated from Accept-Encoding (q-values honoured). Small
+    bodies, already-encoded responses and binary types pass through, and
+    streamed responses are compressed chunk by chunk rather than buffered.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = ("content-encoding" in headers
+                               or not content_type.startswith(COMPRESSIBLE_TYPES))
+                if not passthrough:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                # First body message: decide now, then release the headers
+                start, start_message = start_message, None
+                if passthrough or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Brotli(self.brotli_quality) if coding == "br" else _Gzip(self.gzip_level)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = coding
+                if more_body:
+                    del headers["Content-Length"]
+                    body = compressor.chunk(body)
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            if passthrough:
+                await send(message)
+                return
+            body = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
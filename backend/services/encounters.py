@@ -0,0 +1,144 @@
+from datetime import datetime
+
+from mysql.connector import IntegrityError
+
+from database.audit_writer import audit_row, insert_rows
+
+ENCOUNTER_INSERT_COLUMNS = (
+    "record_id", "patient_id", "doctor_id", "chief_complaint", "diagnosis_description",
+    "treatment_plan", "notes", "encounter_date_time", "client_ref", "created_by",
+)
+ER_NO_REFERENCED_ROW = 1452
+
+
+class UnknownPatient(Exception):
+    """An encounter referenced a patient that does not exist."""
+
+
+def upsert_records(connection, patient_ids, user_id: int) -> dict:
+    """patient_id -> record_id, creating missing medical records in one statement.
+
+    Relies on the unique patient_id key: a concurrent first visit hits the
+    duplicate-key branch instead of adding a second record, and
+    LAST_INSERT_ID(record_id) hands back the existing id.
+    """
+    patient_ids = list(dict.fromkeys(patient_ids))
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO medical_records (patient_id, created_by, created_at, updated_at) VALUES "
+            + ", ".join(["(%s, %s, NOW(), NOW())"] * len(patient_ids))
+            + " ON DUPLICATE KEY UPDATE record_id = LAST_INSERT_ID(record_id)",
+            tuple(value for patient_id in patient_ids for value in (patient_id, user_id))
+        )
+        if len(patient_ids) == 1:
+            return {patient_ids[0]: cursor.lastrowid}
+        cursor.execute(
+            "SELECT patient_id, record_id FROM medical_records WHERE patient_id IN ({})".format(
+                ", ".join(["%s"] * len(patient_ids))),
+            tuple(patient_ids)
+        )
+        return dict(cursor.fetchall())
+    except IntegrityError as e:
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise UnknownPatient("Patient not found")
+        raise
+    finally:
+        cursor.close()
+
+
+def _inserted_ids(cursor, first_id: int, new, user_id: int, created_at) -> list:
+    """Ids of the rows one multi-row INSERT just added, in input order.
+
+    Under innodb_autoinc_lock_mode=2 (the MySQL 8 default) concurrent
+    inserts can interleave, so the ids are not first_id + i * step. Read
+    them back instead: they are the rows at or after first_id stamped with
+    this batch, and must match the input's patients and client refs.
+    """
+    cursor.execute(
+        "SELECT encounter_id, patient_id, client_ref FROM patient_encounters "
+        "WHERE encounter_id >= %s AND created_by = %s AND created_at = %s "
+        "ORDER BY encounter_id LIMIT %s",
+        (first_id, user_id, created_at, len(new))
+    )
+    rows = cursor.fetchall()
+    if [(row[1], row[2]) for row in rows] != [(e.patient_id, getattr(e, 'client_ref', None)) for e in new]:
+        raise RuntimeError("Inserted encounter ids could not be read back")
+    return [row[0] for row in rows]
+
+
+def create_encounters(db, encounters, user_id: int, ip_address: str = None) -> list:
+    """Insert encounters, their medical records and CREATE audit rows in one transaction.
+
+    Encounters whose client_ref is already stored (or repeated earlier in
+    the same call) are not inserted again. Returns one
+    {"encounter_id", "patient_id", "status"} per input, in input order.
+    """
+    connection = db.connection
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        refs = [e.client_ref for e in encounters if getattr(e, 'client_ref', None)]
+        existing = {}
+        if refs:
+            cursor.execute(
+                "SELECT client_ref, encounter_id FROM patient_encounters WHERE client_ref IN ({})".format(
+                    ", ".join(["%s"] * len(refs))),
+                tuple(refs)
+            )
+            existing = dict(cursor.fetchall())
+
+        results, new, positions = [], [], {}
+        for encounter in encounters:
+            ref = getattr(encounter, 'client_ref', None)
+            if ref in existing:
+                results.append({"encounter_id": existing[ref], "patient_id": encounter.patient_id,
+                                "status": "duplicate"})
+            elif ref in positions:
+                results.append({"new": positions[ref], "patient_id": encounter.patient_id, "status": "duplicate"})
+            else:
+                if ref:
+                    positions[ref] = len(new)
+                results.append({"new": len(new), "patient_id": encounter.patient_id, "status": "created"})
+                new.append(encounter)
+
+        if new:
+            records = upsert_records(connection, [e.patient_id for e in new], user_id)
+            created_at = datetime.now().replace(microsecond=0)
+            row_sql = "(" + ", ".join(["%s"] * (len(ENCOUNTER_INSERT_COLUMNS) + 2)) + ")"
+            params = []
+            for e in new:
+                params.extend((records[e.patient_id], e.patient_id, e.doctor_id, e.chief_complaint,
+                               e.diagnosis_description, e.treatment_plan, e.notes, e.encounter_date_time,
+                               getattr(e, 'client_ref', None), user_id, created_at, created_at))
+            cursor.execute(
+                "INSERT INTO patient_encounters ({}, created_at, updated_at) VALUES {}".format(
+                    ", ".join(ENCOUNTER_INSERT_COLUMNS), ", ".join([row_sql] * len(new))),
+                tuple(params)
+            )
+            if len(new) == 1:
+                ids = [cursor.lastrowid]
+            else:
+                ids = _inserted_ids(cursor, cursor.lastrowid, new, user_id, created_at)
+            now = datetime.now()
+            insert_rows(cursor, [
+                audit_row(user_id, 'CREATE', 'PATIENTS', 'patient_encounters', encounter_id,
+                          new_value=e.model_dump(), ip_address=ip_address, timestamp=now)
+                for encounter_id, e in zip(ids, new)
+            ])
+            for result in results:
+                if "new" in result:
+                    result["encounter_id"] = ids[result.pop("new")]
+        connection.commit()
+    except IntegrityError as e:
+        connection.rollback()
+        if e.errno == ER_NO_REFERENCED_ROW:
+            raise UnknownPatient("Patient not found")
+        raise
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return [{"encounter_id": r["encounter_id"], "patient_id": r["patient_id"], "status": r["status"]}
+            for r in results]
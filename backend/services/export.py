@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from fastapi.responses import StreamingResponse
+
+from database.connection import get_pool
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '500'))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def iter_chunks(query: str, params: tuple, chunk_size: int = EXPORT_CHUNK_SIZE, pool=None):
+    """Yield (column_names, rows) chunks from an unbuffered cursor.
+
+    The connection is taken from the pool for the life of the generator,
+    not the request, because the response body is sent after request
+    dependencies have been cleaned up. MySQL streams the result set, so at
+    most chunk_size rows are held client-side at a time.
+    """
+    pool = pool or get_pool()
+    connection = pool.acquire()
+    cursor = None
+    finished = False
+    try:
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+        columns = list(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield columns, rows
+        finished = True
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                finished = False
+        # A client that disconnects mid-export leaves unread rows on the
+        # connection; drop it rather than drain the rest of the result
+        pool.release(connection, discard=not finished)
+
+
+def ndjson_lines(chunks):
+    for columns, rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=_default, separators=(',', ':')) + "\n"
+            for row in rows
+        ).encode('utf-8')
+
+
+def csv_lines(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = True
+    for columns, rows in chunks:
+        if header:
+            writer.writerow(columns)
+            header = False
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def gzip_stream(body):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for data in body:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(query: str, params: tuple, fmt: str, filename: str, gzip: bool = False,
+                    pool=None) -> StreamingResponse:
+    """Stream a query as an NDJSON or CSV download, optionally gzipped."""
+    chunks = iter_chunks(query, params, pool=pool)
+    body = ndjson_lines(chunks) if fmt == 'ndjson' else csv_lines(chunks)
+    filename = f"{filename}.{fmt}"
+    media_type = MEDIA_TYPES[fmt]
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
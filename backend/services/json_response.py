@@ -0,0 +1,48 @@
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder below produces the same JSON, only slower
+    orjson = None
+
+
+def _default(value):
+    """Types database rows carry that JSON lacks, encoded the way jsonable_encoder would."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for plain rows and dicts that skips jsonable_encoder.
+
+    Returning one of these from a route bypasses FastAPI's recursive encode
+    of every value, which dominates CPU on large result pages. Only use it
+    for content that is already dicts, lists and scalar column values;
+    pydantic models still need the default path.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,210 @@
+import hashlib
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+# In-process metrics in the Prometheus text format. Each uvicorn worker
+# keeps its own numbers, so scrape workers individually or run one.
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = dict(self._values)
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labelvalues, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = {labelvalues: list(series) for labelvalues, series in self._series.items()}
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labelvalues, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-2])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {series[-1]}"
+
+
+class Registry:
+    """Metrics updated inline plus collectors that read other components' stats() at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() returns (name, type, help, labels dict, value) samples."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        families = {}
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception:
+                continue  # a component that is down should not break the scrape
+            for name, kind, help, labels, value in samples:
+                family = families.setdefault(name, (kind, help, []))
+                family[2].append((labels, value))
+        for name, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route", "status")
+))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Query latency by normalized statement.", ("fingerprint", "statement"), DB_BUCKETS
+))
+DB_QUERY_ERRORS = REGISTRY.register(Counter(
+    "db_query_errors_total", "Queries that raised a database error.", ("fingerprint", "statement")
+))
+DB_POOL_ACQUIRE_SECONDS = REGISTRY.register(Histogram(
+    "db_pool_acquire_seconds", "Time spent waiting for a pooled connection.", (), DB_BUCKETS
+))
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_ROW_LISTS = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str):
+    """(short id, 'VERB table') for a query, ignoring literals, IN-list and VALUES sizes."""
+    normalized = " ".join(sql.split())
+    normalized = _LITERALS.sub("?", normalized)
+    normalized = _LISTS.sub("(...)", normalized)
+    normalized = _ROW_LISTS.sub(r"\1", normalized)
+    verb = normalized.split(" ", 1)[0].upper() if normalized else ""
+    table = _TABLE.search(normalized)
+    statement = f"{verb} {table.group(1)}" if table else verb
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:10], statement
+
+
+def observe_query(sql: str, seconds: float, failed: bool = False):
+    labels = fingerprint(sql)
+    DB_QUERY_SECONDS.observe(seconds, *labels)
+    if failed:
+        DB_QUERY_ERRORS.inc(*labels)
+
+
+def stats_samples(prefix: str, help: str, stats: dict, counters=(), labels=None):
+    """Turn a component's stats() dict into samples; keys in `counters` become *_total counters."""
+    samples = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            samples.append((f"{prefix}_{key}_total", "counter", help, labels or {}, value))
+        else:
+            samples.append((f"{prefix}_{key}", "gauge", help, labels or {}, value))
+    return samples
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request under its route template.
+
+    Using the template (/api/patients/{patient_id}) rather than the raw
+    path keeps one series per endpoint; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), str(status[0])
+            )
@@ -0,0 +1,91 @@
+# Phonetic keys and edit-distance helpers for fuzzy patient name search.
+# The phonetic key is a consonant skeleton tuned for how Kenyan names get
+# transliterated at registration desks: r/l are interchangeable, the
+# prenasalised stops at the start of a word (Mb-, Nd-, Ng-, Nj-) are often
+# dropped, and vowels are unreliable after the first letter.
+
+MAX_DELETE_DISTANCE = 1  # deletions stored per dictionary token
+MIN_FUZZY_LENGTH = 4     # shorter tokens are matched exactly
+
+_CLASSES = {}
+for _letters, _code in (("bpfv", "b"), ("cgjkqsxz", "k"), ("dt", "d"), ("lr", "r"),
+                        ("mn", "n"), ("w", "w")):
+    for _letter in _letters:
+        _CLASSES[_letter] = _code
+
+_PRENASALISED = ("mb", "nd", "ng", "nj", "ny")
+_DIGRAPHS = (("ch", "c"), ("sh", "s"), ("ph", "f"), ("th", "t"), ("ng'", "ng"))
+
+
+def phonetic_key(token: str) -> str:
+    if not token:
+        return ""
+    word = token.lower()
+    for digraph, replacement in _DIGRAPHS:
+        word = word.replace(digraph, replacement)
+    if word[:2] in _PRENASALISED and len(word) > 3:
+        word = word[1:]
+    key = word[0]
+    previous = _CLASSES.get(word[0], "")
+    for letter in word[1:]:
+        code = _CLASSES.get(letter, "")
+        if code and code != previous:
+            key += code
+        previous = code  # vowels, h and y break runs, like Soundex
+    return key[:8]
+
+
+def deletes(token: str, distance: int = MAX_DELETE_DISTANCE) -> set:
+    """All strings reachable from token by removing up to `distance` characters."""
+    variants = {token}
+    frontier = {token}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word)) if len(word) > 1}
+        variants |= frontier
+    return variants
+
+
+def max_distance(term: str) -> int:
+    if len(term) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(term) < 7 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def token_variants(token: str) -> list:
+    """(kind, variant) rows that make `token` findable by fuzzy search."""
+    rows = [("phonetic", phonetic_key(token))]
+    if len(token) >= MIN_FUZZY_LENGTH:
+        rows.extend(("delete", variant) for variant in deletes(token))
+    return rows
+
+
+def score(term: str, token: str, distance: int) -> int:
+    """0-100 similarity used to rank candidates; exact matches score highest."""
+    if distance == 0:
+        return 100
+    base = 100 - (100 * distance) // max(len(term), len(token))
+    if phonetic_key(term) == phonetic_key(token):
+        base += 5
+    return min(base, 99)
@@ -0,0 +1,24 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    payload = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str], size: int):
+    """Decode an opaque cursor back into its key values, or None for the first page."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+import bcrypt
+
+# bcrypt releases the GIL while hashing, so plain threads give real
+# parallelism without the pickling and startup cost of a process pool
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', '64'))
+PASSWORD_QUEUE_PER_CLIENT = int(os.getenv('PASSWORD_QUEUE_PER_CLIENT', '8'))
+# Hashes below this cost are re-hashed after a successful login
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', '12'))
+
+LOGIN_MAX_FAILURES = int(os.getenv('LOGIN_MAX_FAILURES', '5'))
+LOGIN_FAILURE_WINDOW_SECONDS = float(os.getenv('LOGIN_FAILURE_WINDOW_SECONDS', '300'))
+LOGIN_MAX_IN_FLIGHT = int(os.getenv('LOGIN_MAX_IN_FLIGHT', '2'))
+LOGIN_THROTTLE_MAX_USERS = 10000
+
+
+class HasherBusy(Exception):
+    """The verification queue is full; the caller should retry shortly."""
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many login attempts, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Bounded pool of bcrypt workers with round-robin scheduling.
+
+    Work is queued per client key and the workers take one item from each
+    key in turn, so a burst from one client (or one clinic behind NAT)
+    waits behind itself instead of delaying everyone else's login. Both
+    the total queue and each key's share of it are capped.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT,
+                 per_client_limit: int = PASSWORD_QUEUE_PER_CLIENT, rounds: int = PASSWORD_BCRYPT_ROUNDS):
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.per_client_limit = per_client_limit
+        self.rounds = rounds
+        self._queues = OrderedDict()  # key -> deque of (future, fn, args, queued_at); key order is the round-robin ring
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._metrics = {"completed": 0, "rejected": 0, "failed": 0, "wait_seconds_max": 0.0}
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"password-hasher-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, key: str, fn, *args) -> Future:
+        if not self._threads:
+            self.start()
+        future = Future()
+        with self._cond:
+            queue = self._queues.get(key)
+            if self._queued >= self.queue_limit or (queue is not None and len(queue) >= self.per_client_limit):
+                self._metrics["rejected"] += 1
+                raise HasherBusy("Password verification queue is full")
+            if queue is None:
+                queue = self._queues[key] = deque()
+            queue.append((future, fn, args, time.monotonic()))
+            self._queued += 1
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        # Take the head of the first key in the ring, then move that key to
+        # the back so every waiting client gets a turn
+        key, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        if queue:
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self._queued -= 1
+        return item
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queued and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._queued:
+                    return
+                future, fn, args, queued_at = self._next()
+                self._running += 1
+                self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"],
+                                                        time.monotonic() - queued_at)
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+                with self._cond:
+                    self._metrics["failed"] += 1
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._metrics["completed"] += 1
+
+    async def verify(self, password: str, hashed: str, key: str = "") -> bool:
+        return await asyncio.wrap_future(self.submit(key, _checkpw, password, hashed))
+
+    async def hash(self, password: str, key: str = "") -> str:
+        return await asyncio.wrap_future(self.submit(key, _hashpw, password, self.rounds))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True for hashes made with fewer rounds than PASSWORD_BCRYPT_ROUNDS."""
+        try:
+            return int(hashed.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._metrics)
+            stats.update({
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "clients_waiting": len(self._queues),
+                "queue_limit": self.queue_limit,
+            })
+            return stats
+
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+class LoginThrottle:
+    """Per-username failure window plus a cap on concurrent attempts.
+
+    Checked before any bcrypt work is queued, so a brute-force burst costs
+    a dictionary lookup per request rather than a quarter second of CPU.
+    Counts are per worker process.
+    """
+
+    def __init__(self, max_failures: int = LOGIN_MAX_FAILURES, window: float = LOGIN_FAILURE_WINDOW_SECONDS,
+                 max_in_flight: int = LOGIN_MAX_IN_FLIGHT):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_in_flight = max_in_flight
+        self._failures = OrderedDict()  # username -> deque of failure times, least recent first
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._throttled = 0
+
+    def _recent_failures(self, username: str, now: float):
+        failures = self._failures.get(username)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+            return None
+        return failures
+
+    def acquire(self, username: str):
+        """Reserve an attempt or raise LoginThrottled; pair with release()."""
+        username = username.lower()
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent_failures(username, now)
+            if failures is not None and len(failures) >= self.max_failures:
+                self._throttled += 1
+                raise LoginThrottled(max(1, int(failures[0] + self.window - now)))
+            if self._in_flight.get(username, 0) >= self.max_in_flight:
+                self._throttled += 1
+                raise LoginThrottled(1)
+            self._in_flight[username] = self._in_flight.get(username, 0) + 1
+
+    def release(self, username: str, success: Optional[bool]):
+        """Free the attempt. True clears the failures, False records one;
+        None (the attempt never got to check the password) does neither."""
+        username = username.lower()
+        with self._lock:
+            count = self._in_flight.get(username, 1) - 1
+            if count > 0:
+                self._in_flight[username] = count
+            else:
+                self._in_flight.pop(username, None)
+            if success:
+                self._failures.pop(username, None)
+                return
+            if success is None:
+                return
+            failures = self._failures.get(username)
+            if failures is None:
+                failures = self._failures[username] = deque()
+            failures.append(time.monotonic())
+            self._failures.move_to_end(username)
+            while len(self._failures) > LOGIN_THROTTLE_MAX_USERS:
+                self._failures.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"throttled": self._throttled, "tracked_users": len(self._failures),
+                    "in_flight": sum(self._in_flight.values())}
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+login_throttle = LoginThrottle()
+
+
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
@@ -0,0 +1,36 @@
+import os
+from typing import Optional
+
+from services.cache import get_cache, dumps, loads
+
+PATIENT_CACHE_MAX_ENTRIES = int(os.getenv('PATIENT_CACHE_MAX_ENTRIES', '5000'))
+PATIENT_CACHE_TTL_SECONDS = float(os.getenv('PATIENT_CACHE_TTL_SECONDS', '300'))
+
+
+def _cache():
+    return get_cache('patient', PATIENT_CACHE_MAX_ENTRIES, PATIENT_CACHE_TTL_SECONDS)
+
+
+def _key(patient_id) -> str:
+    return f"patient:{patient_id}"
+
+
+def get_patient(patient_id) -> Optional[dict]:
+    payload = _cache().get(_key(patient_id))
+    return loads(payload) if payload is not None else None
+
+
+def put_patient(patient_id, row: dict, read_started: float):
+    """Cache a row read from the database at read_started (a time.time()).
+
+    A row read before the patient's last invalidation is dropped, so a slow
+    reader cannot put back data that an update has just replaced.
+    """
+    _cache().set_if_fresh(_key(patient_id), dumps(row), read_started)
+
+
+def invalidate_patients(*patient_ids):
+    """Drop cached rows; call from every path that writes to patients."""
+    if not patient_ids:
+        return
+    _cache().invalidate(*[_key(patient_id) for patient_id in patient_ids])
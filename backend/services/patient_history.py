@@ -0,0 +1,180 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from database.audit_writer import audit_row, insert_rows
+from database import audit_archive
+from models.schemas import PATIENT_COLUMNS
+
+# A full copy of the patient is kept after the first diff-only edit and then
+# every this many edits, so rebuilding any version replays at most this
+# many diffs
+PATIENT_SNAPSHOT_INTERVAL = int(os.getenv('PATIENT_SNAPSHOT_INTERVAL', '20'))
+
+# What a reconstructed version holds; updated_at and row_version change on
+# every write and are not part of the patient's history
+VERSION_FIELDS = tuple(c for c in PATIENT_COLUMNS if c not in ('updated_at', 'row_version'))
+
+
+def plain(value):
+    """A JSON-safe form of a column value; dates become ISO strings."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+def diff(current: dict, changes: dict) -> tuple:
+    """(old, new) dicts holding only the fields whose value actually changes."""
+    old, new = {}, {}
+    for field, value in changes.items():
+        before, after = plain(current.get(field)), plain(value)
+        if before != after:
+            old[field], new[field] = before, after
+    return old, new
+
+
+def _one(cursor, query: str, params: tuple):
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    return rows[0] if rows else None
+
+
+def record_update(connection, patient_id: int, current: dict, old: dict, new: dict, user_id: int,
+                  module: str = 'PATIENTS', ip_address: str = None) -> int:
+    """Write a diff-only UPDATE audit entry, and a snapshot when one is due, on the open transaction.
+
+    `current` is the patient row before the update, locked by the caller.
+    Returns the audit log_id.
+    """
+    cursor = connection.cursor()
+    now = datetime.now().replace(microsecond=0)
+    try:
+        log_id = insert_rows(cursor, [audit_row(user_id, 'UPDATE', module, 'patients', patient_id, old_value=old,
+                                                new_value=new, ip_address=ip_address, timestamp=now)])
+        latest = _one(cursor, "SELECT log_id, taken_at FROM patient_snapshots WHERE patient_id = %s "
+                              "ORDER BY log_id DESC LIMIT 1", (patient_id,))
+        due = latest is None
+        if not due:
+            edits = _one(cursor, """
+                SELECT COUNT(*) FROM audit_logs
+                WHERE record_id_affected = %s AND action_timestamp >= %s
+                AND table_name = 'patients' AND action_type = 'UPDATE' AND log_id > %s
+                """, (patient_id, latest[1], latest[0]))[0]
+            due = edits >= PATIENT_SNAPSHOT_INTERVAL
+        if due:
+            state = {field: plain(current.get(field)) for field in VERSION_FIELDS}
+            state.update(new)
+            cursor.execute(
+                "INSERT INTO patient_snapshots (patient_id, log_id, taken_at, data) VALUES (%s, %s, %s, %s)",
+                (patient_id, log_id, now, json.dumps(state, separators=(',', ':')))
+            )
+        return log_id
+    finally:
+        cursor.close()
+
+
+def _loads(value) -> dict:
+    if not value:
+        return {}
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    try:
+        loaded = json.loads(value)
+    except ValueError:
+        return {}
+    return loaded if isinstance(loaded, dict) else {}
+
+
+def _apply(state: dict, values: dict):
+    # Entries written before diffs carry whole rows; only patient fields count
+    state.update({field: plain(value) for field, value in values.items() if field in state})
+
+
+EDITS_QUERY = """
+    SELECT log_id, old_value, new_value FROM audit_logs
+    WHERE record_id_affected = %s AND action_timestamp >= %s AND action_timestamp <= %s
+    AND table_name = 'patients' AND action_type = 'UPDATE' AND log_id > %s AND log_id <= %s
+    ORDER BY log_id {}
+    """
+
+
+def _edits(db, patient_id: int, start, end, after_log_id: int, upto_log_id: int, descending: bool = False):
+    """UPDATE entries for the patient with after_log_id < log_id <= upto_log_id
+    and start <= action_timestamp <= end, in log_id order.
+
+    Entries from months already moved to the archive are read from there,
+    so a replay that reaches back past the archive cutoff is not silently
+    missing diffs.
+    """
+    edits = db.execute_query(EDITS_QUERY.format("DESC" if descending else "ASC"),
+                             (patient_id, start, end, after_log_id, upto_log_id))
+    if edits is None:
+        raise RuntimeError("Could not read patient history")
+    boundary = audit_archive.archived_before()
+    if boundary is None or start >= boundary:
+        return edits
+    seen = {edit['log_id'] for edit in edits}
+    archived = audit_archive.search(
+        lambda row: (str(row['record_id_affected']) == str(patient_id) and row['table_name'] == 'patients'
+                     and row['action_type'] == 'UPDATE' and after_log_id < row['log_id'] <= upto_log_id
+                     and row['action_timestamp'] <= end and row['log_id'] not in seen),
+        limit=2 ** 31, start=start, end=boundary, columns=('log_id', 'old_value', 'new_value'))
+    return sorted(edits + archived, key=lambda edit: edit['log_id'], reverse=descending)
+
+
+def version_at(db, patient_id: int, log_id: int):
+    """The patient as it stood right after audit entry `log_id`, or None if no such entry.
+
+    Starts from the nearest snapshot at or before the entry and replays the
+    diffs' new values forward. Entries older than the first snapshot are
+    reached by replaying old values backwards from the first snapshot after
+    them (or from the live row). Diff rows are fetched through the
+    (record_id_affected, action_timestamp) index, bounded by the
+    timestamps at both ends, and from the archive for archived months.
+    """
+    target = db.execute_query(
+        "SELECT log_id, action_timestamp FROM audit_logs "
+        "WHERE log_id = %s AND record_id_affected = %s AND table_name = 'patients'",
+        (log_id, patient_id)
+    )
+    if not target:
+        return None
+    target = target[0]
+    before = db.execute_query(
+        "SELECT log_id, taken_at, data FROM patient_snapshots WHERE patient_id = %s AND log_id <= %s "
+        "ORDER BY log_id DESC LIMIT 1", (patient_id, log_id)
+    )
+    if before:
+        state = json.loads(before[0]['data'])
+        edits = _edits(db, patient_id, before[0]['taken_at'], target['action_timestamp'],
+                       before[0]['log_id'], log_id)
+        for edit in edits:
+            _apply(state, _loads(edit['new_value']))
+        return state
+
+    after = db.execute_query(
+        "SELECT log_id, taken_at, data FROM patient_snapshots WHERE patient_id = %s AND log_id > %s "
+        "ORDER BY log_id LIMIT 1", (patient_id, log_id)
+    )
+    if after:
+        state = json.loads(after[0]['data'])
+        upper_log_id, upper_time = after[0]['log_id'], after[0]['taken_at']
+    else:
+        live = db.execute_query("SELECT {} FROM patients WHERE patient_id = %s".format(", ".join(VERSION_FIELDS)),
+                                (patient_id,))
+        if not live:
+            return None
+        state = {field: plain(value) for field, value in live[0].items()}
+        upper_log_id, upper_time = 2 ** 63 - 1, datetime(9999, 12, 31)
+    edits = _edits(db, patient_id, target['action_timestamp'], upper_time, log_id, upper_log_id,
+                   descending=True)
+    for edit in edits:
+        _apply(state, _loads(edit['old_value']))
+    return state
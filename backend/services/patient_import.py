@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+from pydantic import ValidationError
+
+from models.schemas import PatientCreate
+from database.audit_writer import record_audit
+from services import patient_search
+
+IMPORT_COLUMNS = (
+    "patient_id", "hospital_id", "first_name", "last_name", "date_of_birth", "gender_id",
+    "address", "city", "phone_number", "email", "national_id_number",
+    "emergency_contact_name", "emergency_contact_phone",
+)
+INSERT_COLUMNS = IMPORT_COLUMNS + ("is_active", "created_by", "created_at", "updated_at")
+
+
+def iter_records(handle, fmt: str):
+    """Yield (line_number, raw dict) from a text handle without reading it all."""
+    if fmt == 'csv':
+        reader = csv.DictReader(handle)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError("Expected a JSON object")
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def validate(record) -> tuple:
+    """Turn a raw record into an INSERT row, raising ValueError/ValidationError."""
+    if isinstance(record, Exception):
+        raise record
+    # CSV has no nulls: blank cells mean "not provided"
+    cleaned = {key.strip(): (value.strip() if isinstance(value, str) else value)
+               for key, value in record.items() if key}
+    cleaned = {key: value for key, value in cleaned.items() if value not in ("", None)}
+    patient = PatientCreate(**cleaned)
+    patient_id = cleaned.get('patient_id')
+    data = patient.model_dump()
+    data['patient_id'] = int(patient_id) if patient_id is not None else None
+    return tuple(data[column] for column in IMPORT_COLUMNS)
+
+
+class PatientImporter:
+    """Streams records into patients in chunked multi-row INSERTs.
+
+    Each batch is one transaction. If the multi-row INSERT fails (a
+    duplicate id, say) the batch is retried row by row so only the bad rows
+    are rejected. Every batch writes one IMPORT audit entry.
+    """
+
+    def __init__(self, db, user_id: int, reject_handle=None, batch_size: int = 1000,
+                 source: str = None, ip_address: str = None, log=None):
+        self.db = db
+        self.user_id = user_id
+        self.reject_handle = reject_handle
+        self.batch_size = batch_size
+        self.source = source
+        self.ip_address = ip_address
+        self.log = log
+        self.stats = {"records": 0, "imported": 0, "rejected": 0, "batches": 0}
+
+    def reject(self, line_number: int, record, error):
+        self.stats["rejected"] += 1
+        if self.reject_handle is not None:
+            if isinstance(error, ValidationError):
+                message = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+            else:
+                message = str(error)
+            self.reject_handle.write(json.dumps({
+                "line": line_number,
+                "error": message,
+                "record": record if isinstance(record, dict) else None,
+            }, default=str) + "\n")
+
+    def run(self, handle, fmt: str) -> dict:
+        batch = []
+        for line_number, record in iter_records(handle, fmt):
+            self.stats["records"] += 1
+            try:
+                batch.append((line_number, record, validate(record)))
+            except (ValueError, TypeError, ValidationError) as e:
+                self.reject(line_number, record, e)
+                continue
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        return self.stats
+
+    def _insert(self, cursor, rows, created_at):
+        if not rows:
+            return None
+        row_sql = "(" + ", ".join(["%s"] * len(INSERT_COLUMNS)) + ")"
+        params = []
+        for row in rows:
+            params.extend(row + (1, self.user_id, created_at, created_at))
+        cursor.execute(
+            "INSERT INTO patients ({}) VALUES {}".format(", ".join(INSERT_COLUMNS), ", ".join([row_sql] * len(rows))),
+            tuple(params)
+        )
+        return cursor.lastrowid
+
+    def _index(self, cursor, inserted, first_auto_id, created_at):
+        """Refresh search tokens for the rows this batch inserted."""
+        patients = [dict(zip(IMPORT_COLUMNS, row)) for _, _, row in inserted if row[0] is not None]
+        if first_auto_id:
+            # Generated ids are not guaranteed to be consecutive, so read them
+            # back: they are the newest rows stamped with this batch
+            cursor.execute(
+                "SELECT patient_id, first_name, last_name, phone_number FROM patients "
+                "WHERE patient_id >= %s AND created_by = %s AND created_at = %s",
+                (first_auto_id, self.user_id, created_at)
+            )
+            columns = [column[0] for column in cursor.description]
+            patients.extend(dict(zip(columns, values)) for values in cursor.fetchall())
+        patient_search.index_patients(self.db, patients)
+
+    def write_batch(self, batch):
+        connection = self.db.connection
+        created_at = datetime.now().replace(microsecond=0)
+        cursor = connection.cursor()
+        inserted = []
+        try:
+            connection.start_transaction()
+            try:
+                # Explicit legacy ids and generated ids go in separate statements
+                self._insert(cursor, [row for _, _, row in batch if row[0] is not None], created_at)
+                first_auto_id = self._insert(cursor, [row for _, _, row in batch if row[0] is None], created_at)
+                inserted = batch
+            except Exception:
+                connection.rollback()
+                connection.start_transaction()
+                first_auto_id = None
+                for line_number, record, row in batch:
+                    try:
+                        row_id = self._insert(cursor, [row], created_at)
+                        if row[0] is None and not first_auto_id:
+                            first_auto_id = row_id
+                        inserted.append((line_number, record, row))
+                    except Exception as e:
+                        self.reject(line_number, record, e)
+            if inserted:
+                self._index(cursor, inserted, first_auto_id, created_at)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            for line_number, record, _ in inserted:
+                self.reject(line_number, record, "Batch rolled back")
+            inserted = []
+            raise
+        finally:
+            cursor.close()
+            self.stats["batches"] += 1
+            self.stats["imported"] += len(inserted)
+            record_audit(self.user_id, 'IMPORT', 'PATIENTS', 'patients', None,
+                         new_value={
+                             "source": self.source,
+                             "batch": self.stats["batches"],
+                             "first_line": batch[0][0],
+                             "last_line": batch[-1][0],
+                             "imported": len(inserted),
+                             "rejected": len(batch) - len(inserted),
+                         },
+                         ip_address=self.ip_address, is_success=bool(inserted))
+        if self.log:
+            self.log(f"Batch {self.stats['batches']}: {self.stats['imported']} imported, "
+                     f"{self.stats['rejected']} rejected so far")
+
+
+def import_file(db, path: str, fmt: str, user_id: int, reject_path: str = None, batch_size: int = 1000, log=print) -> dict:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as handle:
+        rejects = open(reject_path, 'w', encoding='utf-8') if reject_path else None
+        try:
+            importer = PatientImporter(db, user_id, rejects, batch_size, source=path, log=log)
+            return importer.run(handle, fmt)
+        finally:
+            if rejects:
+                rejects.close()
+
+
+def import_upload(binary_handle, fmt: str, user_id: int, reject_path: str, batch_size: int = 1000,
+                  source: str = None, ip_address: str = None) -> dict:
+    """Import a spooled upload on a pooled connection; used by the HTTP endpoint."""
+    from database.connection import DatabaseConnection
+    db = DatabaseConnection()
+    if not db.connect():
+        raise RuntimeError("Database connection failed")
+    try:
+        handle = io.TextIOWrapper(binary_handle, encoding='utf-8-sig', newline='')
+        with open(reject_path, 'w', encoding='utf-8') as rejects:
+            importer = PatientImporter(db, user_id, rejects, batch_size, source=source, ip_address=ip_address)
+            return importer.run(handle, fmt)
+    finally:
+        db.disconnect()
+
+
+def purge_rejects(directory: str, max_age_seconds: float) -> int:
+    """Delete reject files older than max_age_seconds; they hold patient data."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if name.endswith(".rejects.ndjson") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # purged concurrently by another request
+    return removed
@@ -0,0 +1,278 @@
+import re
+import unicodedata
+from typing import Optional
+
+from models.schemas import PATIENT_COLUMNS, select_list
+from services.pagination import encode_cursor, decode_cursor
+from services import name_matching
+from services.reference_data import enrich_patients
+
+MAX_TOKEN_LENGTH = 64
+MIN_PREFIX_LENGTH = 2  # shorter terms only match whole tokens
+INSERT_CHUNK = 1000
+MAX_FUZZY_CANDIDATES = 50  # closest dictionary tokens kept per query term
+
+
+def fold(text: Optional[str]) -> str:
+    """Lowercase and strip accents so 'Kipchogé' and 'kipchoge' index alike."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def name_tokens(*names) -> list:
+    tokens = []
+    for name in names:
+        for token in re.findall(r'[a-z0-9]+', fold(name)):
+            token = token[:MAX_TOKEN_LENGTH]
+            if token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def phone_digits(phone: Optional[str]) -> str:
+    """Digits of the national number: '+254-722-123456' and '0722123456' both give '722123456'."""
+    digits = re.sub(r'\D', '', phone or "")
+    if digits.startswith('254') and len(digits) > 9:
+        digits = digits[3:]
+    elif digits.startswith('0'):
+        digits = digits[1:]
+    return digits[:MAX_TOKEN_LENGTH]
+
+
+def patient_tokens(patient: dict) -> list:
+    tokens = [('name', token) for token in name_tokens(patient.get('first_name'), patient.get('last_name'))]
+    digits = phone_digits(patient.get('phone_number'))
+    if digits:
+        tokens.append(('phone', digits))
+        tokens.append(('phone_rev', digits[::-1]))
+    return tokens
+
+
+def _insert_tokens(cursor, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        params = []
+        for row in chunk:
+            params.extend(row)
+        cursor.execute(
+            "INSERT IGNORE INTO patient_search_tokens (kind, token, patient_id) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk)),
+            tuple(params)
+        )
+
+
+def _insert_variants(cursor, tokens):
+    rows = [(kind, variant, token) for token in set(tokens) for kind, variant in name_matching.token_variants(token)]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        params = []
+        for row in chunk:
+            params.extend(row)
+        cursor.execute(
+            "INSERT IGNORE INTO name_token_variants (kind, variant, token) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk)),
+            tuple(params)
+        )
+
+
+def index_patients(db, patients):
+    """Replace the search tokens of each patient dict (needs patient_id, names and phone)."""
+    if not patients:
+        return
+    ids = [patient['patient_id'] for patient in patients]
+    rows = [(kind, token, patient['patient_id']) for patient in patients for kind, token in patient_tokens(patient)]
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute(
+            "DELETE FROM patient_search_tokens WHERE patient_id IN ({})".format(", ".join(["%s"] * len(ids))),
+            tuple(ids)
+        )
+        _insert_tokens(cursor, rows)
+        _insert_variants(cursor, [token for kind, token, _ in rows if kind == 'name'])
+    finally:
+        cursor.close()
+
+
+def index_patient(db, patient: dict):
+    index_patients(db, [patient])
+
+
+def _name_matches(query: str):
+    parts, params = [], []
+    terms = name_tokens(query)
+    for term in terms:
+        if len(term) >= MIN_PREFIX_LENGTH:
+            parts.append("""
+            SELECT patient_id, MAX(token = %s) + 1 AS score
+            FROM patient_search_tokens
+            WHERE kind = 'name' AND token LIKE %s
+            GROUP BY patient_id""")
+            params.extend([term, term + '%'])
+        else:
+            parts.append("""
+            SELECT patient_id, 2 AS score
+            FROM patient_search_tokens
+            WHERE kind = 'name' AND token = %s""")
+            params.append(term)
+    if not parts:
+        return None, None
+    # Every term has to match one of the patient's name tokens
+    query = """
+    SELECT patient_id, SUM(score) AS score
+    FROM ({}) term_matches
+    GROUP BY patient_id
+    HAVING COUNT(*) = %s
+    """.format(" UNION ALL ".join(parts))
+    params.append(len(parts))
+    return query, params
+
+
+def _phone_matches(query: str):
+    digits = phone_digits(query)
+    if not digits:
+        return None, None
+    query = """
+    SELECT patient_id, MAX(score) AS score
+    FROM (
+        SELECT patient_id, IF(token = %s, 3, 2) AS score
+        FROM patient_search_tokens
+        WHERE kind = 'phone' AND token LIKE %s
+        UNION ALL
+        SELECT patient_id, 1 AS score
+        FROM patient_search_tokens
+        WHERE kind = 'phone_rev' AND token LIKE %s
+    ) phone_matches
+    GROUP BY patient_id
+    """
+    return query, [digits, digits + '%', digits[::-1] + '%']
+
+
+def _fuzzy_candidates(db, term: str) -> dict:
+    """Dictionary tokens within edit distance of term, mapped to their 0-100 score."""
+    limit = name_matching.max_distance(term)
+    if limit == 0:
+        return {term: 100}
+    keys = sorted(name_matching.deletes(term))
+    rows = db.execute_query(
+        """
+        SELECT token FROM name_token_variants WHERE kind = 'delete' AND variant IN ({})
+        UNION
+        SELECT token FROM name_token_variants WHERE kind = 'phonetic' AND variant = %s
+        """.format(", ".join(["%s"] * len(keys))),
+        tuple(keys) + (name_matching.phonetic_key(term),)
+    ) or []
+    term_key = name_matching.phonetic_key(term)
+    candidates = {}
+    for row in rows:
+        token = row['token']
+        # Tokens that sound alike get one extra edit of slack
+        slack = limit + 1 if name_matching.phonetic_key(token) == term_key else limit
+        distance = name_matching.edit_distance(term, token, slack)
+        if distance <= slack:
+            candidates[token] = name_matching.score(term, token, distance)
+    best = sorted(candidates.items(), key=lambda item: (-item[1], item[0]))[:MAX_FUZZY_CANDIDATES]
+    return dict(best)
+
+
+def _fuzzy_matches(db, query: str):
+    parts, params = [], []
+    for term in name_tokens(query):
+        candidates = _fuzzy_candidates(db, term)
+        if not candidates:
+            return None, None
+        tokens = list(candidates)
+        parts.append("""
+            SELECT patient_id, MAX(CASE token {cases} END) AS score
+            FROM patient_search_tokens
+            WHERE kind = 'name' AND token IN ({tokens})
+            GROUP BY patient_id""".format(
+            cases=" ".join(["WHEN %s THEN %s"] * len(tokens)),
+            tokens=", ".join(["%s"] * len(tokens)),
+        ))
+        for token in tokens:
+            params.extend([token, candidates[token]])
+        params.extend(tokens)
+    if not parts:
+        return None, None
+    query = """
+    SELECT patient_id, SUM(score) AS score
+    FROM ({}) term_matches
+    GROUP BY patient_id
+    HAVING COUNT(*) = %s
+    """.format(" UNION ALL ".join(parts))
+    params.append(len(parts))
+    return query, params
+
+
+def search(db, query: str, search_type: str, limit: int, cursor: Optional[str] = None):
+    """Ranked index search for 'name', 'phone' and 'fuzzy'. Returns (rows, next_cursor)."""
+    if search_type == 'phone':
+        matches, params = _phone_matches(query)
+    elif search_type == 'fuzzy':
+        matches, params = _fuzzy_matches(db, query)
+    else:
+        matches, params = _name_matches(query)
+    if matches is None:
+        return [], None
+
+    sql = """
+    SELECT {columns}, m.score AS search_score
+    FROM ({matches}) m
+    JOIN patients p ON p.patient_id = m.patient_id
+    WHERE p.is_active = 1
+    """.format(columns=select_list('p', PATIENT_COLUMNS), matches=matches)
+
+    after = decode_cursor(cursor, 2)
+    if after:
+        sql += " AND (m.score < %s OR (m.score = %s AND p.patient_id > %s))"
+        params.extend([after[0], after[0], after[1]])
+
+    sql += " ORDER BY m.score DESC, p.patient_id ASC LIMIT %s"
+    params.append(limit + 1)
+
+    rows = db.execute_query(sql, tuple(params)) or []
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(int(last['search_score']), last['patient_id'])
+    return enrich_patients(db, rows), next_cursor
+
+
+def rebuild_index(db, chunk_size: int = 5000, log=print) -> int:
+    """Re-tokenize every patient in patient_id order without taking search offline."""
+    last_id = 0
+    total = 0
+    cursor = db.connection.cursor()
+    try:
+        while True:
+            patients = db.execute_query(
+                "SELECT patient_id, first_name, last_name, phone_number FROM patients "
+                "WHERE patient_id > %s ORDER BY patient_id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            if patients is None:
+                raise RuntimeError("Could not read patients for the search index rebuild")
+            if not patients:
+                break
+            high_id = patients[-1]['patient_id']
+            # Range delete also clears tokens of patients removed since the last build
+            cursor.execute(
+                "DELETE FROM patient_search_tokens WHERE patient_id > %s AND patient_id <= %s",
+                (last_id, high_id)
+            )
+            rows = [
+                (kind, token, patient['patient_id'])
+                for patient in patients for kind, token in patient_tokens(patient)
+            ]
+            _insert_tokens(cursor, rows)
+            _insert_variants(cursor, [token for kind, token, _ in rows if kind == 'name'])
+            total += len(patients)
+            last_id = high_id
+            log(f"Indexed {total} patients (up to patient_id {last_id})")
+        cursor.execute("DELETE FROM patient_search_tokens WHERE patient_id > %s", (last_id,))
+    finally:
+        cursor.close()
+    return total
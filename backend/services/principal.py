@@ -0,0 +1,188 @@
+import hashlib
+import os
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jwt import decode, ExpiredSignatureError, PyJWTError
+
+from database.connection import DatabaseConnection
+from services.cache import get_cache, dumps, loads
+from services.reference_data import reference_data
+
+SECRET_KEY = os.getenv("SECRET_KEY", "fallback-key-for-dev")
+ALGORITHM = "HS256"
+# A cached principal is reused for at most this long (and never past the
+# token's expiry), so role changes and deactivations apply within a minute
+AUTH_CACHE_TTL_SECONDS = float(os.getenv('AUTH_CACHE_TTL_SECONDS', '60'))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000'))
+# Revocations are kept in the revoked_tokens table, which is authoritative;
+# this cache only saves a query on tokens that were cached before logout
+AUTH_REVOKED_MAX_ENTRIES = int(os.getenv('AUTH_REVOKED_MAX_ENTRIES', '100000'))
+
+security = HTTPBearer()
+
+
+class TokenRevoked(Exception):
+    """The token was logged out."""
+
+
+class Principal:
+    """The authenticated caller: user, roles and hospital, resolved once per token."""
+
+    def __init__(self, user_id: int, username: str, hospital_id: Optional[int],
+                 department_id: Optional[int], roles, expires_at: float):
+        self.user_id = user_id
+        self.username = username
+        self.hospital_id = hospital_id
+        self.department_id = department_id
+        self.roles = tuple(roles)
+        self.expires_at = expires_at
+
+    def has_role(self, *roles) -> bool:
+        return any(role in self.roles for role in roles)
+
+    def to_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "username": self.username,
+            "hospital_id": self.hospital_id,
+            "department_id": self.department_id,
+            "roles": list(self.roles),
+            "expires_at": self.expires_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Principal":
+        return cls(**data)
+
+
+def token_hash(token: str) -> str:
+    # Only digests are kept, so a cache dump never contains usable tokens
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _principals():
+    return get_cache('principal', AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def _revoked():
+    return get_cache('revoked_token', AUTH_REVOKED_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def load_principal(user_id: int, expires_at: float, db=None, token_key: str = None) -> Optional[Principal]:
+    """Read an active user and their role names; None if the user is gone or inactive.
+
+    With a token_key, raises TokenRevoked if that token was logged out.
+    """
+    owned = db is None
+    if owned:
+        db = DatabaseConnection()
+        if not db.connect():
+            raise RuntimeError("Database connection failed")
+    try:
+        if token_key is not None:
+            revoked = db.execute_query("SELECT 1 FROM revoked_tokens WHERE token_hash = %s", (token_key,))
+            if revoked is None:
+                raise RuntimeError("Could not read revoked tokens")
+            if revoked:
+                raise TokenRevoked()
+        users = db.execute_query(
+            "SELECT user_id, username, hospital_id, department_id FROM users WHERE user_id = %s AND is_active = 1",
+            (user_id,)
+        )
+        role_rows = db.execute_query("SELECT role_id FROM user_roles WHERE user_id = %s", (user_id,))
+        if users is None or role_rows is None:
+            raise RuntimeError("Could not read user roles")
+        if not users:
+            return None
+        role_ids = [row['role_id'] for row in role_rows]
+        roles = reference_data.get_covering(db, role_ids=role_ids).role_names(role_ids)
+    finally:
+        if owned:
+            db.disconnect()
+    user = users[0]
+    return Principal(user['user_id'], user['username'], user['hospital_id'], user['department_id'], roles, expires_at)
+
+
+def remember(token: str, principal: Principal):
+    """Cache a principal for its token, e.g. straight after login."""
+    key = token_hash(token)
+    ttl = min(AUTH_CACHE_TTL_SECONDS, principal.expires_at - time.time())
+    if ttl <= 0:
+        return
+    _principals().set(f"principal:{key}", dumps(principal.to_dict()), ttl=ttl)
+    # A logout that raced this request must win
+    if _revoked().get(f"revoked:{key}", track=False) is not None:
+        _principals().delete(f"principal:{key}")
+
+
+def resolve(token: str, loader=load_principal) -> Principal:
+    """Principal for a bearer token, from the cache or by decoding it and reading the user."""
+    key = token_hash(token)
+    if _revoked().get(f"revoked:{key}", track=False) is not None:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    # revoke() deletes the entry, so a cached principal was not logged out
+    # when it was cached; the check above covers the logout racing it
+    payload = _principals().get(f"principal:{key}")
+    if payload is not None:
+        principal = Principal.from_dict(loads(payload))
+        if principal.expires_at > time.time():
+            return principal
+
+    try:
+        claims = decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = int(claims["sub"])
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except (PyJWTError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    expires_at = float(claims.get("exp") or time.time() + AUTH_CACHE_TTL_SECONDS)
+
+    try:
+        principal = loader(user_id, expires_at, token_key=key)
+    except TokenRevoked:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    except Exception:
+        # Not a 401: the client would discard a perfectly good token
+        raise HTTPException(status_code=503, detail="Token validation failed")
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    remember(token, principal)
+    return principal
+
+
+def revoke(token: str, expires_at: float, db):
+    """Make a token unusable right away (logout) until it would have expired anyway.
+
+    The row in revoked_tokens is what every worker checks before trusting
+    the token again; the cache entries make that immediate for workers
+    sharing the cache. Raises if the row cannot be written.
+    """
+    key = token_hash(token)
+    cursor = db.connection.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO revoked_tokens (token_hash, expires_at, revoked_at) VALUES (%s, FROM_UNIXTIME(%s), NOW()) "
+            "ON DUPLICATE KEY UPDATE expires_at = VALUES(expires_at)",
+            (key, int(expires_at) + 1)
+        )
+        # Rows past their token's expiry protect nothing any more
+        cursor.execute("DELETE FROM revoked_tokens WHERE expires_at < NOW() LIMIT 1000")
+    finally:
+        cursor.close()
+    _revoked().set(f"revoked:{key}", "1", ttl=max(1, expires_at - time.time()))
+    _principals().delete(f"principal:{key}")
+
+
+def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    # FastAPI caches dependencies per request, so routers and handlers that
+    # both depend on this resolve the token once
+    principal = resolve(credentials.credentials)
+    request.state.principal = principal
+    return principal
+
+
+def current_user_id(principal: Principal = Depends(verify_token)) -> int:
+    return principal.user_id
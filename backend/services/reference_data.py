@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from database.connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_REFRESH_SECONDS = float(os.getenv('REFERENCE_REFRESH_SECONDS', '300'))
+# Unknown ids trigger a reload at most this often, so a dangling
+# gender_id cannot turn every request into a reload
+REFERENCE_MISS_RELOAD_SECONDS = 5
+
+
+class ReferenceSnapshot:
+    """Immutable copy of the lookup tables. Requests hold one snapshot for
+    their whole lifetime so every row in a response uses the same version."""
+
+    def __init__(self, version: int, enum_values: dict, hospitals: dict, roles: dict, digest: str):
+        self.version = version
+        self.enum_values = enum_values
+        self.hospitals = hospitals
+        self.roles = roles
+        self.digest = digest
+        self.loaded_at = time.time()
+
+    def enrich_patient(self, row: dict) -> dict:
+        """Fill in the names the patient queries used to JOIN for."""
+        row['gender'] = self.enum_values.get(row.get('gender_id'))
+        row['hospital_name'] = self.hospitals.get(row.get('hospital_id'))
+        return row
+
+    def role_names(self, role_ids) -> list:
+        return [self.roles[role_id] for role_id in role_ids if role_id in self.roles]
+
+    def covers(self, gender_ids=(), hospital_ids=(), role_ids=()) -> bool:
+        return (all(i is None or i in self.enum_values for i in gender_ids)
+                and all(i is None or i in self.hospitals for i in hospital_ids)
+                and all(i in self.roles for i in role_ids))
+
+
+EMPTY = ReferenceSnapshot(0, {}, {}, {}, "")
+
+
+class ReferenceDataCache:
+    def __init__(self, refresh_seconds: float = REFERENCE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot = EMPTY
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self) -> ReferenceSnapshot:
+        return self._snapshot
+
+    def load(self, db=None) -> ReferenceSnapshot:
+        """Reload all lookup tables; the version only moves when their content changes."""
+        owned = db is None
+        if owned:
+            db = DatabaseConnection()
+            if not db.connect():
+                raise RuntimeError("Database connection failed")
+        try:
+            enum_rows = db.execute_query("SELECT lookup_id, value FROM enum_lookups")
+            hospital_rows = db.execute_query("SELECT hospital_id, name FROM hospitals")
+            role_rows = db.execute_query("SELECT role_id, role_name FROM roles")
+        finally:
+            if owned:
+                db.disconnect()
+        if enum_rows is None or hospital_rows is None or role_rows is None:
+            raise RuntimeError("Could not read reference tables")
+
+        enum_values = {row['lookup_id']: row['value'] for row in enum_rows}
+        hospitals = {row['hospital_id']: row['name'] for row in hospital_rows}
+        roles = {row['role_id']: row['role_name'] for row in role_rows}
+        digest = hashlib.sha256(json.dumps(
+            [sorted(enum_values.items()), sorted(hospitals.items()), sorted(roles.items())], default=str
+        ).encode('utf-8')).hexdigest()
+
+        with self._lock:
+            current = self._snapshot
+            if digest != current.digest:
+                self._snapshot = ReferenceSnapshot(current.version + 1, enum_values, hospitals, roles, digest)
+            else:
+                current.loaded_at = time.time()
+            return self._snapshot
+
+    def get(self, db=None) -> ReferenceSnapshot:
+        snapshot = self._snapshot
+        if snapshot is EMPTY:
+            snapshot = self.load(db)
+        return snapshot
+
+    def get_covering(self, db, gender_ids=(), hospital_ids=(), role_ids=()) -> ReferenceSnapshot:
+        """Snapshot that knows every given id, reloading once if a new row appeared."""
+        snapshot = self.get(db)
+        if (not snapshot.covers(gender_ids, hospital_ids, role_ids)
+                and time.time() - snapshot.loaded_at > REFERENCE_MISS_RELOAD_SECONDS):
+            snapshot = self.load(db)
+        return snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.load()
+            except Exception as e:
+                logger.exception('Reference data refresh failed: %s', e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reference-data", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at if snapshot is not EMPTY else None,
+            "enum_lookups": len(snapshot.enum_values),
+            "hospitals": len(snapshot.hospitals),
+            "roles": len(snapshot.roles),
+        }
+
+
+reference_data = ReferenceDataCache()
+
+
+def patient_snapshot(db, rows) -> ReferenceSnapshot:
+    return reference_data.get_covering(
+        db,
+        gender_ids={row.get('gender_id') for row in rows},
+        hospital_ids={row.get('hospital_id') for row in rows},
+    )
+
+
+def enrich_patients(db, rows):
+    """Attach gender and hospital_name to patient rows from one snapshot."""
+    if not rows:
+        return rows
+    snapshot = patient_snapshot(db, rows)
+    for row in rows:
+        snapshot.enrich_patient(row)
+    return rows
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+import time
+
+from anyio import to_thread
+
+# A warm-up step that fails (the database not accepting connections yet,
+# say) is retried this often until it succeeds
+WARMUP_RETRY_SECONDS = float(os.getenv('WARMUP_RETRY_SECONDS', '5'))
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Start-up work done once the server is listening instead of before.
+
+    `start` is the async setup requests depend on (importing the routers);
+    it runs once, from the warm-up task or from the first request under one
+    of `prefixes`, whichever comes first. `steps` maps names to blocking
+    callables (pool and cache warm-up) that run on the thread pool and are
+    retried until each has succeeded once. The instance is ready when both
+    are done, and stops being ready when shutdown begins.
+    """
+
+    def __init__(self, start, steps: dict, prefixes=()):
+        self._start = start
+        self.steps = dict(steps)
+        self.prefixes = tuple(prefixes)
+        self.started = False
+        self.stopping = False
+        self._starting = None
+        self._checks = {"start": "pending", **{name: "pending" for name in self.steps}}
+        self._task = None
+        self._created = time.monotonic()
+        self._ready_after = None
+
+    async def _start_once(self):
+        await self._start()
+        self.started = True
+        self._checks["start"] = "ok"
+
+    async def ensure_started(self):
+        if self.started:
+            return
+        if self._starting is None or (self._starting.done() and self._starting.exception() is not None):
+            self._starting = asyncio.ensure_future(self._start_once())
+        # Shielded: a caller that goes away (a disconnected request, the
+        # warm-up task being cancelled) must not abandon a half-done start
+        await asyncio.shield(self._starting)
+
+    async def _run(self):
+        pending = ["start", *self.steps]
+        while True:
+            for name in list(pending):
+                try:
+                    if name == "start":
+                        await self.ensure_started()
+                    else:
+                        await to_thread.run_sync(self.steps[name])
+                except Exception as e:
+                    failure = f"failed: {e}"
+                    if self._checks[name] != failure:
+                        # Once per distinct error, not on every retry
+                        logger.warning("Warm-up step %s failed: %s", name, e)
+                    self._checks[name] = failure
+                    if name == "start":
+                        break
+                else:
+                    self._checks[name] = "ok"
+                    pending.remove(name)
+            if not pending:
+                break
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+        self._ready_after = time.monotonic() - self._created
+        logger.info("Ready %.2fs after import", self._ready_after)
+
+    def begin(self):
+        """Schedule the warm-up; called from the startup event, so it runs once uvicorn binds."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self.stopping = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._starting is not None and not self._starting.done():
+            # Let it finish so shutdown can stop what it started
+            await asyncio.wait([self._starting])
+
+    @property
+    def ready(self) -> bool:
+        return self._ready_after is not None and not self.stopping
+
+    def status(self) -> dict:
+        return {
+            "status": "stopping" if self.stopping else "ready" if self.ready else "starting",
+            "checks": dict(self._checks),
+            "ready_after_seconds": round(self._ready_after, 3) if self._ready_after is not None else None,
+        }
+
+
+class WarmupMiddleware:
+    """Holds requests under the warm-up's prefixes until its start has run,
+    so a request that beats the warm-up task gets the route, not a 404."""
+
+    def __init__(self, app, warmup: Warmup):
+        self.app = app
+        self.warmup = warmup
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] in ("http", "websocket") and not self.warmup.started
+                and scope["path"].startswith(self.warmup.prefixes)):
+            await self.warmup.ensure_started()
+        await self.app(scope, receive, send)
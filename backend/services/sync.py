@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from mysql.connector import Error
+from pydantic import ValidationError
+
+from models.schemas import PatientEncounter, PATIENT_UPDATE_FIELDS, PATIENT_COLUMNS, ENCOUNTER_COLUMNS, select_list
+from services.pagination import encode_cursor, decode_cursor
+from services.reference_data import enrich_patients
+from services import patient_search, patient_history
+from services.encounters import upsert_records, UnknownPatient
+from database.audit_writer import audit_row, insert_rows
+
+SYNC_PULL_MAX = 1000
+# A missing version in the change log is a write that is still in flight or
+# one that rolled back. Pulls stop at it until a version taken after it is
+# this old. After that the writer is presumed gone, so a transaction that
+# keeps a version uncommitted for longer may be missed by clients.
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', '60'))
+# Change log entries read per pull to find the safe version
+SYNC_SCAN_MAX = 5000
+# Change log rows older than this are purged (the newest row always stays)
+SYNC_CHANGES_RETENTION_HOURS = float(os.getenv('SYNC_CHANGES_RETENTION_HOURS', '24'))
+SYNC_PURGE_INTERVAL = 3600
+
+PATIENT_CHANGES_QUERY = """
+    SELECT {columns}
+    FROM patients p
+    WHERE p.row_version > %s AND p.row_version <= %s {hospital}
+    ORDER BY p.row_version
+    LIMIT %s
+    """
+
+ENCOUNTER_CHANGES_QUERY = """
+    SELECT {columns}
+    FROM patient_encounters pe
+    {join}
+    WHERE pe.row_version > %s AND pe.row_version <= %s {hospital}
+    ORDER BY pe.row_version
+    LIMIT %s
+    """
+
+
+class SyncItemError(Exception):
+    """A mutation the server cannot apply; reported per item, not per push."""
+
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def safe_version(db, after: int):
+    """(version, more): the highest version at or past `after` below which
+    every write has committed or rolled back, and whether the log goes on.
+
+    Versions are taken in order but may commit out of order. A gap in the
+    change log is therefore a write that has not committed yet, unless a
+    version after it was taken more than SYNC_SETTLE_SECONDS ago.
+    """
+    rows = db.execute_query(
+        "SELECT version, changed_at < SYSDATE(6) - INTERVAL %s SECOND AS settled FROM sync_changes "
+        "WHERE version > %s ORDER BY version LIMIT %s",
+        (SYNC_SETTLE_SECONDS, after, SYNC_SCAN_MAX)
+    )
+    if rows is None:
+        raise RuntimeError("Could not read the change log")
+    safe = after
+    for row in rows:
+        if row['version'] != safe + 1 and not row['settled']:
+            return safe, False
+        safe = row['version']
+    return safe, len(rows) == SYNC_SCAN_MAX
+
+
+def purge_change_log(db):
+    """Drop old change log rows, at most once per SYNC_PURGE_INTERVAL per process.
+
+    The newest row is kept so safe_version() still finds the current version.
+    """
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < SYNC_PURGE_INTERVAL:
+            return
+        _last_purge = time.monotonic()
+    newest = db.execute_query("SELECT MAX(version) AS version FROM sync_changes")
+    if newest and newest[0]['version']:
+        db.execute_insert(
+            "DELETE FROM sync_changes WHERE version < %s AND changed_at < NOW(6) - INTERVAL %s HOUR LIMIT 10000",
+            (newest[0]['version'], SYNC_CHANGES_RETENTION_HOURS)
+        )
+
+
+def changes(db, since: Optional[str], limit: int, hospital_id: Optional[int] = None) -> dict:
+    """Rows of patients and patient_encounters written after the `since` token.
+
+    Both tables take versions from one change log, so a single token covers
+    both. The oldest `limit` changes across them are returned in version
+    order, up to safe_version() so a late commit is never skipped.
+    Deactivated patients are included (is_active = 0) so clients can drop them.
+    """
+    after = decode_cursor(since, 1)
+    version = int(after[0]) if after else 0
+    safe, more = safe_version(db, version)
+    hospital_params = (hospital_id,) if hospital_id is not None else ()
+
+    patients = db.execute_query(
+        PATIENT_CHANGES_QUERY.format(columns=select_list('p', PATIENT_COLUMNS),
+                                     hospital="AND p.hospital_id = %s" if hospital_id is not None else ""),
+        (version, safe) + hospital_params + (limit + 1,)
+    )
+    encounters = db.execute_query(
+        ENCOUNTER_CHANGES_QUERY.format(
+            columns=select_list('pe', ENCOUNTER_COLUMNS),
+            join="JOIN patients p ON p.patient_id = pe.patient_id" if hospital_id is not None else "",
+            hospital="AND p.hospital_id = %s" if hospital_id is not None else "",
+        ),
+        (version, safe) + hospital_params + (limit + 1,)
+    )
+    if patients is None or encounters is None:
+        raise RuntimeError("Could not read the change feed")
+
+    merged = sorted(
+        [('patients', row) for row in patients] + [('patient_encounters', row) for row in encounters],
+        key=lambda item: item[1]['row_version']
+    )
+    if len(merged) > limit:
+        merged = merged[:limit]
+        version, more = merged[-1][1]['row_version'], True
+    else:
+        # Everything up to the safe version was returned or belongs to
+        # another hospital
+        version = safe
+
+    result = {"patients": [], "patient_encounters": []}
+    for table, row in merged:
+        result[table].append(row)
+    enrich_patients(db, result["patients"])
+    purge_change_log(db)
+    return {
+        "changes": result,
+        "next_token": encode_cursor(version),
+        "has_more": more,
+    }
+
+
+def _fetch_one(cursor, query: str, params: tuple) -> Optional[dict]:
+    cursor.execute(query, params)
+    return cursor.fetchone()
+
+
+def _update_patient(db, cursor, mutation, user_id: int, ip_address: str = None):
+    data = mutation.data
+    try:
+        patient_id = int(data['patient_id'])
+    except (KeyError, TypeError, ValueError):
+        raise SyncItemError("patient_id is required")
+
+    current = _fetch_one(
+        cursor, "SELECT {} FROM patients p WHERE p.patient_id = %s FOR UPDATE".format(select_list('p', PATIENT_COLUMNS)),
+        (patient_id,)
+    )
+    if current is None:
+        return {"status": "not_found", "patient_id": patient_id}
+    if mutation.base_version is not None and mutation.base_version != current['row_version']:
+        return {"status": "conflict", "patient_id": patient_id, "row_version": current['row_version'],
+                "current": enrich_patients(db, [current])[0]}
+
+    old_values, changed = patient_history.diff(
+        current, {field: data[field] for field in PATIENT_UPDATE_FIELDS if field in data})
+    if not changed:
+        return {"status": "unchanged", "patient_id": patient_id, "row_version": current['row_version']}
+
+    cursor.execute(
+        "UPDATE patients SET {}, updated_by = %s, updated_at = NOW() WHERE patient_id = %s".format(
+            ", ".join(f"{field} = %s" for field in changed)
+        ),
+        tuple(changed.values()) + (user_id, patient_id)
+    )
+    if any(field in changed for field in ('first_name', 'last_name', 'phone_number')):
+        patient_search.index_patient(db, {**current, **changed})
+    row = _fetch_one(cursor, "SELECT row_version FROM patients WHERE patient_id = %s", (patient_id,))
+    # Audited inside the savepoint so the diff chain has no gaps or reorderings
+    patient_history.record_update(db.connection, patient_id, current, old_values, changed, user_id,
+                                  module='SYNC', ip_address=ip_address)
+    return {"status": "applied", "patient_id": patient_id, "row_version": row['row_version']}
+
+
+def _create_encounter(db, cursor, mutation, user_id: int, ip_address: str = None):
+    existing = _fetch_one(
+        cursor, "SELECT encounter_id, row_version FROM patient_encounters WHERE client_ref = %s",
+        (mutation.client_id,)
+    )
+    if existing is not None:
+        # Already applied by an earlier push whose response never arrived
+        return {"status": "duplicate", **existing}
+
+    try:
+        encounter = PatientEncounter(**mutation.data)
+    except ValidationError as e:
+        raise SyncItemError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+
+    try:
+        record_id = upsert_records(db.connection, [encounter.patient_id], user_id)[encounter.patient_id]
+    except UnknownPatient as e:
+        raise SyncItemError(str(e))
+
+    cursor.execute(
+        """
+        INSERT INTO patient_encounters (record_id, patient_id, doctor_id, chief_complaint,
+                                       diagnosis_description, treatment_plan, notes,
+                                       encounter_date_time, client_ref, created_by, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
+        """,
+        (record_id, encounter.patient_id, encounter.doctor_id, encounter.chief_complaint,
+         encounter.diagnosis_description, encounter.treatment_plan, encounter.notes,
+         encounter.encounter_date_time, mutation.client_id, user_id)
+    )
+    encounter_id = cursor.lastrowid
+    row = _fetch_one(cursor, "SELECT row_version FROM patient_encounters WHERE encounter_id = %s", (encounter_id,))
+    # Audited inside the savepoint, as create_encounters does, so the entry
+    # commits or rolls back with the encounter
+    audit_cursor = db.connection.cursor()
+    try:
+        insert_rows(audit_cursor, [audit_row(user_id, 'CREATE', 'SYNC', 'patient_encounters', encounter_id,
+                                             new_value=encounter.model_dump(), ip_address=ip_address)])
+    finally:
+        audit_cursor.close()
+    return {"status": "applied", "encounter_id": encounter_id, "row_version": row['row_version']}
+
+
+HANDLERS = {
+    ('patients', 'update'): _update_patient,
+    ('patient_encounters', 'create'): _create_encounter,
+}
+
+
+def push(db, mutations, user_id: int, ip_address: str = None):
+    """Apply queued client mutations in one transaction.
+
+    Each mutation runs under its own savepoint, so a rejected item is rolled
+    back on its own and reported while the rest still commit. Every applied
+    mutation is audited in the same transaction. Returns the results in
+    request order.
+    """
+    connection = db.connection
+    cursor = connection.cursor(dictionary=True)
+    results = []
+    try:
+        connection.start_transaction()
+        for mutation in mutations:
+            handler = HANDLERS.get((mutation.table, mutation.action))
+            if handler is None:
+                results.append({"client_id": mutation.client_id, "status": "error",
+                                "error": f"Unsupported mutation {mutation.table}/{mutation.action}"})
+                continue
+            cursor.execute("SAVEPOINT sync_item")
+            try:
+                result = handler(db, cursor, mutation, user_id, ip_address)
+                cursor.execute("RELEASE SAVEPOINT sync_item")
+            except (SyncItemError, Error) as e:
+                # Fails in turn if the server already rolled everything
+                # back (deadlock), which aborts the whole push
+                cursor.execute("ROLLBACK TO SAVEPOINT sync_item")
+                message = str(e) if isinstance(e, SyncItemError) else f"Rejected by the database ({e.errno})"
+                result = {"status": "error", "error": message}
+            results.append({"client_id": mutation.client_id, **result})
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return results
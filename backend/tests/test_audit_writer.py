@@ -0,0 +1,52 @@
+from database import audit_writer
+from database.audit_writer import AuditWriter, _outstanding_rows
+
+
+def replay(writer):
+    with open(writer.spill_path, encoding='utf-8') as handle:
+        return _outstanding_rows(handle)
+
+
+def test_rows_journaled_after_truncation_are_replayed(tmp_path):
+    writer = AuditWriter(spill_dir=str(tmp_path))
+    writer._open_journal()
+    [(seq, _)] = writer._journal_rows([["first"]])
+    writer._mark_written([seq])
+    writer._journal_rows([["second"]])
+    assert replay(writer) == [["second"]]
+
+
+def test_compaction_keeps_only_outstanding_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_writer, 'AUDIT_JOURNAL_COMPACT_BYTES', 1)
+    writer = AuditWriter(spill_dir=str(tmp_path))
+    writer._open_journal()
+    entries = writer._journal_rows([["a"], ["b"], ["c"]])
+    writer._mark_written([entries[0][0]])
+    with open(writer.spill_path, encoding='utf-8') as handle:
+        assert sum(1 for _ in handle) == 2
+    writer._journal_rows([["d"]])
+    writer._mark_written([entries[1][0]])
+    assert replay(writer) == [["c"], ["d"]]
+
+
+def test_orphaned_rows_are_moved_before_the_orphan_is_deleted(tmp_path):
+    orphan = tmp_path / "audit-spill-999999.ndjson"
+    orphan.write_text('{"seq":1,"row":["kept"]}\n{"seq":2,"row":["written"]}\n{"done":[2]}\n')
+    writer = AuditWriter(spill_dir=str(tmp_path))
+    writer._open_journal()
+    entries = writer._collect_orphans()
+    assert [row for _, row in entries] == [["kept"]]
+    assert not orphan.exists()
+    assert replay(writer) == [["kept"]]
+
+
+class FailingPool:
+    def acquire(self):
+        raise RuntimeError("database unavailable")
+
+
+def test_failed_synchronous_write_is_journaled(tmp_path):
+    writer = AuditWriter(pool_factory=FailingPool, spill_dir=str(tmp_path))
+    writer.submit(1, 'LOGIN', 'AUTH')
+    [row] = replay(writer)
+    assert row[:3] == [1, 'LOGIN', 'AUTH']
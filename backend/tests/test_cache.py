@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from services.cache import LocalCache, RedisCache, FakeRedis
+
+
+@pytest.fixture(params=["local", "redis"])
+def cache(request):
+    if request.param == "local":
+        return LocalCache(max_entries=10, ttl=60)
+    return RedisCache("test", ttl=60, client=FakeRedis())
+
+
+def test_fill_read_before_invalidation_is_dropped(cache):
+    read_started = time.time()
+    cache.set("test:1", "old")
+    cache.invalidate("test:1")
+    cache.set_if_fresh("test:1", "old", read_started)
+    assert cache.get("test:1") is None
+
+
+def test_fill_read_after_invalidation_is_kept(cache):
+    cache.invalidate("test:1")
+    time.sleep(0.01)
+    cache.set_if_fresh("test:1", "new", time.time())
+    assert cache.get("test:1") == "new"
+
+
+def test_invalidation_is_seen_by_other_workers():
+    server = FakeRedis()
+    reader, writer = RedisCache("test", ttl=60, client=server), RedisCache("test", ttl=60, client=server)
+    read_started = time.time()
+    writer.invalidate("test:1")
+    reader.set_if_fresh("test:1", "old", read_started)
+    assert reader.get("test:1") is None
+
+
+def test_redis_invalidations_expire_with_the_cache_ttl():
+    server = FakeRedis()
+    cache = RedisCache("test", ttl=60, client=server)
+    cache.invalidate("test:1")
+    assert 0 < server.ttl("test:invalidated") <= 60
+
+
+def test_local_invalidations_survive_entry_eviction():
+    cache = LocalCache(max_entries=2, ttl=60)
+    read_started = time.time()
+    cache.invalidate("test:1")
+    for i in range(5):
+        cache.set(f"test:other{i}", "x")
+    cache.set_if_fresh("test:1", "old", read_started)
+    assert cache.get("test:1") is None
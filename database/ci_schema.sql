@@ -0,0 +1,122 @@
+-- Minimal base schema for CI. It holds only the tables and columns that the
+-- migrations, bench/seed.py and the audit queries touch, so
+-- `manage.py check-audit-plans` can EXPLAIN against seeded data. Real
+-- installs import hospital.sql instead.
+
+CREATE TABLE hospitals (
+    hospital_id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    address VARCHAR(255),
+    city VARCHAR(100),
+    state VARCHAR(100),
+    phone_number VARCHAR(30),
+    email VARCHAR(100),
+    created_at DATETIME
+) ENGINE=InnoDB;
+
+CREATE TABLE departments (
+    department_id INT AUTO_INCREMENT PRIMARY KEY,
+    hospital_id INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    description VARCHAR(255),
+    created_at DATETIME,
+    KEY idx_departments_hospital (hospital_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE roles (
+    role_id INT AUTO_INCREMENT PRIMARY KEY,
+    role_name VARCHAR(50) NOT NULL
+) ENGINE=InnoDB;
+
+CREATE TABLE enum_lookups (
+    lookup_id INT AUTO_INCREMENT PRIMARY KEY,
+    value VARCHAR(100) NOT NULL
+) ENGINE=InnoDB;
+
+CREATE TABLE users (
+    user_id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    email VARCHAR(100),
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    hospital_id INT,
+    department_id INT,
+    is_active TINYINT(1) NOT NULL DEFAULT 1,
+    created_at DATETIME
+) ENGINE=InnoDB;
+
+CREATE TABLE user_roles (
+    user_id INT NOT NULL,
+    role_id INT NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (user_id, role_id)
+) ENGINE=InnoDB;
+
+CREATE TABLE patients (
+    patient_id INT AUTO_INCREMENT PRIMARY KEY,
+    hospital_id INT,
+    first_name VARCHAR(100) NOT NULL,
+    last_name VARCHAR(100) NOT NULL,
+    date_of_birth DATE,
+    gender_id INT,
+    address VARCHAR(255),
+    city VARCHAR(100),
+    phone_number VARCHAR(30),
+    email VARCHAR(100),
+    national_id_number VARCHAR(50),
+    emergency_contact_name VARCHAR(200),
+    emergency_contact_phone VARCHAR(30),
+    is_active TINYINT(1) NOT NULL DEFAULT 1,
+    created_by INT,
+    created_at DATETIME,
+    updated_at DATETIME,
+    KEY idx_patients_national_id (national_id_number)
+) ENGINE=InnoDB;
+
+CREATE TABLE medical_records (
+    record_id INT AUTO_INCREMENT PRIMARY KEY,
+    patient_id INT NOT NULL,
+    created_by INT,
+    created_at DATETIME,
+    updated_at DATETIME
+) ENGINE=InnoDB;
+
+CREATE TABLE patient_encounters (
+    encounter_id INT AUTO_INCREMENT PRIMARY KEY,
+    record_id INT,
+    patient_id INT NOT NULL,
+    doctor_id INT,
+    encounter_date_time DATETIME,
+    chief_complaint TEXT,
+    diagnosis_description TEXT,
+    treatment_plan TEXT,
+    notes TEXT,
+    created_by INT,
+    created_at DATETIME,
+    updated_at DATETIME,
+    KEY idx_patient_encounters_patient (patient_id, encounter_date_time)
+) ENGINE=InnoDB;
+
+CREATE TABLE audit_logs (
+    log_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    action_type VARCHAR(50) NOT NULL,
+    module VARCHAR(50),
+    table_name VARCHAR(100),
+    record_id_affected VARCHAR(100),
+    old_value TEXT,
+    new_value TEXT,
+    ip_address VARCHAR(45),
+    action_timestamp DATETIME(6) NOT NULL,
+    is_success TINYINT(1) NOT NULL DEFAULT 1
+) ENGINE=InnoDB;
+
+INSERT INTO hospitals (hospital_id, name, created_at) VALUES (1, 'CI Hospital', NOW());
+INSERT INTO roles (role_id, role_name) VALUES (1, 'admin'), (2, 'doctor'), (3, 'nurse');
+INSERT INTO users (user_id, username, password_hash, first_name, last_name, hospital_id, created_at) VALUES
+(1, 'ci.one', '-', 'CI', 'One', 1, NOW()),
+(2, 'ci.two', '-', 'CI', 'Two', 1, NOW()),
+(3, 'ci.three', '-', 'CI', 'Three', 1, NOW()),
+(4, 'ci.four', '-', 'CI', 'Four', 1, NOW()),
+(5, 'ci.five', '-', 'CI', 'Five', 1, NOW());
@@ -1,5 +1,6 @@
 -- Sample data for MediLink Health application
 -- This script adds sample users, patients, and audit logs for testing
+-- For load tests, backend/bench/seed.py adds synthetic rows from patient_id 100000 on top of these
 
 USE hospital;
 
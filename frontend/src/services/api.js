@@ -4,7 +4,8 @@ import {
   saveEncounterOffline,
   searchPatientsOffline,
   getPatientOffline,
-  getPatientEncountersOffline
+  getPatientEncountersOffline,
+  applyServerEncounter
 } from './database';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
@@ -100,7 +101,28 @@ export const patientsAPI = {
       return await getPatientOffline(patientId);
     }
   },
-  
+
+  // Ward lists and offline prefetch: one request instead of one per patient
+  getBatch: async (patientIds, includeEncounters = false) => {
+    if (!isOnline()) {
+      return await Promise.all(patientIds.map(async (patientId) => {
+        const patient = await getPatientOffline(patientId);
+        return { patient_id: patientId, found: !!patient, patient: patient || null };
+      }));
+    }
+
+    const response = await api.post('/patients/batch', {
+      patient_ids: patientIds,
+      include_encounters: includeEncounters
+    });
+    for (const result of response.data) {
+      if (result.found) {
+        await savePatientOffline(result.patient);
+      }
+    }
+    return response.data;
+  },
+
   update: async (patientId, patientData) => {
     if (!isOnline()) {
       // Save offline and add to sync queue
@@ -158,6 +180,16 @@ export const patientsAPI = {
       await saveEncounterOffline(encounter);
       throw error;
     }
+  },
+
+  // Visits recorded on paper or another device, uploaded together in one
+  // transaction; a client_ref per encounter makes a retried upload harmless
+  createEncountersBatch: async (encounters) => {
+    const response = await api.post('/patients/encounters/batch', { encounters });
+    for (const [index, result] of response.data.results.entries()) {
+      await applyServerEncounter({ ...encounters[index], encounter_id: result.encounter_id });
+    }
+    return response.data;
   }
 };
 
@@ -19,12 +19,16 @@ export const db = new OfflineDatabase();
 
 // Sync queue management
 export const addToSyncQueue = async (table, action, data) => {
+  // Unique per queued change; the server uses it to ignore repeated pushes
+  const clientId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
   await db.syncQueue.add({
+    clientId,
     table,
     action,
     data,
     timestamp: new Date()
   });
+  return clientId;
 };
 
 // Patient operations
@@ -37,7 +41,8 @@ export const savePatientOffline = async (patient) => {
     await db.patients.add({ ...patient, synced: false });
   }
   
-  await addToSyncQueue('patients', 'update', patient);
+  // row_version is the server version this edit was based on, for conflict detection
+  await addToSyncQueue('patients', 'update', { row_version: existingPatient?.row_version, ...patient });
 };
 
 export const getPatientOffline = async (patientId) => {
@@ -72,8 +77,8 @@ export const searchPatientsOffline = async (query, searchType) => {
 
 // Encounter operations
 export const saveEncounterOffline = async (encounter) => {
-  await db.encounters.add({ ...encounter, synced: false });
-  await addToSyncQueue('encounters', 'create', encounter);
+  const clientRef = await addToSyncQueue('encounters', 'create', encounter);
+  await db.encounters.add({ ...encounter, client_ref: clientRef, synced: false });
 };
 
 export const getPatientEncountersOffline = async (patientId) => {
@@ -99,6 +104,35 @@ export const removeSyncItem = async (id) => {
   await db.syncQueue.delete(id);
 };
 
+// Server changes pulled by the sync service; these are already on the
+// server, so they are stored as synced and never queued
+export const applyServerPatient = async (patient) => {
+  const existingPatient = await db.patients.where('patient_id').equals(patient.patient_id).first();
+
+  if (!patient.is_active) {
+    if (existingPatient) {
+      await db.patients.delete(existingPatient.id);
+    }
+  } else if (existingPatient) {
+    await db.patients.update(existingPatient.id, { ...patient, synced: true });
+  } else {
+    await db.patients.add({ ...patient, synced: true });
+  }
+};
+
+export const applyServerEncounter = async (encounter) => {
+  // Encounters created offline have no encounter_id yet, only the client_ref they were pushed with
+  const existingEncounter =
+    await db.encounters.where('encounter_id').equals(encounter.encounter_id).first() ||
+    (encounter.client_ref && await db.encounters.filter((e) => e.client_ref === encounter.client_ref).first());
+
+  if (existingEncounter) {
+    await db.encounters.update(existingEncounter.id, { ...encounter, synced: true });
+  } else {
+    await db.encounters.add({ ...encounter, synced: true });
+  }
+};
+
 // User operations
 export const saveUserOffline = async (user) => {
   const existingUser = await db.users.where('user_id').equals(user.user_id).first();
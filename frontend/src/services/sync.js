@@ -1,6 +1,18 @@
-import { getSyncQueue, removeSyncItem, clearSyncQueue } from './database';
+import {
+  getSyncQueue,
+  removeSyncItem,
+  clearSyncQueue,
+  applyServerPatient,
+  applyServerEncounter
+} from './database';
 import api from './api';
 
+const PUSH_BATCH_SIZE = 200;
+const SYNC_TOKEN_KEY = 'sync_token';
+
+// Push results after which a queued change is done with, one way or another
+const SETTLED = ['applied', 'duplicate', 'unchanged', 'not_found', 'conflict'];
+
 class SyncService {
   constructor() {
     this.isOnline = navigator.onLine;
@@ -35,20 +47,12 @@ class SyncService {
     this.syncInProgress = true;
     
     try {
-      const syncQueue = await getSyncQueue();
-      console.log(`Syncing ${syncQueue.length} items`);
-      
-      for (const item of syncQueue) {
-        try {
-          await this.syncItem(item);
-          await removeSyncItem(item.id);
-        } catch (error) {
-          console.error('Failed to sync item:', item, error);
-        }
-      }
+      // Push first so pulled rows already include our own changes
+      const pushed = await this.pushChanges();
+      const pulled = await this.pullChanges();
       
       window.dispatchEvent(new CustomEvent('syncComplete', {
-        detail: { success: true, itemsCount: syncQueue.length }
+        detail: { success: true, itemsCount: pushed, pulledCount: pulled }
       }));
       
     } catch (error) {
@@ -58,21 +62,98 @@ class SyncService {
     }
   }
   
-  async syncItem(item) {
+  // Send the queue in batches; each batch is applied in one server transaction
+  async pushChanges() {
+    const syncQueue = await getSyncQueue();
+    if (syncQueue.length === 0) return 0;
+    console.log(`Syncing ${syncQueue.length} items`);
+    
+    let settled = 0;
+    for (let start = 0; start < syncQueue.length; start += PUSH_BATCH_SIZE) {
+      const items = [];
+      const mutations = [];
+      for (const item of syncQueue.slice(start, start + PUSH_BATCH_SIZE)) {
+        const mutation = this.toMutation(item);
+        if (mutation) {
+          items.push(item);
+          mutations.push(mutation);
+        } else {
+          // Nothing the server accepts (e.g. offline audit entries)
+          await removeSyncItem(item.id);
+        }
+      }
+      if (mutations.length === 0) continue;
+      
+      const response = await api.post('/sync/push', { mutations });
+      for (const [index, result] of response.data.results.entries()) {
+        const item = items[index];
+        if (result.status === 'conflict') {
+          // Someone changed the patient on the server first: keep their version
+          await applyServerPatient(result.current);
+          window.dispatchEvent(new CustomEvent('syncConflict', {
+            detail: { item, current: result.current }
+          }));
+        }
+        if (SETTLED.includes(result.status)) {
+          await removeSyncItem(item.id);
+          settled += 1;
+        } else {
+          console.error('Failed to sync item:', item, result.error);
+        }
+      }
+    }
+    return settled;
+  }
+  
+  toMutation(item) {
     const { table, action, data } = item;
+    // Items queued before client ids existed get a fresh one
+    const clientId = item.clientId || `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
     
     switch (table) {
       case 'patients':
         if (action === 'update') {
-          await api.put(`/patients/${data.patient_id}`, data);
+          return {
+            client_id: clientId,
+            table: 'patients',
+            action: 'update',
+            data,
+            base_version: data.row_version ?? null
+          };
         }
         break;
       case 'encounters':
         if (action === 'create') {
-          await api.post(`/patients/${data.patient_id}/encounters`, data);
+          return { client_id: clientId, table: 'patient_encounters', action: 'create', data };
         }
         break;
     }
+    return null;
+  }
+  
+  // Fetch everything changed on the server since the last pull
+  async pullChanges() {
+    let token = localStorage.getItem(SYNC_TOKEN_KEY);
+    let pulled = 0;
+    let hasMore = true;
+    
+    while (hasMore) {
+      const response = await api.get('/sync/changes', { params: token ? { since: token } : {} });
+      const { changes, next_token, has_more } = response.data;
+      
+      for (const patient of changes.patients) {
+        await applyServerPatient(patient);
+      }
+      for (const encounter of changes.patient_encounters) {
+        await applyServerEncounter(encounter);
+      }
+      pulled += changes.patients.length + changes.patient_encounters.length;
+      
+      token = next_token;
+      localStorage.setItem(SYNC_TOKEN_KEY, token);
+      hasMore = has_more;
+    }
+    return pulled;
   }
   
   getStatus() {